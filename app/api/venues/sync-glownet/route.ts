@@ -13,6 +13,10 @@ const API_KEY = process.env.GLOWNET_API_KEY;
 // Sync types
 type SyncType = 'full' | 'incremental';
 type SyncStatus = 'pending' | 'success' | 'failed';
+// 'full': venue_images is the whole map and venues missing from it lose their image.
+// 'delta': venue_images only holds added/changed entries (null = removed); other venues keep their image.
+type VenueImagesMode = 'full' | 'delta';
+type VenueImage = { image_url: string, image_alt: string };
 
 // Track sync status in Supabase
 async function trackSyncStatus(supabase: any, venueId: string, status: SyncStatus, error?: string) {
@@ -27,7 +31,7 @@ async function trackSyncStatus(supabase: any, venueId: string, status: SyncStatu
 }
 
 // Main sync logic
-async function syncVenues(type: SyncType = 'full', venueImages: Record<string, { image_url: string, image_alt: string }> = {}) {
+async function syncVenues(type: SyncType = 'full', venueImages: Record<string, VenueImage | null> = {}, imagesMode: VenueImagesMode = 'full') {
   const cookieStore = await cookies();
   const supabase = createClient(cookieStore);
   
@@ -42,10 +46,7 @@ async function syncVenues(type: SyncType = 'full', venueImages: Record<string, {
 
     // Prepare venue data with enhanced fields
     const venuesToUpsert = glownetEvents.map((event) => {
-      // Get image data if available
-      const imageData = venueImages[event.id.toString()] || {};
-      
-      return {
+      const venue: Record<string, unknown> = {
         glownet_event_id: event.id,
         name: event.name,
         status: event.state,
@@ -53,24 +54,36 @@ async function syncVenues(type: SyncType = 'full', venueImages: Record<string, {
         end_date: event.end_date,
         timezone: event.timezone,
         currency: event.currency,
-        image_url: imageData.image_url || null,
         max_balance: event.maximum_gtag_standard_balance,
         max_virtual_balance: event.maximum_gtag_virtual_balance,
         last_synced: new Date().toISOString(),
         sync_status: 'success' as SyncStatus
       };
+      // Get image data if available; in delta mode venues without an entry keep their current image
+      const key = event.id.toString();
+      if (imagesMode === 'full' || key in venueImages) {
+        venue.image_url = venueImages[key]?.image_url || null;
+      }
+      return venue;
     });
 
-    // Perform upsert
-    const { data, error } = await supabase
-      .from('venues')
-      .upsert(venuesToUpsert, {
-        onConflict: 'glownet_event_id',
-        ignoreDuplicates: false,
-      })
-      .select('id, name, glownet_event_id');
-
-    if (error) throw error;
+    // Perform upsert, one statement per column set so omitted image_url columns are left untouched
+    const withImage = venuesToUpsert.filter((venue) => 'image_url' in venue);
+    const withoutImage = venuesToUpsert.filter((venue) => !('image_url' in venue));
+    const data: { id: string, name: string, glownet_event_id: number }[] = [];
+    for (const rows of [withImage, withoutImage]) {
+      if (!rows.length) continue;
+      const { data: upserted, error } = await supabase
+        .from('venues')
+        .upsert(rows, {
+          onConflict: 'glownet_event_id',
+          ignoreDuplicates: false,
+        })
+        .select('id, name, glownet_event_id');
+
+      if (error) throw error;
+      data.push(...(upserted || []));
+    }
 
     // Track sync status for each venue
     for (const venue of data || []) {
@@ -78,8 +91,9 @@ async function syncVenues(type: SyncType = 'full', venueImages: Record<string, {
     }
 
     return {
-      message: `Successfully synced ${data?.length ?? 0} venues`,
+      message: `Successfully synced ${data.length} venues`,
       data,
+      imagesMode,
       status: 200
     };
 
@@ -127,11 +141,11 @@ export async function POST(request: Request) {
   rateLimitStore.set(clientIP, [...validRequests, now]);
 
   // Get sync type and venue images from request
-  const { type = 'full', venue_images = {} } = await request.json();
-  const result = await syncVenues(type as SyncType, venue_images);
+  const { type = 'full', venue_images = {}, venue_images_mode = 'full' } = await request.json();
+  const result = await syncVenues(type as SyncType, venue_images, venue_images_mode === 'delta' ? 'delta' : 'full');
   
   return NextResponse.json(
-    result.error ? { error: result.error } : { message: result.message, data: result.data },
+    result.error ? { error: result.error } : { message: result.message, data: result.data, venue_images_mode: result.imagesMode },
     { status: result.status }
   );
 }
@@ -167,7 +181,8 @@ export async function GET(request: Request) {
     return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
   }
 
-  const result = await syncVenues('incremental');
+  // No image map here, so keep the images the last manual sync set
+  const result = await syncVenues('incremental', {}, 'delta');
   return NextResponse.json(
     result.error ? { error: result.error } : { message: result.message },
     { status: result.status }
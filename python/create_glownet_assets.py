@@ -1,62 +1,27 @@
 import os
 import requests
 import sys
+import json
 import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from faker import Faker
-from dotenv import load_dotenv
 
-# --- Configuration ---
-# Construct the path to .env.local relative to this script file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(script_dir)  # Go up one level
-dotenv_path = os.path.join(parent_dir, '.env.local')
-
-print(f"Looking for .env.local at: {dotenv_path}")
-if not os.path.exists(dotenv_path):
-    print(f"Warning: .env.local not found at {dotenv_path}")
-    
-load_dotenv(dotenv_path=dotenv_path)
-
-GLOWNET_API_BASE_URL = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com")
-GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
+import glownet_client as glownet
+import glownet_mirror
+from glownet_client import GLOWNET_API_BASE_URL, handle_response
+from glownet_entities import parse_amount
+from glownet_journal import Journal, journal_path, load_journal, STATE_DONE, STATE_FAILED, STATE_INTENDED
 
-if not GLOWNET_API_KEY:
-    print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
-    sys.exit(1)
-
-HEADERS = {
-    "AUTHORIZATION": f"Token token={GLOWNET_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+# --- Configuration ---
+glownet.require_api_key()
 
 FAKE = Faker()
 
 # --- Helper Functions ---
 
-def handle_response(response, success_status_codes=(200, 201)):
-    """Checks response status and returns JSON or raises error."""
-    if response.status_code in success_status_codes:
-        try:
-            if response.text:
-                return response.json()
-            else:
-                return None # Success, but no JSON body
-        except requests.exceptions.JSONDecodeError:
-            print(f"Warning: Successful status ({response.status_code}) but could not decode JSON.")
-            print(f"Response Text: {response.text}")
-            return None
-    else:
-        print(f"Error: API returned status {response.status_code}")
-        try:
-            error_details = response.json()
-            print(f"Response: {error_details}")
-            message = error_details.get('error') or error_details.get('message') or str(error_details)
-            print(f"API Error Details: {message}")
-        except requests.exceptions.JSONDecodeError:
-            print(f"Response Text (non-JSON): {response.text}")
-        return None # Indicate failure
-
 def ask_yes_no(prompt):
     """Asks a yes/no question and returns True for yes, False for no."""
     while True:
@@ -82,9 +47,12 @@ def ask_int(prompt, min_val=0):
 
 def get_all_events():
     """Fetches all events from the Glownet API."""
+    mirrored = glownet_mirror.mirrored_events()
+    if mirrored is not None:
+        return mirrored
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events"
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = glownet.get(url)
         if response.status_code == 200:
             return response.json()
         else:
@@ -125,33 +93,51 @@ def select_event(events):
         except ValueError:
             print("Please enter a valid number or 'q' to quit.")
 
-def create_customer(event_id):
-    """Creates a single customer within the specified event."""
+def create_outcome_unknown(response):
+    """True if a failed create may still have been applied: a server error, or a success without the created id."""
+    return response.status_code >= 500 or response.status_code in (200, 201)
+
+def create_customer(event_id, customer=None, verbose=True):
+    """
+    Creates a single customer within the specified event. Generates fake details unless `customer` is given.
+
+    Returns the customer, None if the API rejected it, or "API_ERROR" if the
+    outcome is unknown (network error or server error).
+    """
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/customers"
-    payload = {
-        "customer": {
+    if customer is None:
+        customer = {
             "first_name": FAKE.first_name(),
             "last_name": FAKE.last_name(),
             "email": FAKE.unique.email() # Use unique email
         }
-    }
-    print(f"  Creating customer: {payload['customer']['email']}...", end="", flush=True)
+    payload = {"customer": customer}
+    if verbose:
+        print(f"  Creating customer: {payload['customer']['email']}...", end="", flush=True)
     try:
-        FAKE.unique.clear()
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = glownet.post(url, json=payload)
         result = handle_response(response, success_status_codes=(201,))
         if result and 'id' in result:
-            print(f" Success (ID: {result['id']})")
+            if verbose:
+                print(f" Success (ID: {result['id']})")
             return result
+        elif create_outcome_unknown(response):
+            print(f" Customer {payload['customer']['email']} may or may not have been created (Status: {response.status_code}). Outcome unknown.")
+            return "API_ERROR"
         else:
-            print(" Failed (Check API response above)")
+            print(f" Failed to create customer {payload['customer']['email']} (Check API response above)")
             return None
     except requests.exceptions.RequestException as e:
-        print(f" Failed (Network error: {e})")
-        return None
+        print(f" Failed to create customer {payload['customer']['email']} (Network error: {e}). Outcome unknown.")
+        return "API_ERROR"
+
+def register_gtag(event_id, tag_uid, customer_id=None, verbose=True):
+    """
+    Registers a G-Tag within the specified event, optionally assigning it.
 
-def register_gtag(event_id, tag_uid, customer_id=None):
-    """Registers a G-Tag within the specified event, optionally assigning it."""
+    Returns the G-Tag, None if the API rejected it, or "API_ERROR" if the
+    outcome is unknown (network error or server error).
+    """
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/gtags"
     payload = {"gtag": {"tag_uid": tag_uid}}
     log_message = f"  Registering G-Tag '{tag_uid}'"
@@ -160,23 +146,34 @@ def register_gtag(event_id, tag_uid, customer_id=None):
         log_message += f" assigned to customer {customer_id}..."
     else:
         log_message += " (unassigned)..."
-    print(log_message, end="", flush=True)
+    if verbose:
+        print(log_message, end="", flush=True)
 
     try:
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = glownet.post(url, json=payload)
         result = handle_response(response, success_status_codes=(201,))
         if result and 'id' in result:
-            print(f" Success (ID: {result['id']})")
+            if verbose:
+                print(f" Success (ID: {result['id']})")
             return result
+        elif create_outcome_unknown(response):
+            print(f" G-Tag '{tag_uid}' may or may not have been registered (Status: {response.status_code}). Outcome unknown.")
+            return "API_ERROR"
         else:
-            print(" Failed (Check API response above)")
+            print(f" Failed to register G-Tag '{tag_uid}' (Check API response above)")
             return None
     except requests.exceptions.RequestException as e:
-        print(f" Failed (Network error: {e})")
-        return None
+        print(f" Failed to register G-Tag '{tag_uid}' (Network error: {e}). Outcome unknown.")
+        return "API_ERROR"
+
+def topup_gtag(event_id, gtag_internal_id, credits, verbose=True):
+    """
+    Adds credits to a G-Tag within the specified event.
 
-def topup_gtag(event_id, gtag_internal_id, credits):
-    """Adds credits to a G-Tag within the specified event."""
+    Returns the API result ({} without a body), None if the API rejected it
+    (or there was nothing to send), or "API_ERROR" if the outcome is unknown
+    (network error or server error).
+    """
     if not gtag_internal_id:
         print("  Error: Cannot topup - Missing internal G-Tag ID.")
         return None
@@ -189,27 +186,360 @@ def topup_gtag(event_id, gtag_internal_id, credits):
         "credits": credits,
         "gateway": "api_script_interactive_test_data"
     }
-    print(f"  Topping up G-Tag ID {gtag_internal_id} with {credits} credits...", end="", flush=True)
+    if verbose:
+        print(f"  Topping up G-Tag ID {gtag_internal_id} with {credits} credits...", end="", flush=True)
     try:
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = glownet.post(url, json=payload)
         # Assume 201 is success for topup
         result = handle_response(response, success_status_codes=(201,))
-        if result is not None: # API call succeeded (even if no body)
-            print(" Success")
-            return result
+        if response.status_code == 201: # API call succeeded (even if no body)
+            if verbose:
+                print(" Success")
+            return result if result is not None else {}
+        elif response.status_code >= 500:
+            print(f" Topup of G-Tag ID {gtag_internal_id} got a server error (Status: {response.status_code}). Outcome unknown.")
+            return "API_ERROR"
         else:
-            print(" Failed (Check API response above)")
+            print(f" Failed to top up G-Tag ID {gtag_internal_id} (Check API response above)")
+            return None
+    except requests.exceptions.RequestException as e:
+        print(f" Failed to top up G-Tag ID {gtag_internal_id} (Network error: {e}). Outcome unknown.")
+        return "API_ERROR"
+
+def find_customer_by_email(event_id, email):
+    """
+    Looks up a customer by email (used to re-check in-flight creations on resume).
+    Returns the customer, None if there is none, or "API_ERROR" if the search failed.
+    """
+    url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/customers/search"
+    try:
+        response = glownet.post(url, json={"email": email}, params={"email": email})
+        if response.status_code == 404:
+            return None
+        result = handle_response(response, success_status_codes=(200,), error_value="API_ERROR")
+        if result == "API_ERROR":
+            return result
+        return result if isinstance(result, dict) and 'id' in result else None
+    except requests.exceptions.RequestException as e:
+        print(f"  Network error searching for customer {email}: {e}")
+        return "API_ERROR"
+
+def find_gtag_by_uid(event_id, tag_uid):
+    """
+    Looks up a G-Tag by tag_uid (used to re-check in-flight registrations on resume).
+    Returns the G-Tag, None if there is none, or "API_ERROR" if the search failed.
+    """
+    url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/gtags/search"
+    try:
+        response = glownet.get(url, params={"tag_uid": tag_uid})
+        if response.status_code == 404:
             return None
+        result = handle_response(response, success_status_codes=(200,), error_value="API_ERROR")
+        if result == "API_ERROR":
+            return result
+        if isinstance(result, list): # Some deployments answer with a list of matches
+            result = result[0] if result else None
+        return result if isinstance(result, dict) and 'id' in result else None
     except requests.exceptions.RequestException as e:
-        print(f" Failed (Network error: {e})")
+        print(f"  Network error searching for G-Tag {tag_uid}: {e}")
+        return "API_ERROR"
+
+def gtag_has_topup(event_id, gtag_internal_id):
+    """
+    True if the G-Tag holds any credits, False if it holds none, or "API_ERROR"
+    if it could not be fetched (used to re-check in-flight topups on resume).
+
+    Bulk runs top up each tag they registered exactly once, so any balance on
+    it is that topup. This avoids comparing the topup's cents with the tag's
+    credits, which the API reports in its own unit ("3.0").
+    """
+    url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/gtags/{gtag_internal_id}"
+    try:
+        gtag = handle_response(glownet.get(url), success_status_codes=(200,), error_value="API_ERROR")
+    except requests.exceptions.RequestException as e:
+        print(f"  Network error fetching G-Tag {gtag_internal_id}: {e}")
+        return "API_ERROR"
+    if not isinstance(gtag, dict):
+        return "API_ERROR"
+    return parse_amount(gtag.get("credits")) > 0 or parse_amount(gtag.get("final_balance")) > 0
+
+def found_id(found):
+    """Maps a find_* result to a journaled() recheck result: the id, None if absent, or "API_ERROR"."""
+    return found if found == "API_ERROR" else (found or {}).get('id')
+
+# --- Bulk (Non-Interactive) Provisioning ---
+
+class StageStats:
+    """Thread-safe success/failure counters and timing for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.resumed = 0 # Completed by an earlier run, skipped
+        self.unresolved = 0 # Outcome unknown (sent, or in flight earlier and not re-checkable); left in flight in the journal
+        self.succeeded = 0
+        self.failed = 0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, started_at, ok):
+        with self._lock:
+            if self.first_start is None or started_at < self.first_start:
+                self.first_start = started_at
+            self.last_end = max(self.last_end or 0.0, time.monotonic())
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def skip(self):
+        with self._lock:
+            self.resumed += 1
+
+    def defer(self):
+        with self._lock:
+            self.unresolved += 1
+
+    def summary(self):
+        attempted = self.succeeded + self.failed
+        resumed = f", {self.resumed} already done" if self.resumed else ""
+        if self.unresolved:
+            resumed += f", {self.unresolved} unresolved (re-run with --resume)"
+        if not attempted:
+            return f"{self.name}: nothing attempted{resumed}"
+        elapsed = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        rate = self.succeeded / elapsed if elapsed > 0 else 0.0
+        return f"{self.name}: {self.succeeded} / {attempted} succeeded in {elapsed:.2f}s ({rate:.1f}/s){resumed}"
+
+def load_bulk_spec(args):
+    """Merges a JSON spec file (if given) with CLI flags. Flags win over the spec file."""
+    spec = {
+        "event": None,
+        "tag_prefix": None,
+        "customers": 0,
+        "assigned_gtags": None, # Defaults to one tag per created customer
+        "topup_cents": 0,
+        "unassigned_gtags": 0,
+        "workers": {"customers": 8, "gtags": 8, "topups": 8},
+    }
+    if args.spec:
+        with open(args.spec, 'r', encoding='utf-8') as f:
+            file_spec = json.load(f)
+        spec["workers"].update(file_spec.pop("workers", {}))
+        spec.update(file_spec)
+    for key in ("event", "tag_prefix", "customers", "assigned_gtags", "topup_cents", "unassigned_gtags"):
+        value = getattr(args, key)
+        if value is not None:
+            spec[key] = value
+    for stage in ("customers", "gtags", "topups"):
+        value = getattr(args, f"{stage}_workers")
+        if value is not None:
+            spec["workers"][stage] = value
+    if spec["assigned_gtags"] is None:
+        spec["assigned_gtags"] = spec["customers"]
+    spec["assigned_gtags"] = min(spec["assigned_gtags"], spec["customers"])
+    return spec
+
+def run_bulk_provisioning(spec, journal, resume_entries=None):
+    """
+    Provisions customers, assigned G-Tags and topups as a dependency pipeline.
+
+    Each stage has its own worker pool. A customer's tag registration is queued
+    the moment that customer exists, and its topup the moment the tag exists,
+    so all three stages run concurrently. Every mutation is journaled; with
+    resume_entries from a previous run, completed items are skipped and
+    in-flight ones are re-checked against the API. Returns the per-stage StageStats.
+    """
+    resume_entries = resume_entries or {}
+    event_id = spec["event"]
+    prefix = spec["tag_prefix"]
+    workers = spec["workers"]
+    stats = {stage: StageStats(label) for stage, label in (
+        ("customers", "Customers"), ("assigned_gtags", "Assigned G-Tags"),
+        ("topups", "Topups"), ("unassigned_gtags", "Unassigned G-Tags"))}
+    # Every pool worker may hold a connection at once
+    glownet.configure_pool(sum(workers.values()))
+
+    # Customer details are generated up front: Faker is not thread-safe, and
+    # the index suffix keeps emails unique across large runs.
+    customers = []
+    for i in range(spec["customers"]):
+        first_name, last_name = FAKE.first_name(), FAKE.last_name()
+        customers.append({
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": f"{first_name}.{last_name}.{prefix}{i + 1:05d}@example.com".lower()
+        })
+
+    pending = [] # Every submitted future, so the run can wait for all stages to drain
+    pending_lock = threading.Lock()
+
+    customer_pool = ThreadPoolExecutor(max_workers=workers["customers"], thread_name_prefix="customers")
+    gtag_pool = ThreadPoolExecutor(max_workers=workers["gtags"], thread_name_prefix="gtags")
+    topup_pool = ThreadPoolExecutor(max_workers=workers["topups"], thread_name_prefix="topups")
+
+    def submit(pool, fn, *args):
+        future = pool.submit(fn, *args)
+        with pending_lock:
+            pending.append(future)
+        return future
+
+    def journaled(stage, key, create, recheck, **intent):
+        """
+        Runs one create call under the journal and returns the created id, or None.
+
+        `create()` returns the API result dict, None if the API rejected it, or
+        "API_ERROR" if the outcome is unknown; `recheck(data)` returns the id if a
+        previously in-flight call turns out to have been applied, None if it was
+        not, or "API_ERROR" if that is unknown. Only rejections are journaled as
+        failed: an unknown entry stays in flight, so a resume re-checks it
+        instead of sending it again.
+        """
+        entry = resume_entries.get(key)
+        if entry and entry["state"] == STATE_DONE:
+            stats[stage].skip()
+            return entry["data"].get("id")
+        if entry and entry["state"] == STATE_INTENDED:
+            existing_id = recheck(entry["data"])
+            if existing_id == "API_ERROR":
+                stats[stage].defer()
+                return None
+            if existing_id is not None:
+                journal.done(key, id=existing_id)
+                stats[stage].skip()
+                return existing_id
+        started_at = time.monotonic()
+        journal.intend(key, **intent)
+        result = create()
+        if result == "API_ERROR":
+            stats[stage].defer()
+            return None
+        ok = result is not None and (not isinstance(result, dict) or not result or 'id' in result)
+        if ok:
+            created_id = result.get('id') if isinstance(result, dict) else None
+            journal.done(key, id=created_id)
+            stats[stage].record(started_at, True)
+            return created_id if created_id is not None else True
+        journal.failed(key)
+        stats[stage].record(started_at, False)
         return None
 
+    def topup_stage(i, gtag_id):
+        journaled("topups", f"topup:{i}",
+                  lambda: topup_gtag(event_id, gtag_id, spec["topup_cents"], verbose=False),
+                  lambda data: gtag_has_topup(event_id, gtag_id) or None,
+                  gtag_id=gtag_id)
+
+    def assigned_gtag_stage(i, customer_id):
+        tag_uid = f"{prefix}a{i + 1:04d}"
+        gtag_id = journaled("assigned_gtags", f"gtag:a:{i}",
+                            lambda: register_gtag(event_id, tag_uid, customer_id=customer_id, verbose=False),
+                            lambda data: found_id(find_gtag_by_uid(event_id, tag_uid)),
+                            tag_uid=tag_uid, customer_id=customer_id)
+        if gtag_id is not None and spec["topup_cents"] > 0:
+            submit(topup_pool, topup_stage, i, gtag_id)
+
+    def customer_stage(i):
+        key = f"customer:{i}"
+        entry = resume_entries.get(key)
+        # An in-flight customer must be re-created with the details it was first sent with
+        customer = entry["data"]["customer"] if entry and "customer" in entry["data"] else customers[i]
+        customer_id = journaled("customers", key,
+                                lambda: create_customer(event_id, customer, verbose=False),
+                                lambda data: found_id(find_customer_by_email(event_id, customer["email"])),
+                                customer=customer)
+        if customer_id is not None and i < spec["assigned_gtags"]:
+            submit(gtag_pool, assigned_gtag_stage, i, customer_id)
+
+    def unassigned_gtag_stage(i):
+        tag_uid = f"{prefix}u{i + 1:04d}"
+        journaled("unassigned_gtags", f"gtag:u:{i}",
+                  lambda: register_gtag(event_id, tag_uid, customer_id=None, verbose=False),
+                  lambda data: found_id(find_gtag_by_uid(event_id, tag_uid)),
+                  tag_uid=tag_uid)
+
+    run_start = time.monotonic()
+    for i in range(spec["customers"]):
+        submit(customer_pool, customer_stage, i)
+    for i in range(spec["unassigned_gtags"]):
+        submit(gtag_pool, unassigned_gtag_stage, i)
+
+    # Futures keep being added while earlier stages finish, so drain until none are left
+    waited = 0
+    last_report = time.monotonic()
+    while True:
+        with pending_lock:
+            batch = pending[waited:]
+        if not batch:
+            break
+        for future in batch:
+            future.result()
+            if time.monotonic() - last_report >= 5:
+                print("  Progress: " + "; ".join(stage.summary() for stage in stats.values()))
+                last_report = time.monotonic()
+        waited += len(batch)
+
+    for pool in (customer_pool, gtag_pool, topup_pool):
+        pool.shutdown(wait=True)
+    print(f"Bulk provisioning finished in {time.monotonic() - run_start:.2f}s.")
+    return stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create Glownet customers, G-Tags and topups.")
+    parser.add_argument("--bulk", action="store_true", help="Run headless from a spec file and/or flags instead of prompting")
+    parser.add_argument("--spec", help="JSON spec file with event, tag_prefix, customers, assigned_gtags, topup_cents, unassigned_gtags, workers")
+    parser.add_argument("--event", help="Event ID or slug")
+    parser.add_argument("--tag-prefix", dest="tag_prefix", help="Short prefix (1-9 chars) for G-Tag UIDs")
+    parser.add_argument("--customers", type=int, help="Customers to create")
+    parser.add_argument("--assigned-gtags", dest="assigned_gtags", type=int, help="Assigned G-Tags to create (default: one per customer)")
+    parser.add_argument("--topup-cents", dest="topup_cents", type=int, help="Cents to top up on each assigned G-Tag")
+    parser.add_argument("--unassigned-gtags", dest="unassigned_gtags", type=int, help="Unassigned G-Tags to create")
+    parser.add_argument("--customer-workers", dest="customers_workers", type=int, help="Concurrent customer creations")
+    parser.add_argument("--gtag-workers", dest="gtags_workers", type=int, help="Concurrent G-Tag registrations")
+    parser.add_argument("--topup-workers", dest="topups_workers", type=int, help="Concurrent topups")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted bulk run from its journal")
+    parser.add_argument("--journal", help="Journal file path (default: python/journals/assets-<event>-<prefix>.journal.jsonl)")
+    return parser.parse_args()
+
 # --- Main Interactive Script ---
 if __name__ == "__main__":
     print("--- Glownet Asset Creator ---")
     print(f"API Base URL: {GLOWNET_API_BASE_URL}")
     print("-" * 40)
 
+    args = parse_args()
+    if args.bulk:
+        bulk_spec = load_bulk_spec(args)
+        if not bulk_spec["event"] or not bulk_spec["tag_prefix"] or not 1 <= len(bulk_spec["tag_prefix"]) <= 9:
+            print("Error: Bulk mode needs --event and a --tag-prefix of 1-9 characters (or the same keys in --spec).")
+            sys.exit(1)
+        print(f"Bulk provisioning for event '{bulk_spec['event']}': {bulk_spec['customers']} customers, "
+              f"{bulk_spec['assigned_gtags']} assigned G-Tags, topup {bulk_spec['topup_cents']} cents, "
+              f"{bulk_spec['unassigned_gtags']} unassigned G-Tags. Workers: {bulk_spec['workers']}")
+        run_journal_path = args.journal or journal_path(f"assets-{bulk_spec['event']}-{bulk_spec['tag_prefix']}")
+        resume_entries = {}
+        if args.resume:
+            resume_entries = load_journal(run_journal_path)
+            print(f"Resuming from journal {run_journal_path} ({len(resume_entries)} recorded items).")
+        elif os.path.exists(run_journal_path):
+            print(f"Error: Journal {run_journal_path} already exists. Use --resume to continue that run, or another --tag-prefix.")
+            sys.exit(1)
+        run_journal = Journal(run_journal_path)
+        stage_stats = run_bulk_provisioning(bulk_spec, run_journal, resume_entries)
+        run_journal.close()
+        print(f"Journal: {run_journal_path}")
+        print("\n" + "=" * 40)
+        print("--- Asset Creation Summary ---")
+        for stage in stage_stats.values():
+            print(stage.summary())
+        # Anything not done (failed, or still in flight after an unknown outcome) makes the run fail
+        open_states = Counter(entry["state"] for entry in load_journal(run_journal_path).values() if entry["state"] != STATE_DONE)
+        if open_states:
+            print(f"Journal: {open_states[STATE_FAILED]} failed, {open_states[STATE_INTENDED]} in flight.")
+        print("=" * 40)
+        failed = any(stage.failed or stage.unresolved for stage in stage_stats.values())
+        sys.exit(1 if failed or open_states else 0)
+
     # Fetch all events
     print("\nFetching available events...")
     events = get_all_events()
@@ -255,12 +585,11 @@ if __name__ == "__main__":
         print(f"\n--- Creating {customers_to_create} Customers ---")
         for i in range(customers_to_create):
             customer_info = create_customer(target_event_id)
-            if customer_info and 'id' in customer_info:
+            if isinstance(customer_info, dict) and 'id' in customer_info:
                 customer_ids.append(customer_info['id'])
                 total_customers_succeeded += 1
             else:
                 customer_ids.append(None) # Placeholder for failed creations
-            time.sleep(0.2)
         print(f"Finished creating customers: {total_customers_succeeded} succeeded out of {customers_to_create}.")
         print("-" * 40)
 
@@ -279,10 +608,9 @@ if __name__ == "__main__":
                 customer_id = valid_customer_ids[i]
 
                 gtag_info = register_gtag(target_event_id, tag_uid, customer_id=customer_id)
-                if gtag_info and 'id' in gtag_info:
+                if isinstance(gtag_info, dict) and 'id' in gtag_info:
                     assigned_gtag_internal_ids.append(gtag_info['id'])
                     total_assigned_gtags_succeeded += 1
-                time.sleep(0.2)
             print(f"Finished assigning G-Tags: {total_assigned_gtags_succeeded} succeeded out of {assigned_gtags_to_create}.")
             print("-" * 40)
 
@@ -294,9 +622,8 @@ if __name__ == "__main__":
                         print(f"\n--- Topping Up {total_assigned_gtags_succeeded} Assigned G-Tags with {topup_balance} cents ---")
                         for gtag_id in assigned_gtag_internal_ids:
                             topup_result = topup_gtag(target_event_id, gtag_id, topup_balance)
-                            if topup_result is not None:
+                            if isinstance(topup_result, dict):
                                 total_topups_succeeded += 1
-                            time.sleep(0.2)
                         print(f"Finished topping up: {total_topups_succeeded} succeeded out of {total_assigned_gtags_succeeded}.")
                     else:
                         print("Skipping topup as balance entered is 0.")
@@ -310,9 +637,8 @@ if __name__ == "__main__":
             # Shortened UID format: {prefix}u{number:04d}
             tag_uid = f"{event_prefix}u{i+1:04d}" # Use 'u' for unassigned
             gtag_info = register_gtag(target_event_id, tag_uid, customer_id=None)
-            if gtag_info and 'id' in gtag_info:
+            if isinstance(gtag_info, dict) and 'id' in gtag_info:
                 total_unassigned_gtags_succeeded += 1
-            time.sleep(0.2)
         print(f"Finished registering unassigned G-Tags: {total_unassigned_gtags_succeeded} succeeded out of {unassigned_gtags_to_create}.")
         print("-" * 40)
 
@@ -1,60 +1,15 @@
 # samachi-app/create_glownet_test_data.py
-import os
 import requests
-import sys
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-# --- Configuration ---
-# Construct the path to .env.local relative to this script file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(script_dir)  # Go up one level
-dotenv_path = os.path.join(parent_dir, '.env.local')
-
-print(f"Looking for .env.local at: {dotenv_path}")
-if not os.path.exists(dotenv_path):
-    print(f"Warning: .env.local not found at {dotenv_path}")
-    
-load_dotenv(dotenv_path=dotenv_path)
-
-GLOWNET_API_BASE_URL = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com")
-GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
+import glownet_client as glownet
+from glownet_client import GLOWNET_API_BASE_URL, HEADERS, handle_response
 
-if not GLOWNET_API_KEY:
-    print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
-    sys.exit(1)
-
-HEADERS = {
-    "AUTHORIZATION": f"Token token={GLOWNET_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+# --- Configuration ---
+glownet.require_api_key()
 
 # --- Helper Functions ---
 
-def handle_response(response, success_status_codes=(200, 201)):
-    """Checks response status and returns JSON or raises error."""
-    if response.status_code in success_status_codes:
-        try:
-            if response.text:
-                return response.json()
-            else:
-                return None # Success, but no JSON body
-        except requests.exceptions.JSONDecodeError:
-            print(f"Warning: Successful status ({response.status_code}) but could not decode JSON.")
-            print(f"Response Text: {response.text}")
-            return None
-    else:
-        print(f"Error: API returned status {response.status_code}")
-        try:
-            error_details = response.json()
-            print(f"Response: {error_details}")
-            message = error_details.get('error') or error_details.get('message') or str(error_details)
-            print(f"API Error Details: {message}")
-        except requests.exceptions.JSONDecodeError:
-            print(f"Response Text (non-JSON): {response.text}")
-        return None # Indicate failure
-
 def ask_yes_no(prompt):
     """Asks a yes/no question and returns True for yes, False for no."""
     while True:
@@ -83,7 +38,7 @@ def create_event(name, start_date, end_date, timezone):
     print(f"Request Payload: {payload}")
     
     try:
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = glownet.post(url, json=payload)
         result = handle_response(response, success_status_codes=(201,))
         if result:
             print(f"Successfully created event:")
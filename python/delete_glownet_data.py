@@ -1,37 +1,16 @@
 # samachi-app/delete_glownet_data.py
-import os
 import requests
 import sys
 import json
-from dotenv import load_dotenv
 from typing import List, Dict, Optional
 
-# --- Configuration ---
-# Construct the path to .env.local relative to this script file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(script_dir)  # Go up one level
-dotenv_path = os.path.join(parent_dir, '.env.local')
-
-print(f"Looking for .env.local at: {dotenv_path}")
-if not os.path.exists(dotenv_path):
-    print(f"Warning: .env.local not found at {dotenv_path}")
-    
-load_dotenv(dotenv_path=dotenv_path)
-
-# Get base URL from env or use default, ensure it doesn't end with a slash
-base_url = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com").rstrip('/')
-GLOWNET_API_BASE_URL = f"{base_url}/api/v2"  # Add API version path
-GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
+import glownet_client as glownet
+from glownet_client import HEADERS, handle_response
 
-if not GLOWNET_API_KEY:
-    print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
-    sys.exit(1)
+# --- Configuration ---
+GLOWNET_API_BASE_URL = glownet.api_url("/api/v2")  # Add API version path
 
-HEADERS = {
-    "AUTHORIZATION": f"Token token={GLOWNET_API_KEY}",
-    "Accept": "application/json",
-    "Content-Type": "application/json"
-}
+glownet.require_api_key()
 
 # --- Helper Functions ---
 
@@ -39,7 +18,7 @@ def get_all_events() -> List[Dict]:
     """Fetches all events from the Glownet API."""
     url = f"{GLOWNET_API_BASE_URL}/events"
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = glownet.get(url)
         if response.status_code == 200:
             return response.json()
         else:
@@ -85,19 +64,8 @@ def handle_delete_response(response, success_status_codes=(200, 204)):
     if response.status_code in success_status_codes:
         print(f"Success: API returned status {response.status_code} (Event likely deleted).")
         return True
-    else:
-        print(f"Error: API returned status {response.status_code}")
-        try:
-            error_details = response.json()
-            print(f"Response: {error_details}")
-            message = error_details.get('error') or error_details.get('message') or str(error_details)
-            print(f"API Error Details: {message}")
-        except requests.exceptions.JSONDecodeError:
-            # DELETE might return error messages not in JSON format
-            print(f"Response Text (non-JSON): {response.text}")
-        except Exception as e:
-             print(f"An error occurred processing the error response: {e}")
-        return False # Indicate failure
+    handle_response(response, success_status_codes) # Prints the API error details
+    return False # Indicate failure
 
 def ask_yes_no(prompt):
     """Asks a yes/no question and returns True for yes, False for no."""
@@ -145,7 +113,7 @@ def delete_event(event_data: Dict):
         print(f"Request Headers: {HEADERS}")
         
         try:
-            response = requests.delete(url, headers=HEADERS)
+            response = glownet.delete(url)
             if response.status_code in (200, 204):
                 print(f"Success with {id_type}!")
                 return True
@@ -1,103 +1,41 @@
-import os
 import requests
-import json
-import time
 import sys
+import time
+import argparse
 from datetime import datetime
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# --- Configuration ---
-# Construct the path to .env.local relative to this script file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(script_dir)  # Go up one level
-dotenv_path = os.path.join(parent_dir, '.env.local')
-
-print(f"Looking for .env.local at: {dotenv_path}")
-if not os.path.exists(dotenv_path):
-    print(f"Warning: .env.local not found at {dotenv_path}")
-else:
-    print(f"Found .env.local file")
-    
-load_dotenv(dotenv_path=dotenv_path)
+import glownet_client as glownet
+import glownet_mirror
+import glownet_summary_store as summary_store
+from glownet_entities import Customer, Gtag
+from glownet_client import GLOWNET_API_BASE_URL, handle_response
 
+# --- Configuration ---
 # Debug: Print environment variables (safely)
-print(f"GLOWNET_API_KEY present: {'Yes' if os.getenv('GLOWNET_API_KEY') else 'No'}")
-print(f"GLOWNET_API_BASE_URL: {os.getenv('GLOWNET_API_BASE_URL', 'https://opera.glownet.com')}")
-
-GLOWNET_API_BASE_URL = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com")
-GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
-
-if not GLOWNET_API_KEY:
-    print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
-    sys.exit(1)
+print(f"GLOWNET_API_KEY present: {'Yes' if glownet.GLOWNET_API_KEY else 'No'}")
+print(f"GLOWNET_API_BASE_URL: {GLOWNET_API_BASE_URL}")
 
-HEADERS = {
-    "Authorization": f"Token token={GLOWNET_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+glownet.require_api_key()
 
 # TARGET_EVENT_ID will be set dynamically
-SUMMARY_FILE_PATH = os.path.join(script_dir, "glownet_test_data_summary.json")
+# Events summarised at once in --all-events mode; they share the client's connection pool and rate limit
+GLOWNET_SUMMARY_EVENT_WORKERS = 4
 
 # --- Helper Functions ---
 
-def handle_response(response, success_status_codes=(200, 201)):
-    """Checks response status and returns JSON or raises error."""
-    if response.status_code in success_status_codes:
-        try:
-            if response.text:
-                return response.json()
-            else:
-                return None # Success, but no JSON body
-        except requests.exceptions.JSONDecodeError:
-            print(f"Warning: Successful status ({response.status_code}) but could not decode JSON.")
-            print(f"Response Text: {response.text}")
-            return None
-    else:
-        print(f"Error: API returned status {response.status_code}")
-        try:
-            error_details = response.json()
-            print(f"Response: {error_details}")
-            message = error_details.get('error') or error_details.get('message') or str(error_details)
-            print(f"API Error Details: {message}")
-        except requests.exceptions.JSONDecodeError:
-            print(f"Response Text (non-JSON): {response.text}")
-        # Instead of raising, return None to indicate failure to the caller
-        return None
-
 def get_all_events():
     """Fetches all events from the Glownet API."""
-    url = f"{GLOWNET_API_BASE_URL}/api/v2/events"
-    print(f"Fetching all events from {url}...")
-    all_events = []
-    page = 1
-    while True:
-        try:
-            params = {'page': page, 'per_page': 100} # Fetch 100 per page
-            response = requests.get(url, headers=HEADERS, params=params)
-            data = handle_response(response, success_status_codes=(200,))
-
-            if data is None:
-                print(f"  Failed to fetch events page {page}. Stopping event fetch.")
-                return None # Indicate overall failure
-            
-            if isinstance(data, list):
-                if not data: # Empty list indicates end of pages
-                    print(f"  Fetched {len(all_events)} events in total.")
-                    break
-                all_events.extend(data)
-                print(f"  Fetched page {page} ({len(data)} events). Total so far: {len(all_events)}.")
-                page += 1
-            else:
-                print(f"  Error: Expected a list of events but received type {type(data)}. Data: {data}")
-                return None # Indicate failure
-            
-            time.sleep(0.1) # Be nice to the API
-
-        except requests.exceptions.RequestException as e:
-            print(f"  Network error fetching events (page {page}): {e}")
-            return None # Indicate overall failure
+    mirrored = glownet_mirror.mirrored_events()
+    if mirrored is not None:
+        return mirrored
+    cursor = glownet.PageCursor(f"{GLOWNET_API_BASE_URL}/api/v2/events", per_page=100)
+    print(f"Fetching all events from {cursor.path}...")
+    all_events = list(glownet.iter_events(cursor))
+    if cursor.failed:
+        print(f"  Failed to fetch events page {cursor.page} after {len(all_events)} events. Stopping event fetch.")
+        return None # Indicate overall failure
+    print(f"  Fetched {len(all_events)} events in total.")
     return all_events
 
 def get_event_details(event_id):
@@ -105,81 +43,23 @@ def get_event_details(event_id):
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}"
     print(f"  Fetching Details for Event '{event_id}' from {url}...")
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = glownet.get(url)
         return handle_response(response, success_status_codes=(200,))
     except requests.exceptions.RequestException as e:
         print(f"  Network error fetching event details for '{event_id}': {e}")
         return None
 
-def get_event_customers(event_id):
-    """Retrieves all customers for a specific event."""
+def get_event_customers(event_id, fields=None):
+    """Retrieves all customers for a specific event, fetching pages concurrently. `fields` stream-decodes and projects them."""
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/customers"
     print(f"  Fetching Customers for Event '{event_id}' from {url}...")
-    all_customers = []
-    page = 1
-    while True:
-        try:
-            params = {'page': page}
-            response = requests.get(url, headers=HEADERS, params=params)
-            data = handle_response(response, success_status_codes=(200,))
-
-            if data is None:
-                print(f"  Failed to fetch customer page {page}. Stopping customer fetch.")
-                return None # Indicate overall failure
-
-            if isinstance(data, list):
-                if not data: # Empty list indicates end of pages
-                    print(f"  Fetched {len(all_customers)} customers in total.")
-                    break
-                all_customers.extend(data)
-                print(f"  Fetched page {page} ({len(data)} customers). Total so far: {len(all_customers)}.")
-                page += 1
-            else:
-                print(f"  Error: Expected a list of customers but received type {type(data)}. Data: {data}")
-                return None # Indicate failure
-
-            time.sleep(0.1) # Be nice to the API
-
-        except requests.exceptions.RequestException as e:
-            print(f"  Network error fetching customers (page {page}) for '{event_id}': {e}")
-            return None # Indicate overall failure
-
-    return all_customers
+    return glownet.fetch_all_pages(url, label="customers", fields=fields)
 
-def get_event_gtags(event_id):
-    """Retrieves all G-Tags (assets) for a specific event."""
+def get_event_gtags(event_id, fields=None):
+    """Retrieves all G-Tags (assets) for a specific event, fetching pages concurrently. `fields` stream-decodes and projects them."""
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_id}/gtags"
     print(f"  Fetching G-Tags for Event '{event_id}' from {url}...")
-    all_gtags = []
-    page = 1
-    while True:
-        try:
-            params = {'page': page}
-            response = requests.get(url, headers=HEADERS, params=params)
-            data = handle_response(response, success_status_codes=(200,))
-
-            if data is None:
-                print(f"  Failed to fetch G-Tag page {page}. Stopping G-Tag fetch.")
-                return None # Indicate overall failure
-
-            if isinstance(data, list):
-                if not data: # Empty list indicates end of pages
-                    print(f"  Fetched {len(all_gtags)} G-Tags in total.")
-                    break
-                all_gtags.extend(data)
-                print(f"  Fetched page {page} ({len(data)} G-Tags). Total so far: {len(all_gtags)}.")
-                page += 1
-            else:
-                print(f"  Error: Expected a list of G-Tags but received type {type(data)}. Data: {data}")
-                return None # Indicate failure
-
-            time.sleep(0.1) # Be nice to the API
-
-        except requests.exceptions.RequestException as e:
-            print(f"  Network error fetching G-Tags (page {page}) for '{event_id}': {e}")
-            return None # Indicate overall failure
-
-    return all_gtags
+    return glownet.fetch_all_pages(url, label="G-Tags", fields=fields)
 
 def print_formatted_summary(timestamp, target_event_id_for_print, event_details, customers_list, gtags_list, error_message):
     """Prints a formatted summary of the fetched data to the console."""
@@ -244,18 +124,175 @@ def print_formatted_summary(timestamp, target_event_id_for_print, event_details,
 
     print("=" * 40)
 
+def fetch_event_summary(target_event_id, stream=False):
+    """
+    Fetches details, customers and G-Tags for one event and returns the summary entry to store.
+
+    With stream=True, list pages are decoded incrementally and customers and G-Tags
+    are kept as compact glownet_entities records (only the fields the summary uses,
+    balances in integer cents).
+    """
+    fetch_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    event_details = None
+    customers_list = None
+    gtags_list = None
+    error_message = None
+
+    print(f"Fetching data for Event '{target_event_id}'...")
+    try:
+        event_details = get_event_details(target_event_id)
+        if event_details is not None:
+            # Only fetch children if event details were retrieved
+            customers_list = get_event_customers(target_event_id, Customer.FIELDS if stream else None)
+            gtags_list = get_event_gtags(target_event_id, Gtag.FIELDS if stream else None)
+            if stream:
+                customers_list = [Customer.from_api(item) for item in customers_list] if customers_list is not None else None
+                gtags_list = [Gtag.from_api(item) for item in gtags_list] if gtags_list is not None else None
+            if customers_list is None or gtags_list is None:
+                error_message = "Failed to retrieve customers or G-Tags."
+        else:
+            error_message = f"Failed to retrieve details for event '{target_event_id}'. It might not exist or API error occurred."
+
+    except Exception as e:
+        # Catch any unexpected errors during the fetch process
+        print(f"An unexpected error occurred during data fetch: {e}")
+        error_message = f"Unexpected error: {str(e)}"
+
+    return {
+        "timestamp": fetch_timestamp,
+        "target_event_id": target_event_id,
+        "event_details": event_details, # Will be None if fetch failed
+        "customers": customers_list, # Will be None if fetch failed
+        "gtags": gtags_list, # Will be None if fetch failed
+        "error": error_message # Will be None if everything succeeded
+    }
+
+def write_snapshot(summary_entry):
+    """Appends a summary entry to the snapshot store (as a delta when possible, never rewrites history). Returns True on success."""
+    print(f"Appending summary snapshot for '{summary_entry['target_event_id']}' to {summary_store.STORE_DIR}...")
+    try:
+        index_record = summary_store.append_snapshot(summary_entry)
+        print(f"Successfully wrote {index_record['kind']} summary snapshot ({index_record['length']} bytes to {index_record['segment']}).")
+        return True
+    except IOError as e:
+        print(f"Error writing summary snapshot: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred writing the summary snapshot: {e}")
+    return False
+
+def summarize_all_events(events, workers, stream=False):
+    """
+    Summarises many events concurrently and writes one snapshot per event.
+
+    All workers share the client's pooled session and adaptive rate limiter,
+    so the pool size and rate limit are the global request budget no matter
+    how many events run at once. Snapshots are written from this thread as
+    events finish. Returns a list of per-event result dicts.
+    """
+    identifiers = []
+    for event in events:
+        identifier = event.get('slug') or event.get('id')
+        if identifier is None:
+            print(f"  Warning: Skipping event without 'slug' or 'id': {event.get('name', 'N/A')}")
+            continue
+        identifiers.append(str(identifier))
+
+    print(f"Summarising {len(identifiers)} events with {workers} event workers "
+          f"(pool size {glownet.get_pool_size()}, rate limit {glownet.rate_limiter.rate:.1f} req/s)...")
+
+    def timed_fetch(target_event_id):
+        started_at = time.monotonic()
+        entry = fetch_event_summary(target_event_id, stream)
+        return entry, time.monotonic() - started_at
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(timed_fetch, identifier): identifier for identifier in identifiers}
+        for future in as_completed(futures):
+            identifier = futures[future]
+            try:
+                entry, elapsed = future.result()
+            except Exception as e:
+                print(f"  Unexpected error summarising event '{identifier}': {e}")
+                results.append({"event": identifier, "seconds": 0.0, "customers": None, "gtags": None,
+                                "error": f"Unexpected error: {e}", "stored": False})
+                continue
+            stored = write_snapshot(entry)
+            results.append({
+                "event": identifier,
+                "seconds": elapsed,
+                "customers": len(entry["customers"]) if entry["customers"] is not None else None,
+                "gtags": len(entry["gtags"]) if entry["gtags"] is not None else None,
+                "error": entry["error"],
+                "stored": stored,
+            })
+    return results
+
+def print_all_events_report(results, wall_seconds, request_count):
+    """Prints per-event timings and overall throughput for an --all-events run."""
+    print("\n" + "=" * 40)
+    print("--- All-Events Summary Report ---")
+    print(f"{'Event':<30} {'Time (s)':>9} {'Customers':>10} {'G-Tags':>8}  Status")
+    for result in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        customers = result["customers"] if result["customers"] is not None else "-"
+        gtags = result["gtags"] if result["gtags"] is not None else "-"
+        if result["error"]:
+            status = f"ERROR: {result['error']}"
+        else:
+            status = "OK" if result["stored"] else "FETCHED (snapshot not written)"
+        print(f"{result['event']:<30} {result['seconds']:>9.2f} {customers:>10} {gtags:>8}  {status}")
+    print("-" * 40)
+    failed = sum(1 for r in results if r["error"] or not r["stored"])
+    rate = request_count / wall_seconds if wall_seconds > 0 else 0.0
+    print(f"Events: {len(results) - failed} succeeded, {failed} failed")
+    print(f"Wall time: {wall_seconds:.2f}s, requests: {request_count} ({rate:.1f} req/s)")
+    print("=" * 40)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch a Glownet event summary and store it as a snapshot.")
+    parser.add_argument("--all-events", action="store_true", help="Summarise every event concurrently instead of prompting for one")
+    parser.add_argument("--state", help="With --all-events, only summarise events in this state (e.g. 'launched')")
+    parser.add_argument("--event-workers", type=int, default=GLOWNET_SUMMARY_EVENT_WORKERS,
+                        help=f"Events summarised at once (default: {GLOWNET_SUMMARY_EVENT_WORKERS})")
+    parser.add_argument("--max-rps", type=float, help="Global request budget in requests per second (default: GLOWNET_RATE_LIMIT)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Decode list pages incrementally into compact records with only the fields the summary uses (caps memory on large events)")
+    parser.add_argument("--pool-size", type=int, help="Connections shared by all workers (default: GLOWNET_POOL_SIZE)")
+    return parser.parse_args()
+
 # --- Main Script ---
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting Glownet data summary fetch...")
     print(f"API Base URL: {GLOWNET_API_BASE_URL}")
     print("-" * 30)
 
+    if args.pool_size:
+        glownet.configure_pool(args.pool_size)
+    if args.max_rps:
+        glownet.configure_rate_limit(args.max_rps, max_rate=args.max_rps)
+
     events = get_all_events()
 
     if not events:
         print("No events found or failed to fetch events. Exiting.")
         sys.exit(1)
 
+    if args.all_events:
+        if args.state:
+            events = [event for event in events if event.get('state') == args.state]
+            print(f"{len(events)} events in state '{args.state}'.")
+            if not events:
+                sys.exit(0)
+        requests_before = glownet.connection_stats()["requests"]
+        run_started_at = time.monotonic()
+        results = summarize_all_events(events, max(1, args.event_workers), args.stream)
+        wall_seconds = time.monotonic() - run_started_at
+        print_all_events_report(results, wall_seconds, glownet.connection_stats()["requests"] - requests_before)
+        print("-" * 30)
+        print("Summary Fetch Script finished.")
+        sys.exit(1 if any(r["error"] or not r["stored"] for r in results) else 0)
+
     print("\nAvailable Events:")
     for i, event in enumerate(events):
         event_name = event.get('name', 'N/A')
@@ -295,92 +332,19 @@ if __name__ == "__main__":
     print(f"Proceeding to fetch summary for Event: {TARGET_EVENT_ID}")
     print("-" * 30)
     
-    fetch_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    event_details = None
-    customers_list = None
-    gtags_list = None
-    error_message = None
-
-    # 1. Fetch data for the target event
-    print(f"Fetching data for Event '{TARGET_EVENT_ID}'...")
-    try:
-        event_details = get_event_details(TARGET_EVENT_ID)
-        if event_details is not None:
-            # Only fetch children if event details were retrieved
-            customers_list = get_event_customers(TARGET_EVENT_ID)
-            gtags_list = get_event_gtags(TARGET_EVENT_ID)
-            if customers_list is None or gtags_list is None:
-                error_message = "Failed to retrieve customers or G-Tags."
-        else:
-            error_message = f"Failed to retrieve details for event '{TARGET_EVENT_ID}'. It might not exist or API error occurred."
-
-    except Exception as e:
-        # Catch any unexpected errors during the fetch process
-        print(f"An unexpected error occurred during data fetch: {e}")
-        error_message = f"Unexpected error: {str(e)}"
-
-    # 2. Prepare the summary entry for this run
-    current_summary_entry = {
-        "timestamp": fetch_timestamp,
-        "target_event_id": TARGET_EVENT_ID,
-        "event_details": event_details, # Will be None if fetch failed
-        "customers": customers_list, # Will be None if fetch failed
-        "gtags": gtags_list, # Will be None if fetch failed
-        "error": error_message # Will be None if everything succeeded
-    }
+    current_summary_entry = fetch_event_summary(TARGET_EVENT_ID, args.stream)
+    error_message = current_summary_entry["error"]
 
     if error_message:
         print(f"Summary generation completed with errors: {error_message}")
     else:
         print("Summary generation completed successfully.")
 
-    # 3. Load existing data and append the new entry
-    print(f"Loading existing summary data from {SUMMARY_FILE_PATH}...")
-    all_summaries = []
-    try:
-        # Check if file exists before trying to open
-        if os.path.exists(SUMMARY_FILE_PATH):
-            with open(SUMMARY_FILE_PATH, 'r', encoding='utf-8') as f:
-                try:
-                    all_summaries = json.load(f)
-                    # Basic validation: Is it a list?
-                    if not isinstance(all_summaries, list):
-                        print(f"Warning: Existing summary file '{SUMMARY_FILE_PATH}' does not contain a valid JSON list. Starting fresh.")
-                        all_summaries = []
-                    else:
-                        print(f"  Loaded {len(all_summaries)} existing summary entries.")
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode JSON from '{SUMMARY_FILE_PATH}'. Starting fresh.")
-                    all_summaries = []
-        else:
-             print("  Summary file does not exist. Creating a new one.")
-             all_summaries = [] # Ensure it's a list if file doesn't exist
-
-    except IOError as e:
-        print(f"Error reading summary file '{SUMMARY_FILE_PATH}': {e}. Proceeding with empty data.")
-        all_summaries = []
-    except Exception as e:
-        # Catch other potential errors during file loading
-        print(f"An unexpected error occurred loading the summary file: {e}. Proceeding with empty data.")
-        all_summaries = []
-
-    # Append the new summary
-    all_summaries.append(current_summary_entry)
-    print(f"Appended new summary. Total entries now: {len(all_summaries)}")
-
-    # 4. Write updated data back to the file
-    print(f"Writing updated summary data to {SUMMARY_FILE_PATH}...")
-    try:
-        with open(SUMMARY_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(all_summaries, f, indent=4, ensure_ascii=False)
-        print("Successfully wrote updated summary.")
-    except IOError as e:
-        print(f"Error writing updated summary file: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred writing the summary file: {e}")
+    write_snapshot(current_summary_entry)
 
     # Print the formatted summary of the *current* fetch to the console
-    print_formatted_summary(fetch_timestamp, TARGET_EVENT_ID, event_details, customers_list, gtags_list, error_message)
+    print_formatted_summary(current_summary_entry["timestamp"], TARGET_EVENT_ID, current_summary_entry["event_details"],
+                            current_summary_entry["customers"], current_summary_entry["gtags"], error_message)
 
     print("-" * 30)
     print("Summary Fetch Script finished.") 
\ No newline at end of file
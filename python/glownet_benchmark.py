@@ -0,0 +1,324 @@
+# samachi-app/python/glownet_benchmark.py
+"""
+Benchmarks the Glownet tooling hot paths against the local mock API.
+
+For every event size a fresh glownet_mock_server.py is started and seeded with
+one event holding that many G-Tags (and 80% as many customers). Each scenario
+then runs in its own Python process, so peak RSS is per scenario:
+
+    pagination    get_event_customers + get_event_gtags (fetch_glownet_summary.py)
+    streaming     the same with stream-decoded, projected pages (--stream)
+    throttled     streamed customer pages from a second, rate-limited mock with a
+                  2-connection pool (throttled streams must not exhaust the pool)
+    screening     screen_customer_balances (reset_glownet_balances.py)
+    persistence   summary snapshot append + latest read (glownet_summary_store.py)
+    provisioning  run_bulk_provisioning (create_glownet_assets.py --bulk)
+
+Each result records wall time, requests, requests/s, p50/p95/p99 latency
+(per HTTP request, or per store operation for persistence) and peak RSS.
+Results are written as JSON so runs of different versions can be compared:
+
+    python glownet_benchmark.py --sizes 1000,10000 --output before.json
+    python glownet_benchmark.py --sizes 1000,10000 --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+from glownet_metrics import percentile
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(script_dir, "benchmarks")
+MOCK_SERVER_PATH = os.path.join(script_dir, "glownet_mock_server.py")
+SCENARIOS = ("pagination", "streaming", "throttled", "screening", "persistence", "provisioning")
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# --- Measurement Helpers ---
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where the resource module is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Scenarios (run inside a child process pointed at the mock) ---
+# Each returns (items processed, latencies to report, wall seconds or None to time the whole call)
+
+def _scenario_pagination(event_id, size, latencies):
+    import fetch_glownet_summary
+    customers = fetch_glownet_summary.get_event_customers(event_id)
+    gtags = fetch_glownet_summary.get_event_gtags(event_id)
+    if customers is None or gtags is None:
+        raise RuntimeError("pagination failed")
+    return len(customers) + len(gtags), latencies, None
+
+def _scenario_streaming(event_id, size, latencies):
+    import glownet_client as glownet
+    import fetch_glownet_summary
+    customers = fetch_glownet_summary.get_event_customers(event_id, glownet.CUSTOMER_FIELDS)
+    gtags = fetch_glownet_summary.get_event_gtags(event_id, glownet.GTAG_FIELDS)
+    if customers is None or gtags is None:
+        raise RuntimeError("streaming pagination failed")
+    return len(customers) + len(gtags), latencies, None
+
+def _scenario_throttled(event_id, size, latencies, max_customers=3000, rate_limit=3, timeout=120):
+    import threading
+    import glownet_client as glownet
+    import glownet_mock_server
+    # Own in-process mock: answers 429 beyond rate_limit req/s, so streamed pages get retried
+    mock = glownet_mock_server.MockGlownet(glownet_mock_server.load_spec(), rate_limit=rate_limit, seed=1)
+    mock.seed(1, min(size, max_customers), 0)
+    server, base_url = glownet_mock_server.start_in_thread(mock)
+    glownet.configure_pool(2)
+    glownet.configure_rate_limit(rate_limit * 4)
+    result = {}
+    fetch = lambda: result.update(customers=glownet.fetch_all_pages(
+        f"{base_url}/api/v2/events/1/customers", per_page=200, fields=glownet.CUSTOMER_FIELDS, label="customers"))
+    thread = threading.Thread(target=fetch, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    server.shutdown()
+    if thread.is_alive():
+        raise RuntimeError(f"throttled streaming fetch still blocked after {timeout}s")
+    if result.get("customers") is None:
+        raise RuntimeError("throttled streaming pagination failed")
+    return len(result["customers"]), latencies, None
+
+def _scenario_screening(event_id, size, latencies):
+    import glownet_client as glownet
+    import reset_glownet_balances
+    event_obj = glownet.handle_response(glownet.get(f"/api/v2/events/{event_id}"))
+    checked, with_balance, unconfirmed_ids = reset_glownet_balances.screen_customer_balances(event_id, event_obj)
+    if checked is None or unconfirmed_ids:
+        raise RuntimeError("screening failed")
+    return checked, latencies, None
+
+def _mutate_records(records, fraction, rng, field):
+    """Changes the amount in `field` of a random fraction of records, as between two real snapshots."""
+    for record in rng.sample(records, max(1, int(len(records) * fraction))) if records else ():
+        record[field] = f"{rng.randint(1, 100000) / 100}"
+
+def _scenario_persistence(event_id, size, latencies, appends=5, changed_fraction=0.01):
+    import random
+    import glownet_client as glownet
+    import glownet_summary_store as summary_store
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "target_event_id": event_id,
+        "event_details": glownet.handle_response(glownet.get(f"/api/v2/events/{event_id}")),
+        "customers": glownet.fetch_all_pages(f"/api/v2/events/{event_id}/customers", label="customers"),
+        "gtags": glownet.fetch_all_pages(f"/api/v2/events/{event_id}/gtags", label="G-Tags"),
+        "error": None,
+    }
+    operation_latencies = []
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as store_dir:
+        for append in range(appends):
+            if append: # Later snapshots differ from the previous one in a few records, so appends store real deltas
+                _mutate_records(entry["customers"], changed_fraction, rng, "money")
+                _mutate_records(entry["gtags"], changed_fraction, rng, "final_balance")
+            op_started_at = time.perf_counter()
+            summary_store.append_snapshot(entry, store_dir)
+            operation_latencies.append(time.perf_counter() - op_started_at)
+        op_started_at = time.perf_counter()
+        summary_store.read_latest_snapshot(event_id, store_dir)
+        operation_latencies.append(time.perf_counter() - op_started_at)
+    # Only the store operations count for this scenario
+    return len(entry["customers"]) + len(entry["gtags"]), operation_latencies, sum(operation_latencies)
+
+def _scenario_provisioning(event_id, size, latencies, max_items=10000):
+    import create_glownet_assets
+    from glownet_journal import Journal
+    customers = min(size, max_items) // 2
+    spec = {
+        "event": event_id,
+        "tag_prefix": f"bench{int(time.time())}",
+        "customers": customers,
+        "assigned_gtags": customers,
+        "topup_cents": 500,
+        "unassigned_gtags": min(size, max_items) - customers,
+        "workers": {"customers": 8, "gtags": 8, "topups": 8},
+    }
+    with tempfile.TemporaryDirectory() as journal_dir:
+        journal = Journal(os.path.join(journal_dir, "bench.journal.jsonl"))
+        stage_stats = create_glownet_assets.run_bulk_provisioning(spec, journal)
+        journal.close()
+    failed = sum(stats.failed for stats in stage_stats.values())
+    if failed:
+        raise RuntimeError(f"{failed} provisioning calls failed")
+    return sum(stats.succeeded for stats in stage_stats.values()), latencies, None
+
+def run_scenario(name, event_id, size):
+    """Runs one scenario in this process and returns its result dict."""
+    import glownet_client as glownet
+    latencies = []
+    glownet.add_response_hook(lambda response, *args, **kwargs: latencies.append(response.elapsed.total_seconds()))
+
+    scenario = globals()[f"_scenario_{name}"]
+    error = None
+    items = 0
+    wall_seconds = None
+    started_at = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull # The scripts print per item; keep that out of the parent's output
+        try:
+            items, measured, wall_seconds = scenario(event_id, size, latencies)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            measured = latencies
+        finally:
+            sys.stdout = stdout
+    if wall_seconds is None:
+        wall_seconds = time.perf_counter() - started_at
+
+    http_scenario = measured is latencies
+    measured = sorted(measured)
+    return {
+        "scenario": name,
+        "size": size,
+        "items": items,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": len(latencies) if http_scenario else None,
+        "requests_per_second": round(len(latencies) / wall_seconds, 1) if http_scenario and wall_seconds > 0 else None,
+        "latency_ms": {label: round(percentile(measured, fraction) * 1000, 2) if measured else None
+                       for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        "peak_rss_mb": peak_rss_mb(),
+        "error": error,
+    }
+
+# --- Orchestration ---
+
+def _discard_lines(stream):
+    for _ in stream:
+        pass
+
+def start_mock(size, extra_args):
+    """Starts a seeded mock server and returns (process, base_url)."""
+    command = [sys.executable, "-u", MOCK_SERVER_PATH, "--port", "0", "--events", "1",
+               "--gtags", str(size), "--customers", str(int(size * 0.8))] + extra_args
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for line in process.stdout:
+        if "listening on " in line:
+            # Keep reading what the mock prints afterwards: a full pipe would block its request handlers
+            threading.Thread(target=_discard_lines, args=(process.stdout,), daemon=True).start()
+            return process, line.rsplit("listening on ", 1)[1].strip()
+    process.wait()
+    raise RuntimeError(f"Mock server exited with status {process.returncode} before listening")
+
+def run_in_child(name, size, base_url, event_id, client_rate):
+    env = dict(os.environ, GLOWNET_API_BASE_URL=base_url, GLOWNET_API_KEY="benchmark",
+               GLOWNET_RATE_LIMIT=str(client_rate), GLOWNET_HTTP_CACHE="0", GLOWNET_USE_MIRROR="0")
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "_run", name, event_id, str(size)],
+                               env=env, cwd=script_dir, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    tail = (completed.stderr or completed.stdout).strip().splitlines()[-1:] or ["no output"]
+    return {"scenario": name, "size": size, "error": f"child exited with status {completed.returncode}: {tail[0]}"}
+
+def print_results(results, baseline=None):
+    """Prints a results table, with wall-time change against a baseline run if given."""
+    previous = {(r["scenario"], r["size"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'Scenario':<13} {'Size':>7} {'Wall (s)':>9} {'Req':>7} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7}"
+          + ("  vs baseline" if baseline else ""))
+    for result in results:
+        if result.get("error"):
+            print(f"{result['scenario']:<13} {result['size']:>7}  ERROR: {result['error']}")
+            continue
+        latency = result["latency_ms"]
+        fmt = lambda value: "-" if value is None else value
+        line = (f"{result['scenario']:<13} {result['size']:>7} {result['wall_seconds']:>9.2f} {fmt(result['requests']):>7} "
+                f"{fmt(result['requests_per_second']):>8} {fmt(latency['p50']):>8} {fmt(latency['p95']):>8} "
+                f"{fmt(latency['p99']):>8} {fmt(result['peak_rss_mb']):>7}")
+        before = previous.get((result["scenario"], result["size"]))
+        if before and not before.get("error") and before.get("wall_seconds"):
+            change = (result["wall_seconds"] - before["wall_seconds"]) / before["wall_seconds"] * 100
+            line += f"  {change:+.1f}% wall"
+        print(line)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Glownet tooling hot paths against the local mock API.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma separated G-Tag counts per event")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--client-rate", type=float, default=5000, help="GLOWNET_RATE_LIMIT for the scripts under test")
+    parser.add_argument("--mock-args", default="", help="Extra glownet_mock_server.py flags, e.g. \"--latency lognormal:20:0.5\"")
+    parser.add_argument("--output", help="Results file (default: benchmarks/glownet-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare wall times against")
+    return parser.parse_args()
+
+# --- Main Script ---
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "_run":
+        # Child process: run one scenario and hand the result back on stdout
+        result = run_scenario(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        print(RESULT_MARKER + json.dumps(result), flush=True)
+        # A scenario that failed on a blocked request leaves non-daemon worker threads
+        # behind, and a normal exit would wait on them forever
+        os._exit(0)
+
+    args = parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"Error: Unknown scenario(s): {', '.join(unknown)}")
+        sys.exit(1)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    run = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "client_rate": args.client_rate,
+        "mock_args": args.mock_args,
+        "results": [],
+    }
+    for size in sizes:
+        print(f"Starting mock API with {size} G-Tags...")
+        process, base_url = start_mock(size, args.mock_args.split())
+        try:
+            for name in scenarios:
+                print(f"  Running {name} ({size})...", flush=True)
+                result = run_in_child(name, size, base_url, "1", args.client_rate)
+                run["results"].append(result)
+                if result.get("error"):
+                    print(f"    Error: {result['error']}")
+                else:
+                    print(f"    {result['wall_seconds']:.2f}s, {result['items']} items")
+        finally:
+            process.terminate()
+            process.wait()
+
+    output_path = args.output or os.path.join(BENCHMARK_DIR, f"glownet-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+
+    print("\n" + "=" * 40)
+    print_results(run["results"], baseline)
+    print("=" * 40)
+    print(f"Results written to {output_path}")
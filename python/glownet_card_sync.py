@@ -0,0 +1,360 @@
+# samachi-app/python/glownet_card_sync.py
+"""
+Standalone Glownet card sync: the work of /api/cards/sync-glownet without the
+serverless time limit.
+
+The route syncs events one after another, pages G-Tags with 200 ms sleeps and
+upserts 100-card batches serially. This worker lists the G-Tags of all events
+concurrently (sharing the client's connection pool and adaptive rate limit)
+and bulk-upserts membership_cards rows in large batches straight into
+Postgres as events finish. It reports the same {total, synced, failed} stats
+as the route.
+
+Rows are written like the route writes them (glownet_status 'ACTIVE',
+glownet_event_id, last_synced, sync_status 'success'), except that an
+existing card keeps its status: only new cards start as 'unregistered'. A
+failed batch marks its cards sync_status 'failed' with the error.
+
+--type incremental only upserts cards whose fingerprint (a hash of event,
+status, owner and balance, kept per target database and tag_uid in a local
+SQLite file) changed since they were last synced; unchanged cards are
+counted but not written.
+Fingerprints are recorded by every successful upsert, full syncs included,
+and only after the batch is committed, so a failed batch is retried by the
+next run.
+
+Postgres needs psycopg2 (pip install psycopg2-binary) and a connection string
+in SUPABASE_DB_URL or DATABASE_URL. --sqlite PATH writes to a local SQLite
+stand-in with the same membership_cards columns instead, for trying the
+worker against the mock server without a database.
+verify_glownet_card_stores.py runs both stores through the same syncs and
+compares the results.
+
+With --json, stdout carries only the JSON result; everything else (the
+client's .env.local notes, progress, the exit-time connection report) goes
+to stderr.
+
+Usage:
+    python glownet_card_sync.py [--type full|incremental] [--sqlite PATH] [--batch-size N] [--event-workers N] [--json]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from decimal import Decimal
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Decided before glownet_client is imported, since it prints while loading
+JSON_OUTPUT = __name__ == "__main__" and "--json" in sys.argv[1:]
+result_stream = sys.stdout
+if JSON_OUTPUT:
+    sys.stdout = sys.stderr
+
+import glownet_client as glownet
+from glownet_entities import Gtag
+
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError: # Only needed for the Postgres store
+    psycopg2 = None
+
+CARD_SYNC_DB_URL = os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+CARD_SYNC_BATCH_SIZE = 1000 # Cards per upsert statement
+CARD_SYNC_EVENT_WORKERS = 4 # Events whose G-Tags are listed at once
+CARD_GTAG_FIELDS = Gtag.FIELDS # Everything the fingerprint covers
+CARD_FINGERPRINT_PATH = os.getenv("GLOWNET_CARD_FINGERPRINT_PATH", os.path.join(glownet.script_dir, "glownet_card_fingerprints.sqlite3"))
+
+# --- Card Stores ---
+
+class PostgresCardStore:
+    """membership_cards in Postgres (Supabase), written with multi-row INSERT ... ON CONFLICT."""
+
+    UPSERT_SQL = """
+        INSERT INTO membership_cards (card_identifier, glownet_status, status, glownet_event_id, last_synced, sync_status, sync_error)
+        VALUES %s
+        ON CONFLICT (card_identifier) DO UPDATE SET
+            glownet_status = EXCLUDED.glownet_status,
+            glownet_event_id = EXCLUDED.glownet_event_id,
+            last_synced = EXCLUDED.last_synced,
+            sync_status = EXCLUDED.sync_status,
+            sync_error = NULL
+    """
+
+    def __init__(self, dsn):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is required for the Postgres card store (pip install psycopg2-binary)")
+        self.conn = psycopg2.connect(dsn)
+        # Names the database for the fingerprint store; hashed so the credentials are not written to disk
+        self.target = f"postgres:{hashlib.sha256(dsn.encode('utf-8')).hexdigest()[:16]}"
+
+    def upsert_cards(self, rows):
+        """Upserts (card_identifier, glownet_event_id, synced_at) rows in one transaction."""
+        with self.conn, self.conn.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor, self.UPSERT_SQL,
+                [(card_id, 'ACTIVE', 'unregistered', event_id, synced_at, 'success', None) for card_id, event_id, synced_at in rows],
+                page_size=len(rows))
+
+    def mark_failed(self, card_ids, error, attempted_at):
+        with self.conn, self.conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE membership_cards SET sync_status = 'failed', last_sync_attempt = %s, sync_error = %s "
+                "WHERE card_identifier = ANY(%s)", (attempted_at, error, list(card_ids)))
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+class SqliteCardStore:
+    """Local stand-in for membership_cards with the same columns and upsert semantics."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS membership_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        card_identifier TEXT NOT NULL UNIQUE,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        glownet_event_id INTEGER,
+        glownet_status TEXT,
+        last_sync_attempt TEXT,
+        last_synced TEXT,
+        status TEXT NOT NULL DEFAULT 'unregistered',
+        sync_error TEXT,
+        sync_status TEXT,
+        user_id TEXT
+    );
+    """
+    UPSERT_SQL = """
+        INSERT INTO membership_cards (card_identifier, glownet_status, status, glownet_event_id, last_synced, sync_status, sync_error)
+        VALUES (?, 'ACTIVE', 'unregistered', ?, ?, 'success', NULL)
+        ON CONFLICT (card_identifier) DO UPDATE SET
+            glownet_status = excluded.glownet_status,
+            glownet_event_id = excluded.glownet_event_id,
+            last_synced = excluded.last_synced,
+            sync_status = excluded.sync_status,
+            sync_error = NULL
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        self.target = f"sqlite:{os.path.abspath(path)}"
+
+    def upsert_cards(self, rows):
+        with self.conn:
+            self.conn.executemany(self.UPSERT_SQL, rows)
+
+    def mark_failed(self, card_ids, error, attempted_at):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE membership_cards SET sync_status = 'failed', last_sync_attempt = ?, sync_error = ? WHERE card_identifier = ?",
+                [(attempted_at, error, card_id) for card_id in card_ids])
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+class FingerprintStore:
+    """
+    Last synced fingerprint per tag_uid for one target card store (its .target),
+    loaded into memory and written back after each committed batch. Fingerprints
+    only say what that database already holds, so every target keeps its own.
+    """
+
+    def __init__(self, target, path=CARD_FINGERPRINT_PATH):
+        self.target = target
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS card_fingerprints (target TEXT NOT NULL, tag_uid TEXT NOT NULL, "
+                          "fingerprint TEXT NOT NULL, synced_at TEXT NOT NULL, PRIMARY KEY (target, tag_uid))")
+        self.fingerprints = dict(self.conn.execute("SELECT tag_uid, fingerprint FROM card_fingerprints WHERE target = ?", (target,)))
+
+    def changed(self, tag_uid, fingerprint):
+        return self.fingerprints.get(tag_uid) != fingerprint
+
+    def record(self, fingerprints, synced_at):
+        """Stores {tag_uid: fingerprint} for cards that were just upserted."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO card_fingerprints (target, tag_uid, fingerprint, synced_at) VALUES (?, ?, ?, ?)",
+                                  [(self.target, tag_uid, fingerprint, synced_at) for tag_uid, fingerprint in fingerprints.items()])
+        self.fingerprints.update(fingerprints)
+
+    def close(self):
+        self.conn.close()
+
+# --- Sync ---
+
+def card_fingerprint(event_id, gtag):
+    """Short hash of what a card's sync depends on: its event, status flags, owner and balance."""
+    tag = Gtag.from_api(gtag)
+    # Balance written as the bare amount ("500", "0.4") so fingerprints from older runs still match
+    key = f"{event_id}|{tag.status}|{tag.active}|{tag.banned}|{tag.customer_id}|{Decimal(tag.final_balance or 0).scaleb(-2).normalize():f}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+def list_event_cards(event_id):
+    """Returns (G-Tag dicts, complete) for an event. Like the route, a failed page keeps the cards fetched before it."""
+    cursor = glownet.PageCursor(glownet.api_url(f"/api/v2/events/{event_id}/gtags"), glownet.GLOWNET_MAX_PER_PAGE)
+    gtags = [gtag for gtag in glownet.iter_event_gtags(event_id, CARD_GTAG_FIELDS, cursor) if gtag.get("tag_uid")]
+    return gtags, not cursor.failed
+
+class CardBatcher:
+    """
+    Collects cards and upserts them in batches, keeping the route's stats.
+
+    With a FingerprintStore and incremental=True, cards whose fingerprint is
+    unchanged are counted as total and unchanged but not upserted.
+    """
+
+    def __init__(self, store, batch_size=CARD_SYNC_BATCH_SIZE, fingerprints=None, incremental=False):
+        self.store = store
+        self.batch_size = batch_size
+        self.fingerprints = fingerprints
+        self.incremental = incremental and fingerprints is not None
+        self.pending = {} # card_identifier -> (event_id, fingerprint); a card seen again in the batch keeps the later event
+        self.pending_count = 0 # Listing occurrences behind self.pending, counted like the route counts cards
+        self.stats = {"total": 0, "synced": 0, "failed": 0, "unchanged": 0}
+        self.batches = 0
+
+    def add(self, gtags, event_id):
+        """Queues an event's G-Tags. Returns how many of them were queued as changed or new."""
+        self.stats["total"] += len(gtags)
+        queued = 0
+        for gtag in gtags:
+            card_id = str(gtag["tag_uid"])
+            fingerprint = card_fingerprint(event_id, gtag) if self.fingerprints is not None else None
+            if self.incremental and not self.fingerprints.changed(card_id, fingerprint):
+                self.stats["unchanged"] += 1
+                continue
+            queued += 1
+            self.pending[card_id] = (event_id, fingerprint)
+            self.pending_count += 1
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+        return queued
+
+    def flush(self):
+        if not self.pending:
+            return
+        synced_at = datetime.now(timezone.utc).isoformat()
+        rows = [(card_id, event_id, synced_at) for card_id, (event_id, _) in self.pending.items()]
+        self.batches += 1
+        try:
+            self.store.upsert_cards(rows)
+        except Exception as e:
+            print(f"  Error upserting batch {self.batches} ({len(rows)} cards): {e}")
+            self.stats["failed"] += self.pending_count
+            try:
+                self.store.rollback()
+                self.store.mark_failed(self.pending.keys(), str(e), synced_at)
+            except Exception as track_error:
+                print(f"  Failed to record the failure on the batch's cards: {track_error}")
+        else:
+            self.stats["synced"] += self.pending_count
+            if self.fingerprints is not None:
+                # A lost fingerprint write only means the cards are upserted again next time
+                try:
+                    self.fingerprints.record({card_id: fingerprint for card_id, (_, fingerprint) in self.pending.items()}, synced_at)
+                except sqlite3.Error as e:
+                    print(f"  Warning: Could not record fingerprints for batch {self.batches}: {e}")
+        self.pending = {}
+        self.pending_count = 0
+
+def sync_cards(store, events=None, batch_size=CARD_SYNC_BATCH_SIZE, event_workers=CARD_SYNC_EVENT_WORKERS,
+               fingerprints=None, sync_type="full"):
+    """
+    Syncs the G-Tags of all events into membership_cards. Returns the result dict the route returns.
+
+    G-Tag listings run on `event_workers` threads; upserts happen on this
+    thread as each event's listing completes, so fetching and writing overlap.
+    sync_type="incremental" (with a FingerprintStore) only upserts changed or
+    new cards; the result then also carries per-event change counts.
+    """
+    if events is None:
+        cursor = glownet.PageCursor(glownet.api_url("/api/v2/events"), per_page=100)
+        events = list(glownet.iter_events(cursor))
+        if cursor.failed:
+            print(f"  Failed to list events (page {cursor.page}); syncing the {len(events)} events fetched so far.")
+    events = [event for event in events if event.get("id") is not None]
+    if not events:
+        print("No Glownet events found to sync.")
+        return {"message": "No events to sync", "stats": {"total": 0, "synced": 0, "failed": 0}}
+
+    print(f"Starting {sync_type} Glownet card sync of {len(events)} events ({event_workers} event workers, batches of {batch_size})...")
+    batcher = CardBatcher(store, batch_size, fingerprints, incremental=sync_type == "incremental")
+    changes = {}
+    with ThreadPoolExecutor(max_workers=max(1, event_workers)) as executor:
+        futures = {executor.submit(list_event_cards, event["id"]): event for event in events}
+        for future in as_completed(futures):
+            event = futures[future]
+            try:
+                gtags, complete = future.result()
+            except Exception as e:
+                print(f"  Error fetching G-Tags for event {event.get('name', 'N/A')} (ID: {event['id']}): {e}")
+                continue
+            if not complete:
+                print(f"  Error fetching G-Tags for event {event.get('name', 'N/A')} (ID: {event['id']}); "
+                      f"syncing the {len(gtags)} cards fetched before the failure.")
+            if not gtags:
+                print(f"  No cards found for event {event.get('name', 'N/A')}")
+                continue
+            changes[event["id"]] = batcher.add(gtags, event["id"])
+            print(f"  Found {len(gtags)} cards for event {event.get('name', 'N/A')} (ID: {event['id']}), {changes[event['id']]} to upsert")
+    batcher.flush()
+
+    stats = batcher.stats
+    result = {
+        "message": f"Card sync completed. Processed: {stats['total']}, Synced: {stats['synced']}, Failed: {stats['failed']}",
+        "stats": stats,
+    }
+    if batcher.incremental:
+        result["message"] += f", Unchanged: {stats['unchanged']}"
+        result["changes"] = changes
+    return result
+
+def open_store(sqlite_path=None, dsn=CARD_SYNC_DB_URL):
+    if sqlite_path:
+        return SqliteCardStore(sqlite_path)
+    if not dsn:
+        print("Error: Set SUPABASE_DB_URL or DATABASE_URL in .env.local, or pass --sqlite PATH.")
+        sys.exit(1)
+    return PostgresCardStore(dsn)
+
+# --- Main Script ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync Glownet G-Tags into membership_cards without the serverless route.")
+    parser.add_argument("--type", choices=("full", "incremental"), default="full",
+                        help="incremental only upserts cards that changed since they were last synced")
+    parser.add_argument("--fingerprints", default=CARD_FINGERPRINT_PATH, help="Fingerprint database used to detect changed cards")
+    parser.add_argument("--sqlite", help="Write to a local SQLite stand-in at this path instead of Postgres")
+    parser.add_argument("--batch-size", type=int, default=CARD_SYNC_BATCH_SIZE, help=f"Cards per upsert (default: {CARD_SYNC_BATCH_SIZE})")
+    parser.add_argument("--event-workers", type=int, default=CARD_SYNC_EVENT_WORKERS,
+                        help=f"Events listed at once (default: {CARD_SYNC_EVENT_WORKERS})")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON (same shape as the route's response)")
+    args = parser.parse_args()
+
+    glownet.require_api_key()
+    store = open_store(args.sqlite)
+    fingerprints = FingerprintStore(store.target, args.fingerprints)
+    start_time = time.monotonic()
+    try:
+        result = sync_cards(store, batch_size=max(1, args.batch_size), event_workers=args.event_workers,
+                            fingerprints=fingerprints, sync_type=args.type)
+    finally:
+        store.close()
+        fingerprints.close()
+    elapsed = time.monotonic() - start_time
+    if args.json:
+        print(json.dumps(result), file=result_stream, flush=True)
+    else:
+        print(result["message"])
+        print(f"Finished in {elapsed:.2f}s ({result['stats']['total'] / elapsed if elapsed > 0 else 0.0:.0f} cards/s).")
+    sys.exit(1 if result["stats"]["failed"] else 0)
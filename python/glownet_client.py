@@ -0,0 +1,533 @@
+# samachi-app/python/glownet_client.py
+"""
+Shared Glownet API client for the python/ tooling scripts.
+
+Holds the .env.local configuration, a single pooled requests.Session (so every
+call reuses the same keep-alive connections to the Glownet host) and the common
+response handling that used to be copy-pasted into each script.
+"""
+import os
+import sys
+import json
+import math
+import codecs
+import atexit
+import time
+import asyncio
+import requests
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from glownet_rate_limiter import AdaptiveRateLimiter, THROTTLE_STATUS_CODES
+from glownet_http_cache import HttpCache
+from glownet_metrics import registry as metrics
+
+# --- Configuration ---
+# Construct the path to .env.local relative to this script file
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)  # Go up one level
+dotenv_path = os.path.join(parent_dir, '.env.local')
+
+print(f"Looking for .env.local at: {dotenv_path}")
+if not os.path.exists(dotenv_path):
+    print(f"Warning: .env.local not found at {dotenv_path}")
+else:
+    print(f"Found .env.local file")
+
+load_dotenv(dotenv_path=dotenv_path)
+
+# Get base URL from env or use default, ensure it doesn't end with a slash
+GLOWNET_API_BASE_URL = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com").rstrip('/')
+GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
+# Max keep-alive connections held open to the Glownet host
+GLOWNET_POOL_SIZE = int(os.getenv("GLOWNET_POOL_SIZE", "10"))
+# List endpoints accept up to 1000 per page (see glownet_api_docs.json)
+GLOWNET_MAX_PER_PAGE = 1000
+# Fields the scripts read from list pages; streaming decoders keep only these
+CUSTOMER_FIELDS = ("id", "first_name", "last_name", "email", "virtual_money", "money", "balances")
+GTAG_FIELDS = ("id", "tag_uid", "status", "active", "banned", "customer_id", "credits", "final_balance", "balance")
+STREAM_CHUNK_SIZE = 64 * 1024
+# Pages fetched in parallel by the paginator
+GLOWNET_PAGE_CONCURRENCY = int(os.getenv("GLOWNET_PAGE_CONCURRENCY", "4"))
+# Starting requests-per-second; the limiter backs off on 429/503 and ramps back up
+GLOWNET_RATE_LIMIT = float(os.getenv("GLOWNET_RATE_LIMIT", "10"))
+GLOWNET_RATE_LIMIT_MAX = float(os.getenv("GLOWNET_RATE_LIMIT_MAX", str(GLOWNET_RATE_LIMIT * 4)))
+# Retries for throttled requests (429 for any method, 503 for GET only)
+GLOWNET_MAX_RETRIES = int(os.getenv("GLOWNET_MAX_RETRIES", "5"))
+# Opt-in disk cache for rarely changing GET endpoints (events, currencies, stations)
+GLOWNET_HTTP_CACHE = os.getenv("GLOWNET_HTTP_CACHE") == "1"
+GLOWNET_HTTP_CACHE_DIR = os.getenv("GLOWNET_HTTP_CACHE_DIR", os.path.join(script_dir, ".glownet_http_cache"))
+GLOWNET_HTTP_CACHE_MAX_MB = float(os.getenv("GLOWNET_HTTP_CACHE_MAX_MB", "50"))
+# Optional per-endpoint metrics export at exit: *.json for JSON, anything else for Prometheus text format
+GLOWNET_METRICS_OUT = os.getenv("GLOWNET_METRICS_OUT")
+
+HEADERS = {
+    "Authorization": f"Token token={GLOWNET_API_KEY}",
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+_session = None
+_pool_size = GLOWNET_POOL_SIZE
+_report_registered = False
+_response_hooks = [] # Installed on every session, including ones rebuilt by configure_pool()
+rate_limiter = AdaptiveRateLimiter(GLOWNET_RATE_LIMIT, max_rate=GLOWNET_RATE_LIMIT_MAX)
+http_cache = None
+
+# --- Session Management ---
+
+def require_api_key():
+    """Exits the calling script if no Glownet API key is configured."""
+    if not GLOWNET_API_KEY:
+        print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
+        sys.exit(1)
+
+def configure_rate_limit(rate, max_rate=None):
+    """Replaces the shared rate limiter with one starting at `rate` requests per second."""
+    global rate_limiter
+    rate_limiter = AdaptiveRateLimiter(rate, max_rate=max_rate)
+
+def enable_cache(cache_dir=GLOWNET_HTTP_CACHE_DIR, max_mb=GLOWNET_HTTP_CACHE_MAX_MB):
+    """Turns on the on-disk GET response cache (also enabled by GLOWNET_HTTP_CACHE=1)."""
+    global http_cache
+    http_cache = HttpCache(cache_dir, max_bytes=int(max_mb * 1024 * 1024))
+    return http_cache
+
+def configure_pool(pool_size):
+    """Sets the connection pool size. Rebuilds the session if one already exists."""
+    global _session, _pool_size
+    _pool_size = max(1, int(pool_size))
+    if _session is not None:
+        _session.close()
+        _session = None
+
+def add_response_hook(hook):
+    """Registers a requests response hook `hook(response, *args, **kwargs)` on the shared session."""
+    _response_hooks.append(hook)
+    if _session is not None:
+        _session.hooks["response"].append(hook)
+
+def get_pool_size():
+    """Returns the configured connection pool size."""
+    return _pool_size
+
+def get_session():
+    """Returns the shared pooled session, creating it on first use."""
+    global _session, _report_registered
+    if _session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        session.hooks["response"].extend(_response_hooks)
+        # pool_block makes extra worker threads wait for a free connection
+        # instead of opening throwaway ones that are closed after one request.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+        if not _report_registered:
+            atexit.register(print_connection_report)
+            _report_registered = True
+    return _session
+
+def api_url(path):
+    """Builds a full URL from an API path (e.g. '/api/v2/events'). Full URLs pass through."""
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{GLOWNET_API_BASE_URL}{path}"
+
+# --- Requests ---
+
+def request(method, path, **kwargs):
+    """
+    Sends a request through the shared session under the adaptive rate limit.
+
+    Throttled responses (429, or 503 on a GET) are retried up to
+    GLOWNET_MAX_RETRIES times after the limiter has backed off. Every attempt
+    is recorded in the per-endpoint metrics. Raises
+    requests.exceptions.RequestException on network errors.
+    """
+    url = api_url(path)
+    attempts = 0
+    while True:
+        sent_at = rate_limiter.acquire()
+        started_at = time.perf_counter()
+        try:
+            response = get_session().request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.record(method, url, "error", time.perf_counter() - started_at, retry=attempts > 0)
+            raise
+        # Streamed bodies are not read here, so fall back to the declared length for them
+        size = int(response.headers.get("Content-Length") or 0) if kwargs.get("stream") else len(response.content)
+        metrics.record(method, url, response.status_code, time.perf_counter() - started_at, size, retry=attempts > 0)
+        rate_limiter.on_response(response.status_code, response.headers.get("Retry-After"), sent_at)
+        if kwargs.get("stream") and response.status_code >= 400:
+            # An unread streamed body holds its connection, and the pool blocks when it runs
+            # out: load the (small) error body and hand the connection back before retrying
+            response.content
+            response.close()
+        retryable = response.status_code == 429 or (response.status_code in THROTTLE_STATUS_CODES and method == "GET")
+        if not retryable or attempts >= GLOWNET_MAX_RETRIES:
+            return response
+        attempts += 1
+        print(f"  Throttled ({response.status_code}) on {method} {url}. Retrying ({attempts}/{GLOWNET_MAX_RETRIES}) at {rate_limiter.rate:.1f} req/s...")
+
+def get(path, params=None, cache=True, **kwargs):
+    """GET through the response cache when enabled. Pass cache=False for reads that must hit the server."""
+    if http_cache is None or not cache:
+        return request("GET", path, params=params, **kwargs)
+    url = api_url(path)
+    headers = kwargs.pop("headers", None)
+    def send(request_headers):
+        return request("GET", url, params=params, headers=request_headers, **kwargs)
+    return http_cache.get(send, url, urlparse(url).path, params, headers)
+
+def post(path, json=None, **kwargs):
+    return request("POST", path, json=json, **kwargs)
+
+def patch(path, json=None, **kwargs):
+    return request("PATCH", path, json=json, **kwargs)
+
+def delete(path, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+def handle_response(response, success_status_codes=(200, 201), error_value=None):
+    """Checks response status and returns JSON, None for an empty body, or error_value on failure."""
+    if response.status_code in success_status_codes:
+        try:
+            if response.text:
+                return response.json()
+            else:
+                return None # Success, but no JSON body (e.g., 204 No Content)
+        except requests.exceptions.JSONDecodeError:
+            print(f"Warning: Successful status ({response.status_code}) but could not decode JSON.")
+            print(f"Response Text: {response.text}")
+            return None # Still success, just no parsable body
+    else:
+        print(f"Error: API returned status {response.status_code}")
+        try:
+            error_details = response.json()
+            print(f"Response: {error_details}")
+            if isinstance(error_details, dict):
+                message = error_details.get('error') or error_details.get('message') or str(error_details)
+            else:
+                message = str(error_details)
+            print(f"API Error Details: {message}")
+        except requests.exceptions.JSONDecodeError:
+            print(f"Response Text (non-JSON): {response.text}")
+        return error_value # Indicate failure to the caller
+
+# --- Streaming Decoding ---
+
+def project(item, fields):
+    """Returns a dict with only `fields` of an API item (non-dict items pass through)."""
+    if fields is None or not isinstance(item, dict):
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+def iter_json_array(response, fields=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Decodes a JSON array response body one element at a time.
+
+    The body is read in chunks (request it with stream=True), so only the
+    current chunk and element are held in memory; each element is reduced to
+    `fields` before it is yielded. Raises ValueError if the body is not a
+    complete JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    chunks = response.iter_content(chunk_size)
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        while pos < len(buffer) and (buffer[pos] in " \t\r\n" or (started and buffer[pos] == ",")):
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array, got '{buffer[pos:pos + 40]}'")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A scalar ending exactly at the buffer edge may continue in the next chunk
+                complete = end < len(buffer) or eof or isinstance(item, (dict, list))
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Truncated or malformed JSON array in response body")
+                complete = False
+            if complete:
+                pos = end
+                yield project(item, fields)
+                continue
+        elif eof:
+            raise ValueError("Truncated JSON array in response body")
+
+        # Need more input: drop what was consumed and append the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += text_decoder.decode(b"", final=True)
+            eof = True
+        else:
+            buffer += text_decoder.decode(chunk)
+
+# --- Pagination ---
+
+def _total_from_headers(response):
+    """Returns the total record count if the server advertises one, otherwise None."""
+    for header in ("Total", "X-Total", "X-Total-Count"):
+        value = response.headers.get(header)
+        if value is not None and str(value).isdigit():
+            return int(value)
+    return None
+
+def fetch_page(path, page, per_page, params=None, fields=None):
+    """
+    Fetches one list page. Returns (items, response) or (None, response/None) on failure.
+
+    With `fields`, the page is decoded as a stream and each item keeps only those fields.
+    """
+    page_params = dict(params or {})
+    page_params.update({'page': page, 'per_page': per_page})
+    try:
+        response = get(path, params=page_params, stream=fields is not None)
+        if fields is not None and response.status_code == 200:
+            try:
+                return list(iter_json_array(response, fields)), response
+            except ValueError as e:
+                print(f"  Error decoding page {page} of {path}: {e}")
+                return None, response
+            finally:
+                response.close()
+    except requests.exceptions.RequestException as e:
+        print(f"  Network error fetching page {page} of {path}: {e}")
+        return None, None
+    data = handle_response(response, success_status_codes=(200,))
+    if not isinstance(data, list):
+        if data is not None:
+            print(f"  Error: Expected a list but received type {type(data)} on page {page} of {path}.")
+        return None, response
+    return data, response
+
+async def fetch_all_pages_async(path, per_page=GLOWNET_MAX_PER_PAGE, concurrency=GLOWNET_PAGE_CONCURRENCY,
+                                params=None, label="items", fields=None):
+    """
+    Fetches every page of a list endpoint with bounded concurrency.
+
+    A page shorter than per_page marks the end of the list, so no trailing empty
+    page is requested. When the server sends a total count header, exactly the
+    remaining pages are requested; otherwise pages are fetched ahead in a window
+    of `concurrency`, no page is scheduled past the first short page, and a
+    failed page that turns out to lie past the end is ignored. With `fields`,
+    pages are stream-decoded and items keep only those fields. Returns all
+    items in page order, or None if a page within the list fails.
+    """
+    first_page, first_response = await asyncio.to_thread(fetch_page, path, 1, per_page, params, fields)
+    if first_page is None:
+        print(f"  Failed to fetch page 1 of {label}. Stopping fetch.")
+        return None
+    print(f"  Fetched page 1 ({len(first_page)} {label}).")
+    if len(first_page) < per_page:
+        print(f"  Fetched {len(first_page)} {label} in total.")
+        return first_page
+
+    pages = {1: first_page}
+    total = _total_from_headers(first_response)
+    # Last page number once known; pages beyond it are never requested
+    last_page = math.ceil(total / per_page) if total is not None else None
+    next_page = 2
+    # First failed page; nothing past it is scheduled, and it only fails the
+    # fetch if a short page does not show it lies past the end
+    failed_page = None
+
+    async def worker():
+        nonlocal next_page, last_page, failed_page
+        while True:
+            if last_page is not None and next_page > last_page:
+                return
+            if failed_page is not None and next_page > failed_page:
+                return
+            page = next_page
+            next_page += 1
+            data, _ = await asyncio.to_thread(fetch_page, path, page, per_page, params, fields)
+            if data is None:
+                if last_page is None or page <= last_page:
+                    print(f"  Failed to fetch page {page} of {label}. Stopping fetch.")
+                failed_page = page if failed_page is None else min(failed_page, page)
+                continue
+            pages[page] = data
+            print(f"  Fetched page {page} ({len(data)} {label}).")
+            if len(data) < per_page:
+                # Short (or empty) page: nothing exists past it
+                end = page if data else page - 1
+                last_page = end if last_page is None else min(last_page, end)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    if failed_page is not None and (last_page is None or failed_page <= last_page):
+        return None
+
+    all_items = []
+    for page in sorted(pages):
+        if last_page is None or page <= last_page:
+            all_items.extend(pages[page])
+    print(f"  Fetched {len(all_items)} {label} in total.")
+    return all_items
+
+def fetch_all_pages(path, per_page=GLOWNET_MAX_PER_PAGE, concurrency=GLOWNET_PAGE_CONCURRENCY,
+                    params=None, label="items", fields=None):
+    """Blocking wrapper around fetch_all_pages_async for the synchronous scripts."""
+    return asyncio.run(fetch_all_pages_async(path, per_page, concurrency, params, label, fields))
+
+# --- Iterator Listings ---
+
+class PageCursor:
+    """
+    Position of a paginated listing: the next page to fetch.
+
+    iter_pages() advances it once the consumer comes back for the next page, so
+    after a failure (cursor.failed) or an early stop the pages already consumed
+    stay valid and a new iter_pages() call with the same cursor continues from
+    the first page not fully consumed (at-least-once delivery). to_dict()
+    / from_dict() let a cursor be saved, e.g. in a journal, and resumed later.
+    """
+
+    def __init__(self, path, per_page=GLOWNET_MAX_PER_PAGE, params=None, page=1, fetched=0, done=False):
+        self.path = path
+        self.per_page = per_page
+        self.params = dict(params or {})
+        self.page = page
+        self.fetched = fetched
+        self.done = done
+        self.failed = False
+        self.error = None
+
+    def to_dict(self):
+        return {"path": self.path, "per_page": self.per_page, "params": self.params,
+                "page": self.page, "fetched": self.fetched, "done": self.done}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["path"], data.get("per_page", GLOWNET_MAX_PER_PAGE), data.get("params"),
+                   data.get("page", 1), data.get("fetched", 0), data.get("done", False))
+
+    def __repr__(self):
+        state = "done" if self.done else ("failed" if self.failed else "open")
+        return f"PageCursor({self.path}, page={self.page}, fetched={self.fetched}, {state})"
+
+def iter_pages(cursor, fields=None, prefetch=True, label="items"):
+    """
+    Yields the pages of a listing as they arrive, starting at cursor.page.
+
+    With prefetch, the next page is requested on a background thread while the
+    caller processes the current one, so downstream work overlaps the network.
+    A short page ends the listing (cursor.done). On failure the generator stops
+    and sets cursor.failed / cursor.error instead of raising; everything
+    already consumed remains valid and the cursor points at the failed page.
+    """
+    if cursor.done:
+        return
+    cursor.failed = False
+    cursor.error = None
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    fetch = lambda page: fetch_page(cursor.path, page, cursor.per_page, cursor.params, fields)
+    try:
+        pending = executor.submit(fetch, cursor.page) if executor else None
+        while True:
+            data, _ = pending.result() if executor else fetch(cursor.page)
+            if data is None:
+                cursor.failed = True
+                cursor.error = f"Failed to fetch page {cursor.page} of {label}"
+                print(f"  {cursor.error} ({cursor.fetched} fetched so far).")
+                return
+            last = len(data) < cursor.per_page
+            if executor and not last:
+                pending = executor.submit(fetch, cursor.page + 1)
+            if data:
+                yield data
+            # Only reached once the consumer asks for more, i.e. has finished this page
+            cursor.page += 1
+            cursor.fetched += len(data)
+            cursor.done = last
+            if last:
+                return
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def iter_items(cursor, fields=None, prefetch=True, label="items"):
+    """Yields the individual items of a listing; see iter_pages() for cursor and failure semantics."""
+    for page in iter_pages(cursor, fields, prefetch, label):
+        yield from page
+
+def iter_events(cursor=None, per_page=100):
+    """Yields every event of the organisation. Pass a PageCursor to inspect failure or resume."""
+    return iter_items(cursor or PageCursor(api_url("/api/v2/events"), per_page), label="events")
+
+def iter_event_customers(event_id, fields=None, cursor=None, per_page=GLOWNET_MAX_PER_PAGE):
+    """Yields an event's customers as pages arrive (projected onto `fields` if given)."""
+    cursor = cursor or PageCursor(api_url(f"/api/v2/events/{event_id}/customers"), per_page)
+    return iter_items(cursor, fields, label="customers")
+
+def iter_event_gtags(event_id, fields=None, cursor=None, per_page=GLOWNET_MAX_PER_PAGE):
+    """Yields an event's G-Tags as pages arrive (projected onto `fields` if given)."""
+    cursor = cursor or PageCursor(api_url(f"/api/v2/events/{event_id}/gtags"), per_page)
+    return iter_items(cursor, fields, label="G-Tags")
+
+# --- Connection Reuse Reporting ---
+
+def connection_stats():
+    """Returns request/connection counters for the shared session's pools."""
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+    if _session is None:
+        return stats
+    # The same adapter is mounted for http:// and https://, count it once
+    adapters = {id(adapter): adapter for adapter in _session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+def print_connection_report():
+    """Prints how many requests were served over reused keep-alive connections."""
+    stats = connection_stats()
+    if not stats["requests"]:
+        return
+    reuse_pct = 100.0 * stats["reused"] / stats["requests"]
+    print("-" * 40)
+    print("Glownet Connection Report:")
+    print(f"  Requests sent: {stats['requests']}")
+    print(f"  Connections opened: {stats['connections']} (pool size: {_pool_size})")
+    print(f"  Requests on reused connections: {stats['reused']} ({reuse_pct:.1f}%)")
+    if http_cache is not None:
+        cache_stats = http_cache.stats()
+        print(f"  Response cache: {cache_stats['hits']} hits, {cache_stats['revalidated']} revalidated (304), {cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
+    limiter_stats = rate_limiter.stats()
+    print(f"  Throttled responses: {limiter_stats['throttled']}, final rate: {limiter_stats['rate']} req/s, time waiting on limiter: {limiter_stats['wait_seconds']}s")
+    print("-" * 40)
+    metrics.print_table()
+    if GLOWNET_METRICS_OUT:
+        try:
+            metrics.write(GLOWNET_METRICS_OUT)
+            print(f"Endpoint metrics written to {GLOWNET_METRICS_OUT}")
+        except IOError as e:
+            print(f"Error writing endpoint metrics to {GLOWNET_METRICS_OUT}: {e}")
+    print("-" * 40)
+
+# Opt-in response cache, see enable_cache()
+if GLOWNET_HTTP_CACHE:
+    enable_cache()
@@ -0,0 +1,273 @@
+# samachi-app/python/glownet_entities.py
+"""
+Compact in-memory records for Glownet customers and G-Tags.
+
+Raw API dicts carry every field the server returns and cost several hundred
+bytes each before counting their values. These __slots__ records keep only
+the fields the scripts use and intern repeated strings such as G-Tag
+statuses, so a full large event takes a fraction of the memory and iterates
+faster. Money fields are parsed once at construction into integer cents
+(parse_cents) and only rendered back to the API's forms by .get() and
+to_api(): decimal strings ("3.0") for money fields, floats for 'balances'.
+parse_amount() reads API values as exact Decimals (never through float,
+never rounded). The records expose .get() like the API dicts they replace.
+
+BalanceColumns decodes the balances of a whole customer page into integer-cent
+columns (parse_cents: hundredths of the API amount) in one pass, for screening
+large events without building records. NumPy is used for the column
+operations when it is installed.
+"""
+import re
+import sys
+import math
+import operator
+from array import array
+from decimal import Decimal, ROUND_UP
+from itertools import compress, repeat
+
+try:
+    import numpy
+except ImportError: # Optional: BalanceColumns falls back to plain Python over the arrays
+    numpy = None
+
+CENTS_PER_UNIT = 100 # parse_cents scale: "3.25" is 325
+
+_NUMBER_PATTERN = re.compile(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+_ZERO = Decimal(0)
+
+def parse_amount(value):
+    """
+    Parses an API money value (int, float or numeric string such as "3.0") to an exact Decimal.
+
+    The API sends decimal amounts ("money": "3.0", balances {"46483": 0.4}),
+    so fractions are kept as they are. Malformed or missing values count as 0
+    (checked up front, so bad values never raise).
+    """
+    if isinstance(value, bool):
+        return _ZERO
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        value = repr(value) if math.isfinite(value) else ""
+    elif not isinstance(value, str):
+        return _ZERO
+    text = value.strip()
+    if not _NUMBER_PATTERN.fullmatch(text):
+        return _ZERO
+    return Decimal(text)
+
+def parse_cents(value):
+    """
+    Parses an API money value to integer hundredths of it ("3.25" -> 325, 0.4 -> 40).
+
+    Amounts with up to two decimals are exact. A finer fraction is rounded
+    away from zero, so a positive amount never becomes 0.
+    """
+    return int((parse_amount(value) * CENTS_PER_UNIT).to_integral_value(rounding=ROUND_UP))
+
+def format_cents(cents):
+    """Renders parse_cents() hundredths the way the API writes amounts: "3.0", "0.4", "12.25"."""
+    text = f"{Decimal(cents).scaleb(-2):f}".rstrip("0")
+    return text + "0" if text.endswith(".") else text
+
+def _cents_or_none(value):
+    return parse_cents(value) if value is not None else None
+
+def _amount_or_none(cents):
+    return format_cents(cents) if cents is not None else None
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _int_or_none(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class Customer:
+    """A customer as used by the summary and balance screening: identity plus balances in integer cents."""
+
+    # Fields read from list pages (same as glownet_client.CUSTOMER_FIELDS)
+    FIELDS = ("id", "first_name", "last_name", "email", "virtual_money", "money", "balances")
+    __slots__ = ("id", "first_name", "last_name", "email", "virtual_money", "money", "balances")
+
+    def __init__(self, id, first_name="", last_name="", email="", virtual_money=None, money=None, balances=()):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.virtual_money = virtual_money
+        self.money = money
+        self.balances = balances # Tuple of (credit id, cents) pairs
+
+    @classmethod
+    def from_api(cls, data):
+        balances = data.get("balances")
+        return cls(
+            _int_or_none(data.get("id")),
+            _intern(data.get("first_name")),
+            _intern(data.get("last_name")),
+            data.get("email"),
+            _cents_or_none(data.get("virtual_money")),
+            _cents_or_none(data.get("money")),
+            tuple((_intern(str(credit_id)), parse_cents(amount)) for credit_id, amount in balances.items())
+            if isinstance(balances, dict) else (),
+        )
+
+    @property
+    def has_balance(self):
+        """True if any balance field is positive, however small."""
+        return ((self.money or 0) > 0 or (self.virtual_money or 0) > 0
+                or any(cents > 0 for _, cents in self.balances))
+
+    @property
+    def name(self):
+        return f"{self.first_name or ''} {self.last_name or ''}".strip()
+
+    def get(self, field, default=None):
+        """Dict-style access for code written against API dicts (amounts in the API's forms)."""
+        if field == "balances":
+            return {credit_id: cents / CENTS_PER_UNIT for credit_id, cents in self.balances}
+        if field in ("money", "virtual_money"):
+            return _amount_or_none(getattr(self, field))
+        return getattr(self, field, default) if field in self.__slots__ else default
+
+    def to_api(self):
+        return {field: self.get(field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return (f"Customer(id={self.id}, email={self.email!r}, money={_amount_or_none(self.money)}, "
+                f"virtual_money={_amount_or_none(self.virtual_money)})")
+
+class Gtag:
+    """A G-Tag as used by the summary: identity, owner, status and balances in integer cents."""
+
+    # Same as glownet_client.GTAG_FIELDS
+    FIELDS = ("id", "tag_uid", "status", "active", "banned", "customer_id", "credits", "final_balance", "balance")
+    __slots__ = ("id", "tag_uid", "status", "active", "banned", "customer_id", "credits", "final_balance")
+
+    def __init__(self, id, tag_uid="", status=None, active=True, banned=False, customer_id=None, credits=None, final_balance=None):
+        self.id = id
+        self.tag_uid = tag_uid
+        self.status = status
+        self.active = active
+        self.banned = banned
+        self.customer_id = customer_id
+        self.credits = credits
+        self.final_balance = final_balance
+
+    @classmethod
+    def from_api(cls, data):
+        final_balance = data.get("final_balance")
+        if final_balance is None and isinstance(data.get("balance"), dict):
+            final_balance = data["balance"].get("cents")
+        return cls(
+            _int_or_none(data.get("id")),
+            data.get("tag_uid"),
+            _intern(data.get("status")),
+            bool(data.get("active", True)),
+            bool(data.get("banned", False)),
+            _int_or_none(data.get("customer_id")),
+            _cents_or_none(data.get("credits")),
+            _cents_or_none(final_balance),
+        )
+
+    def get(self, field, default=None):
+        """Dict-style access for code written against API dicts ('balance' maps to final_balance, amounts in the API's form)."""
+        if field == "balance":
+            return {"cents": _amount_or_none(self.final_balance)}
+        if field in ("credits", "final_balance"):
+            return _amount_or_none(getattr(self, field))
+        return getattr(self, field, default) if field in self.__slots__ else default
+
+    def to_api(self):
+        return {field: self.get(field) for field in self.__slots__}
+
+    def __repr__(self):
+        return (f"Gtag(id={self.id}, tag_uid={self.tag_uid!r}, customer_id={self.customer_id}, "
+                f"final_balance={_amount_or_none(self.final_balance)})")
+
+class BalanceColumns:
+    """
+    Integer-cent balance columns for one page of customers (list view).
+
+    Columns line up by position: ids, money, virtual_money, credit and
+    virtual_credit (the 'balances' entries for the event's credit and
+    virtual_credit ids) and other (largest balance held in any other
+    currency), all array('q') in parse_cents() hundredths. A missing
+    customer id is stored as 0.
+    """
+
+    __slots__ = ("ids", "money", "virtual_money", "credit", "virtual_credit", "other")
+    COLUMNS = ("money", "virtual_money", "credit", "virtual_credit", "other")
+
+    def __init__(self):
+        self.ids = array('q')
+        for column in self.COLUMNS:
+            setattr(self, column, array('q'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_page(cls, items, credit_id=None, virtual_credit_id=None):
+        """Decodes customer dicts (or Customer records) in a single pass."""
+        columns = cls()
+        credit_key = str(credit_id) if credit_id is not None else None
+        virtual_credit_key = str(virtual_credit_id) if virtual_credit_id is not None else None
+        ids, money, virtual_money = columns.ids, columns.money, columns.virtual_money
+        credit, virtual_credit, other = columns.credit, columns.virtual_credit, columns.other
+        for item in items:
+            balances = item.get("balances")
+            credit_cents = virtual_credit_cents = other_cents = 0
+            if isinstance(balances, dict):
+                for currency_id, amount in balances.items():
+                    cents = parse_cents(amount)
+                    if currency_id == credit_key:
+                        credit_cents = cents
+                    elif currency_id == virtual_credit_key:
+                        virtual_credit_cents = cents
+                    elif cents > other_cents:
+                        other_cents = cents
+            ids.append(_int_or_none(item.get("id")) or 0)
+            money.append(parse_cents(item.get("money")))
+            virtual_money.append(parse_cents(item.get("virtual_money")))
+            credit.append(credit_cents)
+            virtual_credit.append(virtual_credit_cents)
+            other.append(other_cents)
+        return columns
+
+    @classmethod
+    def for_event(cls, items, event):
+        """from_page with the credit ids taken from an event's credit / virtual_credit metadata."""
+        return cls.from_page(items, (event.get("credit") or {}).get("id"), (event.get("virtual_credit") or {}).get("id"))
+
+    def holders(self):
+        """Positions of customers holding a positive balance in any column, however small."""
+        columns = [getattr(self, column) for column in self.COLUMNS]
+        if numpy is not None and len(self):
+            mask = numpy.zeros(len(self), dtype=bool)
+            for column in columns:
+                mask |= numpy.frombuffer(column, dtype=numpy.int64) > 0
+            return numpy.flatnonzero(mask).tolist()
+        # Row maxima across the columns, compared with 0, all inside builtins
+        return list(compress(range(len(self)), map(operator.gt, map(max, *columns), repeat(0))))
+
+    def totals(self):
+        """Sum of each balance column in parse_cents() hundredths."""
+        return {column: sum(getattr(self, column)) for column in self.COLUMNS}
+
+def encode_entity(obj):
+    """json.dumps default= hook: writes entities as API-shaped dicts."""
+    if isinstance(obj, (Customer, Gtag)):
+        return obj.to_api()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def compact_snapshot(snapshot):
+    """Converts the customers and G-Tags of a loaded summary snapshot to compact records, in place."""
+    for key, model in (("customers", Customer), ("gtags", Gtag)):
+        items = snapshot.get(key)
+        if isinstance(items, list):
+            snapshot[key] = [model.from_api(item) for item in items]
+    return snapshot
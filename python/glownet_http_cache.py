@@ -0,0 +1,176 @@
+# samachi-app/python/glownet_http_cache.py
+"""
+Opt-in on-disk cache for Glownet GET responses.
+
+Entries are keyed by URL and query params. Only endpoints listed in
+CACHE_TTLS are cached: within their TTL a stored response is served
+directly, after it the server is revalidated with If-None-Match /
+If-Modified-Since when the response carried an ETag or Last-Modified.
+The cache directory is kept under a byte budget by evicting the least
+recently used entries. Its size is tracked as entries are written; the
+directory is only scanned when the budget is exceeded, and eviction then
+goes down to EVICT_TO_FRACTION of it so the next scan is some writes away.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Per-endpoint TTLs in seconds, matched against the URL path. Endpoints not listed are never cached.
+CACHE_TTLS = [
+    (re.compile(r"/api/v2/events$"), 300),
+    (re.compile(r"/api/v2/events/(?!lookup$)[^/]+$"), 300), # Not /events/lookup: tag lookups must stay live
+    (re.compile(r"/api/v2/events/[^/]+/currencies(/[^/]+)?$"), 3600),
+    (re.compile(r"/api/v2/events/[^/]+/stations(/[^/]+)?$"), 3600),
+]
+EVICT_TO_FRACTION = 0.9 # Eviction stops below this share of max_bytes
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Total", "X-Total", "X-Total-Count")
+
+def ttl_for_path(path):
+    """Returns the cache TTL for an API path, or None if the endpoint is not cacheable."""
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.search(path):
+            return ttl
+    return None
+
+def _to_response(entry, url):
+    """Rebuilds a requests.Response from a stored cache entry."""
+    response = requests.models.Response()
+    response.status_code = entry["status"]
+    response._content = entry["body"].encode('utf-8')
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = 'utf-8'
+    response.url = url
+    return response
+
+class HttpCache:
+    """File-per-entry response cache with TTL, conditional revalidation and LRU size eviction."""
+
+    def __init__(self, cache_dir, max_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._lock = threading.Lock() # Eviction and the tracked size
+        self._stats_lock = threading.Lock()
+        self._size = None # Bytes in cache_dir: scanned on the first write, then tracked
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _key(self, url, params):
+        raw = json.dumps([url, sorted((str(k), str(v)) for k, v in (params or {}).items())])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return None
+
+    def _save(self, key, entry):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        try:
+            added = os.path.getsize(tmp_path) - os.path.getsize(path)
+        except OSError: # New entry
+            added = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self._evict(added)
+
+    def _evict(self, added):
+        """
+        Adds `added` bytes to the tracked size. Over max_bytes, rescans the directory
+        and removes least recently used entries (oldest mtime) until under
+        EVICT_TO_FRACTION of it.
+        """
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+                if self._size <= self.max_bytes:
+                    return
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            entries.sort(reverse=True) # Oldest last
+            if total > self.max_bytes:
+                while total > self.max_bytes * EVICT_TO_FRACTION and entries:
+                    _, size, path = entries.pop()
+                    try:
+                        os.remove(path)
+                        total -= size
+                        self._count("evictions")
+                    except OSError:
+                        pass
+            self._size = total # Also corrects for entries other processes wrote or removed
+
+    def get(self, send, url, path, params=None, headers=None):
+        """
+        Serves a GET through the cache. `send(headers)` performs the real request.
+
+        Returns the requests.Response to hand back to the caller. Non-cacheable
+        endpoints go straight to `send`.
+        """
+        ttl = ttl_for_path(path)
+        if ttl is None:
+            return send(headers)
+
+        key = self._key(url, params)
+        entry = self._load(key)
+        now = time.time()
+        if entry is not None and now - entry["stored_at"] < ttl:
+            self._count("hits")
+            os.utime(self._path(key)) # Mark as recently used
+            return _to_response(entry, url)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry["headers"].get("ETag"):
+                request_headers["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                request_headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = send(request_headers)
+        if response.status_code == 304 and entry is not None:
+            self._count("revalidated")
+            entry["stored_at"] = now
+            self._save(key, entry)
+            return _to_response(entry, url)
+
+        self._count("misses")
+        if response.status_code == 200:
+            self._save(key, {
+                "url": url,
+                "status": response.status_code,
+                "headers": {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+                "body": response.content.decode('utf-8', errors='replace'),
+                "stored_at": now,
+            })
+        return response
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated, "evictions": self.evictions}
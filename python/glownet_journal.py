@@ -0,0 +1,125 @@
+# samachi-app/python/glownet_journal.py
+"""
+Crash-safe write-ahead journal for long-running bulk Glownet mutations.
+
+Each mutation is journaled as an intent before it is sent and as done (or
+failed) once the API has answered. Records are compact JSON lines:
+
+    {"k": "refund:n7a-madrid:1234", "s": "i", "d": {...}}   intent
+    {"k": "refund:n7a-madrid:1234", "s": "d", "d": {...}}   done
+    {"k": "refund:n7a-madrid:1234", "s": "f", "d": {...}}   failed
+
+Intents are durable before the caller proceeds: concurrent writers share a
+single fsync (group commit), so a batch of in-flight intents costs one disk
+flush. Completions are fsync'd in batches, because losing one only means the
+item is re-checked on resume instead of being skipped.
+
+On --resume, load_journal() replays the file: done items are skipped and
+intended-but-unfinished items are re-checked against the API before retrying.
+"""
+import os
+import json
+import time
+import threading
+
+STATE_INTENDED = "i"
+STATE_DONE = "d"
+STATE_FAILED = "f"
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "journals")
+
+def journal_path(name):
+    """Default journal location for a named run (e.g. 'reset-n7a-madrid')."""
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))
+    return os.path.join(JOURNAL_DIR, f"{safe_name}.journal.jsonl")
+
+def load_journal(path):
+    """
+    Replays a journal file into {key: {"state": ..., "data": {...}}}.
+
+    The latest record for a key wins, and data is merged so a done record keeps
+    the fields of its intent. A truncated last line (crash mid-write) is ignored.
+    """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entry = entries.setdefault(record["k"], {"state": None, "data": {}})
+            entry["state"] = record["s"]
+            entry["data"].update(record.get("d") or {})
+    return entries
+
+class Journal:
+    """Append-only, group-committed journal. Safe to use from many worker threads."""
+
+    def __init__(self, path, fsync_every=200, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._cond = threading.Condition()
+        self._written = 0 # Records handed to the file object
+        self._synced = 0 # Records known to be on disk
+        self._syncing = False
+        self._last_sync = time.monotonic()
+        self.fsync_count = 0
+
+    def _sync_up_to(self, target):
+        """Makes sure records up to `target` are on disk. Must be called holding self._cond."""
+        while self._synced < target:
+            if self._syncing:
+                self._cond.wait() # Another thread's fsync may cover us
+                continue
+            self._syncing = True
+            covered = self._written
+            self._file.flush()
+            fd = self._file.fileno()
+            self._cond.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._cond.acquire()
+            self._synced = max(self._synced, covered)
+            self._syncing = False
+            self._last_sync = time.monotonic()
+            self.fsync_count += 1
+            self._cond.notify_all()
+
+    def _append(self, key, state, data, durable):
+        record = {"k": key, "s": state}
+        if data:
+            record["d"] = data
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self._cond:
+            self._file.write(line)
+            self._written += 1
+            position = self._written
+            if (durable or self._written - self._synced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_up_to(position)
+
+    def intend(self, key, **data):
+        """Records that a mutation is about to be sent. Returns once the intent is on disk."""
+        self._append(key, STATE_INTENDED, data, durable=True)
+
+    def done(self, key, **data):
+        """Records that a mutation completed (fsync'd in batches)."""
+        self._append(key, STATE_DONE, data, durable=False)
+
+    def failed(self, key, **data):
+        """Records that a mutation definitely did not happen (fsync'd in batches)."""
+        self._append(key, STATE_FAILED, data, durable=False)
+
+    def close(self):
+        with self._cond:
+            self._sync_up_to(self._written)
+        self._file.close()
@@ -0,0 +1,180 @@
+# samachi-app/python/glownet_metrics.py
+"""
+Per-endpoint request metrics for the Glownet client.
+
+Every request sent by glownet_client.request() is recorded under its method
+and templated path (e.g. GET /api/v2/events/{event_id}/customers/{id}, using
+the templates from ../glownet_api_docs.json): request count, status code
+breakdown, a latency histogram, retries and response bytes. The client
+prints the table at exit; set GLOWNET_METRICS_OUT to also write it as JSON
+(*.json) or Prometheus text format (any other extension, e.g. *.prom).
+
+percentile() is shared by the benchmark and load-test scripts.
+"""
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SPEC_PATH = os.path.join(os.path.dirname(script_dir), "glownet_api_docs.json")
+# Upper bounds of the latency histogram buckets in seconds (Prometheus-style, cumulative on export)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_templates = None
+_template_cache = {}
+
+def _load_templates():
+    """Compiles the spec's path templates, most specific first. Falls back to an empty list without the spec."""
+    global _templates
+    if _templates is None:
+        try:
+            with open(SPEC_PATH, 'r', encoding='utf-8') as f:
+                paths = json.load(f).get("paths", {})
+        except (IOError, json.JSONDecodeError):
+            paths = {}
+        ordered = sorted(paths, key=lambda template: (template.count("{"), -len(template)))
+        _templates = [(re.compile("^" + re.sub(r"\{\w+\}", "[^/]+", t) + "$"), t) for t in ordered]
+    return _templates
+
+def template_path(url):
+    """Maps a request URL to its spec path template; unknown paths get numeric segments replaced by {id}."""
+    path = urlparse(url).path.rstrip("/") or "/"
+    template = _template_cache.get(path)
+    if template is None:
+        for pattern, candidate in _load_templates():
+            if pattern.match(path):
+                template = candidate
+                break
+        else:
+            template = re.sub(r"/\d+(?=/|$)", "/{id}", path)
+        if len(_template_cache) < 10000:
+            _template_cache[path] = template
+    return template
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class EndpointMetrics:
+    """Counters for one method + path template."""
+
+    def __init__(self):
+        self.count = 0
+        self.statuses = Counter()
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1) # Last bucket is +Inf
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.retries = 0
+        self.bytes = 0
+
+    def percentile(self, fraction):
+        """Approximate latency percentile (upper bound of the histogram bucket it falls in)."""
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= target and count:
+                return bound
+        return self.latency_max
+
+class MetricsRegistry:
+    """Thread-safe collection of EndpointMetrics keyed by (method, template)."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status, seconds, size=0, retry=False):
+        """Records one sent request. `status` is the HTTP status, or 'error' for a network failure."""
+        key = (method, template_path(url))
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            metrics = self.endpoints.get(key)
+            if metrics is None:
+                metrics = self.endpoints[key] = EndpointMetrics()
+            metrics.count += 1
+            metrics.statuses[str(status)] += 1
+            metrics.buckets[bucket] += 1
+            metrics.latency_sum += seconds
+            metrics.latency_max = max(metrics.latency_max, seconds)
+            metrics.bytes += size or 0
+            if retry:
+                metrics.retries += 1
+
+    def _sorted(self):
+        # Slowest endpoints (by total time spent) first
+        return sorted(self.endpoints.items(), key=lambda item: item[1].latency_sum, reverse=True)
+
+    def to_dict(self):
+        return {
+            "endpoints": [{
+                "method": method,
+                "path": path,
+                "count": m.count,
+                "statuses": dict(m.statuses),
+                "retries": m.retries,
+                "bytes": m.bytes,
+                "latency_seconds": {
+                    "sum": round(m.latency_sum, 6),
+                    "max": round(m.latency_max, 6),
+                    "p50": m.percentile(0.50),
+                    "p95": m.percentile(0.95),
+                    "p99": m.percentile(0.99),
+                    "buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), m.buckets)},
+                },
+            } for (method, path), m in self._sorted()]
+        }
+
+    def to_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP glownet_requests_total Glownet API requests by endpoint and status.",
+            "# TYPE glownet_requests_total counter",
+        ]
+        endpoints = self._sorted()
+        label = lambda method, path: f'method="{method}",path="{path}"'
+        for (method, path), m in endpoints:
+            for status, count in sorted(m.statuses.items()):
+                lines.append(f'glownet_requests_total{{{label(method, path)},status="{status}"}} {count}')
+        lines += ["# HELP glownet_request_retries_total Retried (throttled) requests.", "# TYPE glownet_request_retries_total counter"]
+        lines += [f"glownet_request_retries_total{{{label(method, path)}}} {m.retries}" for (method, path), m in endpoints]
+        lines += ["# HELP glownet_response_bytes_total Response body bytes received.", "# TYPE glownet_response_bytes_total counter"]
+        lines += [f"glownet_response_bytes_total{{{label(method, path)}}} {m.bytes}" for (method, path), m in endpoints]
+        lines += ["# HELP glownet_request_duration_seconds Request latency.", "# TYPE glownet_request_duration_seconds histogram"]
+        for (method, path), m in endpoints:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), m.buckets):
+                cumulative += count
+                lines.append(f'glownet_request_duration_seconds_bucket{{{label(method, path)},le="{bound}"}} {cumulative}')
+            lines.append(f"glownet_request_duration_seconds_sum{{{label(method, path)}}} {m.latency_sum:.6f}")
+            lines.append(f"glownet_request_duration_seconds_count{{{label(method, path)}}} {m.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes JSON for *.json paths, Prometheus text format otherwise."""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def print_table(self):
+        """Prints one line per endpoint, the endpoint with the most total time first."""
+        if not self.endpoints:
+            return
+        print("Glownet Endpoint Metrics:")
+        print(f"  {'Endpoint':<58} {'Count':>6} {'Total s':>8} {'Avg ms':>7} {'p95 ms':>7} {'Retry':>5} {'KB':>8}  Statuses")
+        for (method, path), m in self._sorted():
+            endpoint = f"{method} {path.replace('/api/v2', '', 1)}"
+            statuses = " ".join(f"{status}:{count}" for status, count in sorted(m.statuses.items()))
+            print(f"  {endpoint:<58} {m.count:>6} {m.latency_sum:>8.2f} {m.latency_sum / m.count * 1000:>7.1f} "
+                  f"{m.percentile(0.95) * 1000:>7.0f} {m.retries:>5} {m.bytes / 1024:>8.1f}  {statuses}")
+
+registry = MetricsRegistry()
@@ -0,0 +1,387 @@
+# samachi-app/python/glownet_mirror.py
+"""
+Local SQLite mirror of Glownet events, customers and G-Tags.
+
+`refresh` only re-downloads what is stale: the events list and each event's
+customer/G-Tag pages carry a fetched_at time, and pages younger than
+--max-age are skipped. Each page also records the id of its first record; a
+re-fetched page that starts with a different record means records were
+inserted or deleted before it, so the pages skipped before it are fetched
+again and none after it is skipped. Unchanged pages (same content hash) are
+not rewritten.
+Read-only workflows then query the indexed tables instead of the API.
+
+Usage:
+    python glownet_mirror.py refresh [--max-age SECONDS] [--event ID_OR_SLUG ...]
+    python glownet_mirror.py events [--state STATE]
+    python glownet_mirror.py balances <event_id>
+    python glownet_mirror.py customer <email>
+    python glownet_mirror.py tag <tag_uid>
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import requests
+
+import glownet_client as glownet
+from glownet_client import handle_response
+from glownet_entities import parse_amount
+
+MIRROR_DB_PATH = os.getenv("GLOWNET_MIRROR_PATH", os.path.join(glownet.script_dir, "glownet_mirror.sqlite3"))
+DEFAULT_MAX_AGE = 3600 # Seconds before a mirrored page is considered stale
+MIRROR_PER_PAGE = glownet.GLOWNET_MAX_PER_PAGE
+# Set GLOWNET_USE_MIRROR=1 to let the scripts list events from the mirror instead of the API
+GLOWNET_USE_MIRROR = os.getenv("GLOWNET_USE_MIRROR") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    slug TEXT,
+    name TEXT,
+    state TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_slug ON events(slug);
+
+CREATE TABLE IF NOT EXISTS customers (
+    event_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    virtual_money TEXT,
+    money TEXT,
+    has_balance INTEGER NOT NULL DEFAULT 0,
+    page INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (event_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_customers_id ON customers(id);
+CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email);
+CREATE INDEX IF NOT EXISTS idx_customers_balance ON customers(event_id, has_balance);
+
+CREATE TABLE IF NOT EXISTS gtags (
+    event_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    tag_uid TEXT,
+    customer_id INTEGER,
+    status TEXT,
+    page INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (event_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_gtags_tag_uid ON gtags(tag_uid);
+CREATE INDEX IF NOT EXISTS idx_gtags_customer ON gtags(event_id, customer_id);
+
+CREATE TABLE IF NOT EXISTS pages (
+    event_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    per_page INTEGER NOT NULL,
+    item_count INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    first_id INTEGER, -- Id of the page's first record, to notice records shifting between pages
+    PRIMARY KEY (event_id, kind, page)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# --- Helper Functions ---
+
+def connect(db_path=MIRROR_DB_PATH):
+    """Opens the mirror database, creating the schema on first use."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if "first_id" not in {row["name"] for row in conn.execute("PRAGMA table_info(pages)")}:
+        # Mirrors created before first_id: those pages count as stale until re-fetched
+        conn.execute("ALTER TABLE pages ADD COLUMN first_id INTEGER")
+    return conn
+
+def customer_has_balance(customer):
+    """True if any of the list-view balance fields of a customer is positive, however small."""
+    if parse_amount(customer.get('virtual_money')) > 0 or parse_amount(customer.get('money')) > 0:
+        return True
+    balances = customer.get('balances')
+    if isinstance(balances, dict):
+        return any(parse_amount(value) > 0 for value in balances.values())
+    return False
+
+def _get_state(conn, key):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+def _fetch_list_page(path, page, per_page):
+    """Fetches one list page from the API. Returns the list or None on failure."""
+    try:
+        response = glownet.get(path, params={'page': page, 'per_page': per_page})
+    except requests.exceptions.RequestException as e:
+        print(f"  Network error fetching page {page} of {path}: {e}")
+        return None
+    data = handle_response(response, success_status_codes=(200,))
+    return data if isinstance(data, list) else None
+
+# --- Refresh ---
+
+def refresh_events(conn, max_age=DEFAULT_MAX_AGE, force=False):
+    """Re-downloads the events list if it is older than max_age. Returns False on API failure."""
+    last_refresh = _get_state(conn, "events_refreshed_at")
+    if not force and last_refresh and time.time() - float(last_refresh) < max_age:
+        print("  Events list is fresh, skipping.")
+        return True
+
+    print("  Refreshing events list...")
+    events = []
+    page = 1
+    while True:
+        data = _fetch_list_page("/api/v2/events", page, MIRROR_PER_PAGE)
+        if data is None:
+            print(f"  Failed to fetch events page {page}. Keeping the previous events list.")
+            return False
+        events.extend(data)
+        if len(data) < MIRROR_PER_PAGE:
+            break
+        page += 1
+
+    with conn:
+        conn.execute("DELETE FROM events")
+        conn.executemany(
+            "INSERT INTO events (id, slug, name, state, data) VALUES (?, ?, ?, ?, ?)",
+            [(e.get('id'), e.get('slug'), e.get('name'), e.get('state'), json.dumps(e)) for e in events]
+        )
+        _set_state(conn, "events_refreshed_at", time.time())
+    print(f"  Mirrored {len(events)} events.")
+    return True
+
+def _customer_row(event_id, page, customer):
+    return (event_id, customer.get('id'), customer.get('email'), customer.get('first_name'),
+            customer.get('last_name'), str(customer.get('virtual_money')), str(customer.get('money')),
+            1 if customer_has_balance(customer) else 0, page, json.dumps(customer))
+
+def _gtag_row(event_id, page, gtag):
+    status = gtag.get('status')
+    if status is None and 'active' in gtag:
+        status = 'active' if gtag.get('active') else 'inactive'
+    return (event_id, gtag.get('id'), gtag.get('tag_uid'), gtag.get('customer_id'), status, page, json.dumps(gtag))
+
+ENTITY_KINDS = {
+    "customers": (
+        "INSERT OR REPLACE INTO customers (event_id, id, email, first_name, last_name, virtual_money, money, has_balance, page, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        _customer_row,
+    ),
+    "gtags": (
+        "INSERT OR REPLACE INTO gtags (event_id, id, tag_uid, customer_id, status, page, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        _gtag_row,
+    ),
+}
+
+def refresh_event_entities(conn, event_id, kind, max_age=DEFAULT_MAX_AGE, force=False, per_page=MIRROR_PER_PAGE):
+    """
+    Refreshes the stale pages of one event's customers or gtags.
+
+    Full pages fetched less than max_age ago are skipped. The last (short)
+    page is always re-fetched so new records are picked up. A re-fetched page
+    whose first record differs from the mirrored one means records shifted
+    across pages (an insert or delete before it): the pages skipped so far
+    are then re-fetched and no later page is skipped. An insert and a delete
+    that cancel out before the last page go unnoticed until max_age. Returns
+    a (pages_fetched, pages_changed) tuple, or None on API failure.
+    """
+    insert_sql, to_row = ENTITY_KINDS[kind]
+    known_pages = {
+        row["page"]: row for row in conn.execute(
+            "SELECT page, per_page, item_count, content_hash, fetched_at, first_id FROM pages WHERE event_id = ? AND kind = ?",
+            (event_id, kind))
+    }
+    now = time.time()
+    pages_fetched = 0
+    pages_changed = 0
+    skipped = [] # Pages skipped in this pass
+    page = 1
+    while True:
+        known = known_pages.get(page)
+        if (not force and known is not None and known["per_page"] == per_page and known["first_id"] is not None
+                and known["item_count"] == per_page and now - known["fetched_at"] < max_age):
+            skipped.append(page)
+            page += 1 # Fresh full page, nothing to do
+            continue
+
+        data = _fetch_list_page(f"/api/v2/events/{event_id}/{kind}", page, per_page)
+        if data is None:
+            print(f"  Failed to fetch {kind} page {page} for event {event_id}.")
+            return None
+        pages_fetched += 1
+        first_id = data[0].get('id') if data and isinstance(data[0], dict) else None
+        if known is not None and known["first_id"] is not None and known["first_id"] != first_id and not force:
+            print(f"  Records shifted onto {kind} page {page} of event {event_id}; re-fetching the pages skipped before it and every page after.")
+            force = True
+            if skipped:
+                page = skipped[0] # The shift started on one of them; this page is fetched again on the way
+                skipped = []
+                continue
+        content_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+        with conn:
+            if known is None or known["content_hash"] != content_hash:
+                pages_changed += 1
+                conn.execute(f"DELETE FROM {kind} WHERE event_id = ? AND page = ?", (event_id, page))
+                conn.executemany(insert_sql, [to_row(event_id, page, item) for item in data])
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (event_id, kind, page, per_page, item_count, content_hash, fetched_at, first_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (event_id, kind, page, per_page, len(data), content_hash, time.time(), first_id)
+            )
+            if len(data) < per_page:
+                # End of the list: drop anything mirrored from pages that no longer exist
+                conn.execute(f"DELETE FROM {kind} WHERE event_id = ? AND page > ?", (event_id, page))
+                conn.execute("DELETE FROM pages WHERE event_id = ? AND kind = ? AND page > ?", (event_id, kind, page))
+                return pages_fetched, pages_changed
+        page += 1
+
+def refresh(db_path=MIRROR_DB_PATH, max_age=DEFAULT_MAX_AGE, event_filter=None, force=False):
+    """Brings the mirror up to date, touching only stale events and pages."""
+    glownet.require_api_key()
+    start_time = time.monotonic()
+    conn = connect(db_path)
+    print(f"Refreshing Glownet mirror at {db_path} (max age {max_age}s)...")
+    if not refresh_events(conn, max_age, force):
+        if not conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]:
+            print("No events available to refresh. Exiting.")
+            return False
+
+    events = list_events(conn)
+    if event_filter:
+        wanted = {str(value) for value in event_filter}
+        events = [e for e in events if str(e['id']) in wanted or str(e.get('slug')) in wanted]
+
+    ok = True
+    for event in events:
+        for kind in ("customers", "gtags"):
+            result = refresh_event_entities(conn, event['id'], kind, max_age, force)
+            if result is None:
+                ok = False
+                continue
+            fetched, changed = result
+            print(f"  Event {event['id']} ({event.get('name', 'N/A')}) {kind}: {fetched} page(s) fetched, {changed} changed.")
+    conn.close()
+    print(f"Mirror refresh finished in {time.monotonic() - start_time:.2f}s.")
+    return ok
+
+# --- Reads ---
+
+def list_events(conn, state=None):
+    """Returns mirrored events (full API dicts), optionally filtered by state."""
+    if state:
+        rows = conn.execute("SELECT data FROM events WHERE state = ? ORDER BY id", (state,))
+    else:
+        rows = conn.execute("SELECT data FROM events ORDER BY id")
+    return [json.loads(row["data"]) for row in rows]
+
+def load_events(db_path=MIRROR_DB_PATH, max_age=DEFAULT_MAX_AGE):
+    """Returns the mirrored events list if it exists and is fresh, otherwise None."""
+    if not os.path.exists(db_path):
+        return None
+    conn = connect(db_path)
+    try:
+        last_refresh = _get_state(conn, "events_refreshed_at")
+        if not last_refresh or time.time() - float(last_refresh) >= max_age:
+            return None
+        return list_events(conn)
+    finally:
+        conn.close()
+
+def mirrored_events():
+    """Events list for the scripts' startup menu when GLOWNET_USE_MIRROR=1 and the mirror is fresh, otherwise None."""
+    if not GLOWNET_USE_MIRROR:
+        return None
+    events = load_events()
+    if events is None:
+        print(f"Mirror at {MIRROR_DB_PATH} is missing or stale, fetching events from the API.")
+        return None
+    print(f"Using {len(events)} events from the local mirror ({MIRROR_DB_PATH}).")
+    return events
+
+def resolve_event_id(conn, event_identifier):
+    """Maps a slug or id to the numeric event id used as the mirror key."""
+    row = conn.execute("SELECT id FROM events WHERE slug = ? OR CAST(id AS TEXT) = ?",
+                       (str(event_identifier), str(event_identifier))).fetchone()
+    return row["id"] if row else None
+
+def customers_with_balance(conn, event_id):
+    """Returns mirrored customers of an event whose list view shows a non-zero balance."""
+    rows = conn.execute("SELECT data FROM customers WHERE event_id = ? AND has_balance = 1 ORDER BY page, id", (event_id,))
+    return [json.loads(row["data"]) for row in rows]
+
+def find_customers_by_email(conn, email):
+    rows = conn.execute("SELECT event_id, data FROM customers WHERE email = ?", (email,))
+    return [(row["event_id"], json.loads(row["data"])) for row in rows]
+
+def find_gtags_by_uid(conn, tag_uid):
+    rows = conn.execute("SELECT event_id, data FROM gtags WHERE tag_uid = ?", (str(tag_uid),))
+    return [(row["event_id"], json.loads(row["data"])) for row in rows]
+
+# --- Main Script ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SQLite mirror of Glownet events, customers and G-Tags.")
+    parser.add_argument("--db", default=MIRROR_DB_PATH, help="Path to the mirror database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    refresh_parser = subparsers.add_parser("refresh", help="Update stale events and pages from the API")
+    refresh_parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE, help="Seconds before a page is refetched")
+    refresh_parser.add_argument("--event", action="append", help="Only refresh this event id or slug (repeatable)")
+    refresh_parser.add_argument("--force", action="store_true", help="Refetch everything regardless of age")
+
+    events_parser = subparsers.add_parser("events", help="List mirrored events")
+    events_parser.add_argument("--state", help="Only events in this state (e.g. launched)")
+
+    balances_parser = subparsers.add_parser("balances", help="List customers with a balance in an event")
+    balances_parser.add_argument("event", help="Event id or slug")
+
+    customer_parser = subparsers.add_parser("customer", help="Find customers by email")
+    customer_parser.add_argument("email")
+
+    tag_parser = subparsers.add_parser("tag", help="Find G-Tags by tag_uid")
+    tag_parser.add_argument("tag_uid")
+
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        sys.exit(0 if refresh(args.db, args.max_age, args.event, args.force) else 1)
+
+    start_time = time.perf_counter()
+    conn = connect(args.db)
+    if args.command == "events":
+        events = list_events(conn, args.state)
+        for i, event in enumerate(events):
+            print(f"  {i + 1}. {event.get('name', 'N/A')} (Identifier: {event.get('slug') or event.get('id')}, ID: {event.get('id')}, State: {event.get('state', 'N/A')})")
+        print(f"{len(events)} events.")
+    elif args.command == "balances":
+        event_id = resolve_event_id(conn, args.event)
+        if event_id is None:
+            print(f"Event '{args.event}' is not in the mirror. Run 'refresh' first.")
+            sys.exit(1)
+        customers = customers_with_balance(conn, event_id)
+        for customer in customers:
+            print(f"  - ID: {customer.get('id')}, Name: {customer.get('first_name', '')} {customer.get('last_name', '')}, "
+                  f"Email: {customer.get('email', 'N/A')}, Virtual: {customer.get('virtual_money')}, Standard: {customer.get('money')}")
+        print(f"{len(customers)} customers with a balance in event {event_id}.")
+    elif args.command == "customer":
+        for event_id, customer in find_customers_by_email(conn, args.email):
+            print(f"  - Event: {event_id}, ID: {customer.get('id')}, Name: {customer.get('first_name', '')} {customer.get('last_name', '')}")
+    elif args.command == "tag":
+        for event_id, gtag in find_gtags_by_uid(conn, args.tag_uid):
+            print(f"  - Event: {event_id}, G-Tag ID: {gtag.get('id')}, Customer ID: {gtag.get('customer_id')}")
+    conn.close()
+    print(f"Query took {(time.perf_counter() - start_time) * 1000:.1f} ms.")
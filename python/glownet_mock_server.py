@@ -0,0 +1,631 @@
+# samachi-app/python/glownet_mock_server.py
+"""
+Local stand-in for the Glownet API, built from ../glownet_api_docs.json.
+
+Every path/method in the OpenAPI spec is routed. Events, customers, G-Tags,
+topups and refunds are modelled statefully in memory; any other spec
+collection (stations, tickets, currencies, ...) gets generic in-memory CRUD.
+List endpoints follow the spec's page/per_page parameters (default and
+maximum per_page are read from the spec). Balances are exact Decimal amounts
+in cents and are sent like the real API sends them: customer and G-Tag money
+fields as decimal strings ("350.0"), customer balances (keyed by the event's
+credit / virtual_credit ids) as floats. Some seeded balances are fractions
+of a unit ("0.4"), so rounding bugs in balance screening show up locally.
+
+Latency, rate limiting (429 with Retry-After) and error injection are
+configurable so the python/ tooling can be load tested offline:
+
+    python glownet_mock_server.py --events 3 --customers 10000 --gtags 12000 \\
+        --latency lognormal:40:0.5 --rate-limit 50 --error-rate 0.01
+    GLOWNET_API_BASE_URL=http://127.0.0.1:8765 GLOWNET_API_KEY=mock python fetch_glownet_summary.py --all-events
+
+GET /__mock__/stats returns request counts per spec route and status.
+"""
+import os
+import re
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import threading
+from collections import OrderedDict, Counter
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SPEC_PATH = os.path.join(os.path.dirname(script_dir), "glownet_api_docs.json")
+
+DEFAULT_PORT = 8765
+FIRST_NAMES = ["Ana", "Ben", "Carla", "Dani", "Eva", "Fede", "Gala", "Hugo", "Iris", "Jon", "Kai", "Lola", "Mario", "Nora"]
+# Customer and G-Tag fields sent as decimal strings; 'balances' values are sent as floats
+MONEY_FIELDS = ("money", "virtual_money", "global_refundable_money", "credits", "virtual_credits",
+                "final_balance", "final_virtual_balance")
+LAST_NAMES = ["Garcia", "Lopez", "Martin", "Sanchez", "Perez", "Gomez", "Ruiz", "Diaz", "Moreno", "Alonso"]
+
+class MockError(Exception):
+    """Raised by handlers to send an error status with a JSON body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# --- Spec Routing ---
+
+class Route:
+    """One path template + method from the spec."""
+
+    def __init__(self, method, template, operation):
+        self.method = method
+        self.template = template
+        self.pattern = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template) + "$")
+        codes = sorted(int(code) for code in operation.get("responses", {}) if str(code).isdigit())
+        self.success_status = next((code for code in codes if 200 <= code < 300), 200)
+        self.per_page_default = 100
+        self.per_page_max = 1000
+        for param in operation.get("parameters", []):
+            if param.get("name") == "per_page":
+                schema = param.get("schema", {})
+                self.per_page_default = schema.get("default", self.per_page_default)
+                self.per_page_max = schema.get("maximum", self.per_page_max)
+
+def build_routes(spec):
+    """Builds the route table. Literal segments win over templated ones (/customers/search before /customers/{id})."""
+    routes = []
+    for template, operations in spec.get("paths", {}).items():
+        for method, operation in operations.items():
+            if isinstance(operation, dict):
+                routes.append(Route(method.upper(), template, operation))
+    routes.sort(key=lambda route: (route.template.count("{"), -len(route.template)))
+    return routes
+
+def parse_latency(spec_string):
+    """
+    Parses a latency distribution into a function returning seconds.
+
+    Formats (milliseconds): 'fixed:20', 'uniform:10:50', 'lognormal:<median>:<sigma>'.
+    """
+    if not spec_string:
+        return lambda: 0.0
+    kind, *values = spec_string.split(":")
+    values = [float(v) for v in values]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000.0
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1]) / 1000.0
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(max(values[0], 0.001))
+        return lambda: random.lognormvariate(mu, values[1]) / 1000.0
+    raise ValueError(f"Unknown latency distribution '{spec_string}' (use fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA)")
+
+class TokenBucket:
+    """Server-side request budget; requests beyond it are answered with 429."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+# --- State ---
+
+class MockGlownet:
+    """In-memory Glownet organisation plus the fault-injection settings."""
+
+    def __init__(self, spec, latency=None, rate_limit=None, error_rate=0.0, error_statuses=(500, 503),
+                 balance_lag=0.0, total_header=False, seed=None):
+        self.routes = build_routes(spec)
+        self.latency = parse_latency(latency)
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.balance_lag = balance_lag # Seconds before a topup shows up in balances
+        self.total_header = total_header
+        self.random = random.Random(seed)
+
+        self.lock = threading.RLock()
+        self.events = OrderedDict() # event id -> event dict
+        self.collections = {} # (event id, collection key) -> OrderedDict(id -> item)
+        self.tag_index = {} # tag_uid -> (event id, gtag id)
+        self.email_index = {} # (event id, email) -> customer id
+        self.owner_index = {} # (event id, customer id) -> [gtag ids]
+        self.refund_index = {} # (event id, customer id) -> [refunds]
+        self.pending_credits = [] # (visible_at, apply function)
+        self.next_id = 1
+        self.started_at = time.time()
+        self.stats = Counter() # (method, spec path, status) -> count
+        self.throttled = 0
+        self.injected_errors = 0
+        self._stats_lock = threading.Lock()
+
+    def record(self, method, label, status):
+        with self._stats_lock:
+            self.stats[(method, label, status)] += 1
+            if status == 429:
+                self.throttled += 1
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    # Events
+
+    def add_event(self, name, state="launched", **fields):
+        with self.lock:
+            event_id = self._new_id()
+            slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "event"
+            if any(e["slug"] == slug for e in self.events.values()):
+                slug = f"{slug}-{event_id}"
+            event = {
+                "id": event_id, "name": name, "slug": slug, "state": state,
+                "start_date": fields.get("start_date", "2025-06-01T10:00:00Z"),
+                "end_date": fields.get("end_date", "2025-06-03T23:00:00Z"),
+                "timezone": fields.get("timezone", "Madrid"), "currency": "EUR",
+                "open_topups": True, "open_refunds": True,
+            }
+            self.events[event_id] = event
+            for currency in ({"name": "Credit", "credit_type": "credit"}, {"name": "Virtual Credit", "credit_type": "virtual_credit"}):
+                currency = dict(currency, id=self._new_id(), value=1, position=1, spending_order=1, max_balance=0, symbol="C")
+                self.collection(event_id, "currencies")[currency["id"]] = currency
+                event[currency["credit_type"]] = {"id": currency["id"], "name": currency["name"]}
+            return event
+
+    def find_event(self, identifier):
+        with self.lock:
+            if str(identifier).isdigit() and int(identifier) in self.events:
+                return self.events[int(identifier)]
+            for event in self.events.values():
+                if event["slug"] == identifier:
+                    return event
+        raise MockError(404, f"Couldn't find Event with 'id'={identifier}")
+
+    def collection(self, event_id, key):
+        return self.collections.setdefault((event_id, key), OrderedDict())
+
+    # Customers and G-Tags
+
+    def add_customer(self, event, first_name, last_name, email, **fields):
+        with self.lock:
+            customers = self.collection(event["id"], "customers")
+            if (event["id"], email) in self.email_index:
+                raise MockError(422, "Email has already been taken")
+            customer = dict(fields, id=self._new_id(), first_name=first_name, last_name=last_name, email=email,
+                            money=Decimal(0), virtual_money=Decimal(0), global_refundable_money=Decimal(0),
+                            anonymous=False, refundable=True,
+                            balances={str(event["credit"]["id"]): Decimal(0), str(event["virtual_credit"]["id"]): Decimal(0)})
+            customers[customer["id"]] = customer
+            self.email_index[(event["id"], email)] = customer["id"]
+            return customer
+
+    def add_gtag(self, event, tag_uid, customer_id=None):
+        with self.lock:
+            if not tag_uid:
+                raise MockError(422, "Tag uid can't be blank")
+            if tag_uid in self.tag_index:
+                raise MockError(422, "Tag uid has already been taken")
+            if customer_id is not None:
+                self.find(event, "customers", customer_id)
+            gtag = {"id": self._new_id(), "tag_uid": tag_uid, "banned": False, "redeemed": False, "active": True,
+                    "consistent": True, "credits": Decimal(0), "virtual_credits": Decimal(0), "final_balance": Decimal(0),
+                    "final_virtual_balance": Decimal(0), "customer_id": customer_id, "ticket_type_id": None}
+            self.collection(event["id"], "gtags")[gtag["id"]] = gtag
+            self.tag_index[tag_uid] = (event["id"], gtag["id"])
+            if customer_id is not None:
+                self.owner_index.setdefault((event["id"], customer_id), []).append(gtag["id"])
+            return gtag
+
+    def find(self, event, key, item_id):
+        item = self.collection(event["id"], key).get(int(item_id)) if str(item_id).isdigit() else None
+        if item is None:
+            raise MockError(404, f"Couldn't find {key[:-1].capitalize()} with 'id'={item_id}")
+        return item
+
+    def assign_gtag(self, event_id, gtag_id, customer_id):
+        gtag = self.collection(event_id, "gtags")[gtag_id]
+        if gtag["customer_id"] is not None:
+            self.owner_index.get((event_id, gtag["customer_id"]), []).remove(gtag_id)
+        gtag["customer_id"] = customer_id
+        self.owner_index.setdefault((event_id, customer_id), []).append(gtag_id)
+
+    def remove(self, event_id, key, item):
+        """Deletes an item from a collection and from the lookup indexes."""
+        del self.collection(event_id, key)[item["id"]]
+        if key == "customers":
+            self.email_index.pop((event_id, item["email"]), None)
+        elif key == "gtags":
+            self.tag_index.pop(item["tag_uid"], None)
+            if item["customer_id"] is not None:
+                self.owner_index.get((event_id, item["customer_id"]), []).remove(item["id"])
+
+    def customer_gtags(self, event, customer_id):
+        gtags = self.collection(event["id"], "gtags")
+        return [gtags[gtag_id] for gtag_id in self.owner_index.get((event["id"], customer_id), []) if gtag_id in gtags]
+
+    def credit(self, event, cents, virtual=False, customer=None, gtag=None):
+        """Adds cents to a customer and/or G-Tag, after balance_lag seconds if configured."""
+        cents = Decimal(cents)
+        def apply():
+            if gtag is not None:
+                gtag["virtual_credits" if virtual else "credits"] += cents
+                gtag["final_virtual_balance" if virtual else "final_balance"] += cents
+            owner = customer
+            if owner is None and gtag is not None and gtag["customer_id"] is not None:
+                owner = self.collection(event["id"], "customers").get(gtag["customer_id"])
+            if owner is not None:
+                owner["virtual_money" if virtual else "money"] += cents
+                owner["balances"][str(event["virtual_credit" if virtual else "credit"]["id"])] += cents
+                owner["global_refundable_money"] = owner["money"]
+        with self.lock:
+            if self.balance_lag > 0:
+                self.pending_credits.append((time.monotonic() + self.balance_lag, apply))
+            else:
+                apply()
+
+    def apply_pending_credits(self):
+        with self.lock:
+            if not self.pending_credits:
+                return
+            now = time.monotonic()
+            due = [entry for entry in self.pending_credits if entry[0] <= now]
+            self.pending_credits = [entry for entry in self.pending_credits if entry[0] > now]
+            for _, apply in due:
+                apply()
+
+    def refund_customer(self, event, customer, body):
+        with self.lock:
+            if customer["money"] <= 0 and customer["virtual_money"] <= 0:
+                raise MockError(422, "Customer has no refundable balance")
+            refund = {"id": self._new_id(), "customer_id": customer["id"], "status": "completed",
+                      "fields": {}, # Opaque in the spec; the request body (gateway, send_email) is not echoed
+                      "credit_base": int(customer["money"]), "credit_fee": 0,
+                      "money_base": int(customer["money"]), "money_fee": 0}
+            self.collection(event["id"], "refunds")[refund["id"]] = refund
+            self.refund_index.setdefault((event["id"], customer["id"]), []).append(refund)
+            customer["money"] = customer["virtual_money"] = customer["global_refundable_money"] = Decimal(0)
+            customer["balances"] = {currency_id: Decimal(0) for currency_id in customer["balances"]}
+            for gtag in self.customer_gtags(event, customer["id"]):
+                gtag["credits"] = gtag["virtual_credits"] = gtag["final_balance"] = gtag["final_virtual_balance"] = Decimal(0)
+            return refund
+
+    def seed(self, events=1, customers=100, gtags=120, balance_ratio=0.2, max_balance_cents=5000, fraction_ratio=0.1):
+        """
+        Creates events with customers, G-Tags (assigned first, the rest unassigned) and some balances.
+
+        A fraction_ratio share of the seeded balances is below one unit ("0.1" to "0.9").
+        """
+        rng = self.random
+        for n in range(events):
+            event = self.add_event(f"Mock Festival {n + 1}")
+            created = []
+            for i in range(customers):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                created.append(self.add_customer(event, first, last, f"{first.lower()}.{last.lower()}.{event['id']}.{i}@example.com"))
+            for i in range(gtags):
+                owner = created[i] if i < len(created) else None
+                gtag = self.add_gtag(event, f"{rng.getrandbits(56):014X}", owner["id"] if owner else None)
+                if owner is not None and rng.random() < balance_ratio:
+                    cents = Decimal(rng.randint(1, 9)) / 10 if rng.random() < fraction_ratio else rng.randint(1, max_balance_cents)
+                    self.credit(event, cents, virtual=rng.random() < 0.3, gtag=gtag)
+        self.apply_pending_credits()
+
+# --- Request Handling ---
+
+def _to_wire(value, key=None):
+    """Renders Decimal amounts the way the real API does (see MONEY_FIELDS)."""
+    if isinstance(value, dict):
+        if key == "balances":
+            return {k: float(v) if isinstance(v, Decimal) else v for k, v in value.items()}
+        return {k: _to_wire(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_wire(item) for item in value]
+    if isinstance(value, Decimal):
+        text = str(value)
+        return text if key not in MONEY_FIELDS or "." in text else f"{text}.0"
+    return value
+
+def _page_params(route, query):
+    try:
+        page = max(1, int(query.get("page", ["1"])[0]))
+        per_page = int(query.get("per_page", [str(route.per_page_default)])[0])
+    except ValueError:
+        raise MockError(422, "page and per_page must be integers")
+    return page, max(1, min(per_page, route.per_page_max))
+
+def _handle(mock, route, method, params, query, body):
+    """Dispatches a matched spec route. Returns (status, payload, extra_headers)."""
+    template = route.template
+    event = mock.find_event(params["event_id"]) if "event_id" in params else None
+
+    def listing(items):
+        items = list(items)
+        page, per_page = _page_params(route, query)
+        headers = {"Total": str(len(items)), "Per-Page": str(per_page)} if mock.total_header else {}
+        return route.success_status, items[(page - 1) * per_page:page * per_page], headers
+
+    # Events
+    if template == "/api/v2/events":
+        if method == "GET":
+            return listing(mock.events.values())
+        event_body = (body or {}).get("event") or {}
+        if not event_body.get("name"):
+            raise MockError(422, "Name can't be blank")
+        return 201, mock.add_event(event_body["name"], state="created", **event_body), {}
+    if template == "/api/v2/events/lookup":
+        location = mock.tag_index.get(query.get("gtag_uid", [""])[0])
+        if location is None:
+            raise MockError(404, "Gtag not found")
+        gtag = mock.collection(location[0], "gtags")[location[1]]
+        return 200, {"event_id": location[0], "gtag_id": gtag["id"], "customer_id": gtag["customer_id"],
+                     "gtag_active?": gtag["active"]}, {}
+    if template in ("/api/v2/events/{id}", "/api/v2/events/{id}/update_state"):
+        event = mock.find_event(params["id"])
+        if method == "PATCH":
+            event.update({k: v for k, v in ((body or {}).get("event") or {}).items() if k not in ("id", "slug")})
+        return route.success_status, event, {}
+
+    # Customers
+    if template == "/api/v2/events/{event_id}/customers":
+        if method == "GET":
+            return listing(mock.collection(event["id"], "customers").values())
+        customer_body = dict((body or {}).get("customer") or {})
+        customer_body.pop("password", None)
+        if not customer_body.get("email"):
+            raise MockError(422, "Email can't be blank")
+        first, last, email = customer_body.pop("first_name", ""), customer_body.pop("last_name", ""), customer_body.pop("email")
+        return 201, mock.add_customer(event, first, last, email, **customer_body), {}
+    if template == "/api/v2/events/{event_id}/customers/search":
+        email = query.get("email", [(body or {}).get("email", "")])[0]
+        customer_id = mock.email_index.get((event["id"], email))
+        if customer_id is None or customer_id not in mock.collection(event["id"], "customers"):
+            raise MockError(404, f"Couldn't find Customer with email {email}")
+        return 200, mock.collection(event["id"], "customers")[customer_id], {}
+    if template == "/api/v2/events/{event_id}/customers/{id}" and method == "GET":
+        customer = mock.find(event, "customers", params["id"])
+        return 200, dict(customer, gtags=mock.customer_gtags(event, customer["id"])), {}
+    if template.startswith("/api/v2/events/{event_id}/customers/{id}/"):
+        customer = mock.find(event, "customers", params["id"])
+        action = template.rsplit("/", 1)[1]
+        if action in ("topup", "virtual_topup"):
+            credits = int((body or {}).get("credits") or 0)
+            if credits <= 0:
+                raise MockError(422, "Credits must be greater than 0")
+            mock.credit(event, credits, virtual=action == "virtual_topup", customer=customer)
+            return 201, None, {}
+        if action == "refund":
+            return 201, mock.refund_customer(event, customer, body), {}
+        if action == "refunds":
+            return 200, mock.refund_index.get((event["id"], customer["id"]), []), {}
+        if action == "assign_gtag":
+            tag_uid = (body or {}).get("tag_uid")
+            location = mock.tag_index.get(tag_uid)
+            if location is None:
+                mock.add_gtag(event, tag_uid, customer["id"])
+            else:
+                mock.assign_gtag(location[0], location[1], customer["id"])
+            return 201, customer, {}
+        if action in ("ban", "unban"):
+            customer["banned"] = action == "ban"
+            return route.success_status, customer, {}
+
+    # G-Tags
+    if template == "/api/v2/events/{event_id}/gtags" and method == "POST":
+        gtag_body = (body or {}).get("gtag") or {}
+        # The spec names the field 'tag_ui'; the real API and our scripts send 'tag_uid'
+        return 201, mock.add_gtag(event, gtag_body.get("tag_uid") or gtag_body.get("tag_ui"), gtag_body.get("customer_id")), {}
+    if template == "/api/v2/events/{event_id}/gtags/search":
+        tag_uid = query.get("tag_uid", [""])[0]
+        location = mock.tag_index.get(tag_uid)
+        if location is None or location[0] != event["id"]:
+            raise MockError(404, f"Couldn't find Gtag with tag_uid {tag_uid}")
+        return 200, mock.collection(event["id"], "gtags")[location[1]], {}
+    if template.startswith("/api/v2/events/{event_id}/gtags/{id}/"):
+        gtag = mock.find(event, "gtags", params["id"])
+        action = template.rsplit("/", 1)[1]
+        if action in ("topup", "virtual_topup"):
+            credits = int((body or {}).get("credits") or 0)
+            if credits <= 0:
+                raise MockError(422, "Credits must be greater than 0")
+            mock.credit(event, credits, virtual=action == "virtual_topup", gtag=gtag)
+            return 201, None, {}
+        if action in ("ban", "unban"):
+            gtag["banned"] = action == "ban"
+            return route.success_status, gtag, {}
+
+    return _handle_generic(mock, route, method, params, body, event, listing)
+
+def _unwrap(body):
+    """Request bodies wrap the resource in its singular name ({"station": {...}}); returns the inner fields."""
+    body = body if isinstance(body, dict) else {}
+    if len(body) == 1 and isinstance(next(iter(body.values())), dict):
+        return next(iter(body.values()))
+    return body
+
+def _handle_generic(mock, route, method, params, body, event, listing):
+    """Spec-shaped in-memory CRUD for collections without dedicated handling."""
+    if event is None:
+        raise MockError(404, "Couldn't find resource")
+    # Collection key below the event, with nested ids filled in (e.g. 'stations/12/products')
+    segments = route.template.split("/")[5:]
+    key_for = lambda parts: "/".join(params[p[1:-1]] if p.startswith("{") else p for p in parts)
+
+    if segments[-1] == "{id}":
+        key = key_for(segments[:-1])
+        item = mock.find(event, key, params["id"])
+        if method == "PATCH":
+            item.update({k: v for k, v in _unwrap(body).items() if k != "id"})
+        elif method == "DELETE":
+            mock.remove(event["id"], key, item)
+        return route.success_status, item, {}
+    if len(segments) < 2 or segments[-2] != "{id}":
+        key = key_for(segments)
+        if method == "GET":
+            return listing(mock.collection(event["id"], key).values())
+        item = dict(_unwrap(body), id=mock._new_id())
+        mock.collection(event["id"], key)[item["id"]] = item
+        return 201, item, {}
+    # Member actions (ban, complete, cancel, ...) acknowledge with the spec's success status
+    return route.success_status, mock.find(event, key_for(segments[:-2]), params["id"]), {}
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so client connection pooling behaves as in production
+    mock = None # Set by make_server
+    quiet = True
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload, headers=None):
+        data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        mock = self.mock
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+
+        if parsed.path == "/__mock__/stats":
+            return self._send(200, {
+                "uptime_seconds": round(time.time() - mock.started_at, 2),
+                "requests": sum(mock.stats.values()),
+                "throttled": mock.throttled,
+                "injected_errors": mock.injected_errors,
+                "by_route": {" ".join(map(str, key)): count for key, count in sorted(mock.stats.items())},
+            })
+
+        route, params, allowed = None, None, False
+        for candidate in mock.routes:
+            match = candidate.pattern.match(parsed.path)
+            if match:
+                allowed = True
+                if candidate.method == method:
+                    route, params = candidate, match.groupdict()
+                    break
+        label = route.template if route else parsed.path
+
+        time.sleep(mock.latency())
+        if mock.bucket is not None and not mock.bucket.try_acquire():
+            mock.record(method, label, 429)
+            return self._send(429, {"error": "Rate limit exceeded"}, {"Retry-After": "1"})
+        if route is None:
+            status = 405 if allowed else 404
+            mock.record(method, label, status)
+            return self._send(status, {"error": "Couldn't find resource"})
+        if not self.headers.get("Authorization"):
+            mock.record(method, label, 403)
+            return self._send(403, {"error": "forbidden access"})
+        if mock.error_rate and mock.random.random() < mock.error_rate:
+            status = mock.random.choice(mock.error_statuses)
+            with mock._stats_lock:
+                mock.injected_errors += 1
+            mock.record(method, label, status)
+            return self._send(status, {"error": "Injected failure"})
+
+        try:
+            body = json.loads(raw_body) if raw_body else None
+        except json.JSONDecodeError:
+            mock.record(method, label, 400)
+            return self._send(400, {"error": "Malformed JSON body"})
+
+        try:
+            mock.apply_pending_credits()
+            with mock.lock:
+                status, payload, headers = _handle(mock, route, method, params, query, body)
+                data = json.loads(json.dumps(_to_wire(payload))) # Snapshot under the lock; serialised again outside it
+        except MockError as e:
+            status, data, headers = e.status, {"error": e.message}, {}
+        mock.record(method, label, status)
+        self._send(status, data, headers)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+def load_spec(path=SPEC_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class MockServer(ThreadingHTTPServer):
+    request_queue_size = 256 # Listen backlog for load runs with many concurrent connections
+    daemon_threads = True
+
+def make_server(mock, host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+    """Creates (but does not start) a threaded HTTP server for a MockGlownet. Port 0 picks a free port."""
+    handler = type("BoundMockRequestHandler", (MockRequestHandler,), {"mock": mock, "quiet": not verbose})
+    return MockServer((host, port), handler)
+
+def start_in_thread(mock, host="127.0.0.1", port=0):
+    """Starts a server on a background thread. Returns (server, base_url); call server.shutdown() to stop."""
+    server = make_server(mock, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local Glownet API stand-in built from glownet_api_docs.json.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--spec", default=SPEC_PATH, help="OpenAPI spec to route from")
+    parser.add_argument("--events", type=int, default=1, help="Events to seed")
+    parser.add_argument("--customers", type=int, default=100, help="Customers per event")
+    parser.add_argument("--gtags", type=int, default=120, help="G-Tags per event (the first --customers are assigned)")
+    parser.add_argument("--balance-ratio", type=float, default=0.2, help="Share of assigned G-Tags seeded with a balance")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for data and fault injection")
+    parser.add_argument("--latency", help="Per-request latency: fixed:MS, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error response")
+    parser.add_argument("--error-status", default="500,503", help="Comma separated statuses to inject")
+    parser.add_argument("--balance-lag", type=float, default=0.0, help="Seconds before topups become visible")
+    parser.add_argument("--total-header", action="store_true", help="Send Total/Per-Page headers on list responses")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args(argv)
+
+# --- Main Script ---
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        mock = MockGlownet(load_spec(args.spec), latency=args.latency, rate_limit=args.rate_limit,
+                           error_rate=args.error_rate, error_statuses=[int(s) for s in args.error_status.split(",") if s],
+                           balance_lag=args.balance_lag, total_header=args.total_header, seed=args.seed)
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Seeding {args.events} events with {args.customers} customers and {args.gtags} G-Tags each...")
+    mock.seed(args.events, args.customers, args.gtags, args.balance_ratio)
+    server = make_server(mock, args.host, args.port, args.verbose)
+    print(f"Mock Glownet API ({len(mock.routes)} spec routes) listening on http://{args.host}:{server.server_address[1]}")
+    print(f"  export GLOWNET_API_BASE_URL=http://{args.host}:{server.server_address[1]} GLOWNET_API_KEY=mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server.")
+        server.server_close()
@@ -0,0 +1,109 @@
+# samachi-app/python/glownet_rate_limiter.py
+"""
+Adaptive token-bucket rate limiter for Glownet API calls.
+
+Starts at a configured requests-per-second, halves the rate on 429/503
+responses (pausing for any Retry-After the server sends) and ramps back up
+additively after a run of healthy responses. Requests in flight when the rate
+was cut were sent at the old rate, so their throttled responses do not cut it
+again: one burst of 429s backs off once.
+"""
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+def parse_retry_after(value):
+    """Parses a Retry-After header (seconds or HTTP date) into seconds to wait, or None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket whose refill rate adapts to server throttling."""
+
+    def __init__(self, rate, min_rate=0.5, max_rate=None, burst=None,
+                 backoff_factor=0.5, increase_step=None, recovery_after=20):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate) if max_rate else self.rate * 4
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.backoff_factor = backoff_factor
+        # Default additive step: a tenth of the starting rate per healthy run
+        self.increase_step = increase_step or max(0.1, self.rate / 10)
+        self.recovery_after = recovery_after
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_backoff = float("-inf")
+        self._healthy_streak = 0
+        self._lock = threading.Lock()
+
+        self.throttled_count = 0
+        self.wait_time_total = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Blocks until a request may be sent. Returns the send time to pass to on_response."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return now
+                else:
+                    wait = (1 - self._tokens) / self.rate
+                self.wait_time_total += wait
+            time.sleep(wait)
+
+    def on_response(self, status_code, retry_after=None, sent_at=None):
+        """
+        Adjusts the rate from a response status and optional Retry-After header value.
+
+        sent_at is the time acquire() returned for the request; a throttled
+        response to a request sent before the last backoff does not back off again.
+        """
+        with self._lock:
+            if status_code in THROTTLE_STATUS_CODES:
+                self.throttled_count += 1
+                self._healthy_streak = 0
+                if sent_at is None or sent_at >= self._last_backoff:
+                    self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._last_backoff = time.monotonic()
+                delay = parse_retry_after(retry_after)
+                if delay:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            elif status_code < 500:
+                self._healthy_streak += 1
+                if self._healthy_streak >= self.recovery_after and self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.increase_step)
+                    self._healthy_streak = 0
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 2),
+            "throttled": self.throttled_count,
+            "wait_seconds": round(self.wait_time_total, 2),
+        }
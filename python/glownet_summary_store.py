@@ -0,0 +1,462 @@
+# samachi-app/python/glownet_summary_store.py
+"""
+Append-only store for Glownet summary snapshots.
+
+Snapshots are written as JSON Lines into numbered segment files, and a small
+index (timestamp, event id, segment, byte offset, length) points at each one.
+Writing a snapshot only appends to the current segment and the index, and
+reading the latest snapshot for an event seeks straight to it instead of
+parsing the whole history. Only records listed in the index are ever read, so
+a crash mid-write leaves at most an unreferenced partial line behind.
+Appends hold an exclusive flock on index.lock from reading the index to
+writing it and the event's hashes file, so concurrent writers (e.g. two
+fetch_glownet_summary.py runs) never hand out the same seq or parent, or
+leave an older snapshot's hashes behind.
+
+Snapshots of an event are delta-encoded: the first one (and every
+FULL_SNAPSHOT_EVERY-th after it) is stored in full, and the ones in between
+only store the customers and G-Tags added, removed or changed (keyed by id)
+since the previous snapshot of that event. Readers rebuild a snapshot from its
+base by applying at most FULL_SNAPSHOT_EVERY deltas, so storage per run scales
+with churn rather than event size. Index records carry a sequence number
+("seq"), the kind ("full" or "delta") and, for deltas, the parent's "seq".
+
+Next to the index, hashes/<event>.json keeps the id -> record hash map of
+each event's latest snapshot (in record order, with that snapshot's "seq"),
+so writing a delta only hashes the new records instead of rebuilding the
+previous snapshot. A missing or stale map falls back to the rebuild.
+
+Usage:
+    python glownet_summary_store.py import [legacy_summary.json]
+    python glownet_summary_store.py list
+    python glownet_summary_store.py latest <event_id>
+    python glownet_summary_store.py stats <event_id>
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+from itertools import islice
+from contextlib import contextmanager
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError: # Not on Windows: appends from concurrent processes are not serialized there
+    fcntl = None
+
+import glownet_entities
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(script_dir, "glownet_summary_store")
+LEGACY_SUMMARY_FILE_PATH = os.path.join(script_dir, "glownet_test_data_summary.json")
+INDEX_FILE_NAME = "index.jsonl"
+LOCK_FILE_NAME = "index.lock"
+HASHES_DIR_NAME = "hashes"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024 # Start a new segment once the current one passes 64 MB
+FULL_SNAPSHOT_EVERY = 24 # Deltas stored before an event gets a new full base snapshot
+DELTA_MAX_CHANGE_RATIO = 0.5 # Store a full snapshot instead when a delta would touch more than half the records
+DELTA_KEYS = ("customers", "gtags") # Record lists that are delta-encoded, keyed by 'id'
+
+# --- Helper Functions ---
+
+def _index_path(store_dir):
+    return os.path.join(store_dir, INDEX_FILE_NAME)
+
+def _hashes_path(store_dir, event_id):
+    return os.path.join(store_dir, HASHES_DIR_NAME, re.sub(r"[^\w-]", "_", str(event_id)) + ".json")
+
+@contextmanager
+def _store_lock(store_dir):
+    """Holds an exclusive inter-process lock on the store (flock on index.lock) for the duration of the block."""
+    with open(os.path.join(store_dir, LOCK_FILE_NAME), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _segment_name(number):
+    return f"segment-{number:06d}.jsonl"
+
+def _append_line(path, line_bytes):
+    """Appends one line to a file, fsyncs it and returns the byte offset it was written at."""
+    with open(path, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        if offset > 0:
+            # Start on a fresh line if a previous write was cut off mid-record
+            with open(path, 'rb') as existing:
+                existing.seek(offset - 1)
+                if existing.read(1) != b"\n":
+                    f.write(b"\n")
+                    offset += 1
+        f.write(line_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+def read_index(store_dir=STORE_DIR):
+    """Returns the index entries in write order. Skips a truncated trailing line."""
+    index_path = _index_path(store_dir)
+    entries = []
+    if not os.path.exists(index_path):
+        return entries
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping unreadable index line in {index_path}.")
+    return entries
+
+def _index_is_current(store_dir, index_entries):
+    """True if the index file still ends with the last of index_entries (nothing was appended since they were read)."""
+    try:
+        with open(_index_path(store_dir), 'rb') as f:
+            f.seek(max(0, f.seek(0, os.SEEK_END) - 4096)) # Index lines are a few hundred bytes
+            lines = [line for line in f.read().splitlines() if line.strip()]
+    except OSError:
+        return not index_entries
+    if not lines:
+        return not index_entries
+    try:
+        return bool(index_entries) and json.loads(lines[-1]) == index_entries[-1]
+    except ValueError: # Truncated last line: let read_index sort it out
+        return False
+
+def _current_segment(store_dir, index_entries):
+    """Picks the segment to append to, rolling over when the last one is full."""
+    number = 1
+    if index_entries:
+        number = int(index_entries[-1]["segment"].split("-")[1].split(".")[0])
+        segment_path = os.path.join(store_dir, index_entries[-1]["segment"])
+        if os.path.exists(segment_path) and os.path.getsize(segment_path) >= SEGMENT_MAX_BYTES:
+            number += 1
+    return _segment_name(number)
+
+def _seq(index_record, position):
+    # Records written before delta encoding have no "seq"; their index position stands in
+    return index_record.get("seq", position)
+
+def _plain_records(records):
+    """API-shaped dicts for a record list that may hold glownet_entities records."""
+    return [record if isinstance(record, dict) else glownet_entities.encode_entity(record) for record in records]
+
+def record_hashes(records):
+    """
+    Returns {id: hash} for API-shaped records, in record order.
+
+    Returns None if a record has no id or an id repeats, since such lists
+    cannot be delta-encoded.
+    """
+    hashes = {}
+    for record in records:
+        record_id = record.get("id")
+        if record_id is None or record_id in hashes:
+            return None
+        canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=glownet_entities.encode_entity)
+        hashes[record_id] = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+    return hashes
+
+def diff_records(previous_hashes, current, current_hashes=None):
+    """
+    Returns {"added": [...], "added_at": [positions], "removed": [ids], "changed": [...]}
+    turning the records behind `previous_hashes` (a record_hashes() map) into `current`.
+
+    Returns None if `current` cannot be delta-encoded: a record has no id, an
+    id repeats, or the records kept from the previous list changed order.
+    """
+    if current_hashes is None:
+        current_hashes = record_hashes(current)
+    if current_hashes is None:
+        return None
+    added, added_at, changed, kept = [], [], [], []
+    for position, record in enumerate(current):
+        old_hash = previous_hashes.get(record["id"])
+        if old_hash is None:
+            added.append(record)
+            added_at.append(position)
+            continue
+        kept.append(record["id"])
+        if old_hash != current_hashes[record["id"]]:
+            changed.append(record)
+    if kept != [record_id for record_id in previous_hashes if record_id in current_hashes]:
+        return None
+    removed = [record_id for record_id in previous_hashes if record_id not in current_hashes]
+    return {"added": added, "added_at": added_at, "removed": removed, "changed": changed}
+
+def apply_delta(records, delta):
+    """
+    Applies a diff_records() delta. Kept records stay in order, changed ones in
+    place, and added ones go back to their positions (or last, for deltas
+    written before positions were stored).
+    """
+    removed = set(delta["removed"])
+    changed = {record["id"]: record for record in delta["changed"]}
+    kept = (changed.get(record["id"], record) for record in records if record["id"] not in removed)
+    result = []
+    for position, record in zip(delta.get("added_at", ()), delta["added"]):
+        result.extend(islice(kept, position - len(result)))
+        result.append(record)
+    result.extend(kept)
+    result.extend(delta["added"][len(delta.get("added_at", ())):])
+    return result
+
+def _delta_entry(previous_hashes, entry):
+    """
+    Builds the delta stored for `entry` against the previous snapshot's record
+    hashes ({key: {id: hash}}). Returns (delta entry, or None if it should be
+    stored in full; {key: the entry's record hashes}).
+    """
+    current = {key: _plain_records(entry[key]) if entry.get(key) is not None else None for key in DELTA_KEYS}
+    current_hashes = {key: record_hashes(records) if records is not None else None for key, records in current.items()}
+    if previous_hashes is None:
+        return None, current_hashes
+    delta_entry = {key: value for key, value in entry.items() if key not in DELTA_KEYS}
+    for key in DELTA_KEYS:
+        if current_hashes[key] is None or previous_hashes.get(key) is None:
+            return None, current_hashes
+        delta = diff_records(previous_hashes[key], current[key], current_hashes[key])
+        if delta is None:
+            return None, current_hashes
+        touched = len(delta["added"]) + len(delta["removed"]) + len(delta["changed"])
+        if touched > DELTA_MAX_CHANGE_RATIO * max(len(current[key]), 1):
+            return None, current_hashes
+        delta_entry[key] = delta
+    return delta_entry, current_hashes
+
+def _load_hashes(store_dir, event_id, seq):
+    """Returns the saved {key: {id: hash}} of an event's snapshot `seq`, or None if missing or stale."""
+    try:
+        with open(_hashes_path(store_dir, event_id), 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if saved.get("seq") != seq:
+        return None
+    return {key: dict((record_id, digest) for record_id, digest in saved[key]) if saved.get(key) is not None else None
+            for key in DELTA_KEYS}
+
+def _save_hashes(store_dir, event_id, seq, hashes):
+    """
+    Replaces an event's saved record hashes. Called under the store lock, after
+    the index, so a crash leaves them stale, not wrong.
+    """
+    path = _hashes_path(store_dir, event_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # [id, hash] pairs keep the ids' JSON types and the record order
+    saved = {"seq": seq, **{key: list(hashes[key].items()) if hashes.get(key) is not None else None for key in DELTA_KEYS}}
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(saved, f, ensure_ascii=False, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+
+def _latest_for_event(index_entries, event_id):
+    """Returns (position, index record) of an event's most recent snapshot, or (None, None)."""
+    for position in range(len(index_entries) - 1, -1, -1):
+        if str(index_entries[position].get("target_event_id")) == str(event_id):
+            return position, index_entries[position]
+    return None, None
+
+def append_snapshot(entry, store_dir=STORE_DIR, index_entries=None):
+    """
+    Appends one summary entry and returns its index record.
+
+    The entry is stored as a delta against the event's previous snapshot when
+    there is one and the chain is shorter than FULL_SNAPSHOT_EVERY; otherwise,
+    or when most records changed, it is stored in full. The bytes written
+    scale with the number of changed records, and the diff runs against the
+    previous snapshot's saved record hashes rather than a rebuild of it.
+    A passed index_entries list is reloaded in place if another process
+    appended to the index since it was read.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    with _store_lock(store_dir):
+        if index_entries is None:
+            index_entries = read_index(store_dir)
+        elif not _index_is_current(store_dir, index_entries):
+            index_entries[:] = read_index(store_dir)
+        index_record, current_hashes = _append_locked(entry, store_dir, index_entries)
+        # Under the lock too: a writer that loses the race must not replace a newer seq's hashes
+        _save_hashes(store_dir, index_record["target_event_id"], index_record["seq"], current_hashes)
+    return index_record
+
+def _append_locked(entry, store_dir, index_entries):
+    """append_snapshot under the store lock: writes the segment line and index record. Returns (index record, record hashes)."""
+    seq = _seq(index_entries[-1], len(index_entries) - 1) + 1 if index_entries else 0
+    stored, delta_info = entry, {"kind": "full"}
+    event_id = entry.get("target_event_id")
+    parent_position, parent = _latest_for_event(index_entries, event_id)
+    previous_hashes = None
+    if parent is not None and parent.get("depth", 0) + 1 < FULL_SNAPSHOT_EVERY:
+        previous_hashes = _load_hashes(store_dir, event_id, _seq(parent, parent_position))
+        if previous_hashes is None:
+            # No saved hashes for the parent (an older store, or a crash before they were written)
+            try:
+                previous = read_snapshot(parent, store_dir, index_entries=index_entries)
+                previous_hashes = {key: record_hashes(previous[key]) if previous.get(key) is not None else None
+                                   for key in DELTA_KEYS}
+            except (IOError, ValueError, KeyError) as e:
+                print(f"Warning: Could not rebuild the previous snapshot ({e}); storing a full snapshot.")
+    delta_entry, current_hashes = _delta_entry(previous_hashes, entry)
+    if delta_entry is not None:
+        stored = delta_entry
+        delta_info = {"kind": "delta", "parent": _seq(parent, parent_position), "depth": parent.get("depth", 0) + 1}
+
+    segment = _current_segment(store_dir, index_entries)
+    line = (json.dumps(stored, ensure_ascii=False, separators=(',', ':'), default=glownet_entities.encode_entity) + "\n").encode('utf-8')
+    offset = _append_line(os.path.join(store_dir, segment), line)
+
+    # The index is written last, so a snapshot only becomes visible once fully on disk
+    index_record = {
+        "timestamp": entry.get("timestamp"),
+        "target_event_id": entry.get("target_event_id"),
+        "segment": segment,
+        "offset": offset,
+        "length": len(line),
+        "seq": seq,
+        **delta_info,
+    }
+    _append_line(_index_path(store_dir), (json.dumps(index_record) + "\n").encode('utf-8'))
+    index_entries.append(index_record)
+    return index_record, current_hashes
+
+def _read_stored(index_record, store_dir):
+    """Reads the stored line (full snapshot or delta) an index record points to."""
+    with open(os.path.join(store_dir, index_record["segment"]), 'rb') as f:
+        f.seek(index_record["offset"])
+        return json.loads(f.read(index_record["length"]).decode('utf-8'))
+
+def _apply_stored(previous, stored):
+    """Rebuilds a snapshot from the previous one and a stored delta."""
+    snapshot = dict(stored)
+    for key in DELTA_KEYS:
+        snapshot[key] = apply_delta(previous[key], stored[key])
+    return snapshot
+
+def read_snapshot(index_record, store_dir=STORE_DIR, compact=False, index_entries=None):
+    """
+    Reads the snapshot an index record points to, rebuilding it from its base if it is a delta.
+
+    compact=True loads customers and G-Tags as glownet_entities records. Pass
+    `index_entries` when reading many deltas to avoid re-reading the index.
+    """
+    chain = [index_record]
+    if index_record.get("kind") == "delta":
+        if index_entries is None:
+            index_entries = read_index(store_dir)
+        by_seq = {_seq(record, position): record for position, record in enumerate(index_entries)}
+        while chain[-1].get("kind") == "delta":
+            parent = by_seq.get(chain[-1]["parent"])
+            if parent is None:
+                raise KeyError(f"snapshot seq {chain[-1]['parent']} (base of seq {index_record.get('seq')}) is missing from the index")
+            chain.append(parent)
+    snapshot = _read_stored(chain.pop(), store_dir)
+    while chain:
+        snapshot = _apply_stored(snapshot, _read_stored(chain.pop(), store_dir))
+    return glownet_entities.compact_snapshot(snapshot) if compact else snapshot
+
+def iter_snapshots(event_id=None, store_dir=STORE_DIR, compact=False):
+    """
+    Yields (index_record, snapshot) pairs in write order, optionally for one event only.
+
+    Each event's latest snapshot is kept while iterating, so a delta costs one
+    read and one apply instead of a rebuild from its base.
+    """
+    index_entries = read_index(store_dir)
+    latest = {} # Event id -> (seq, snapshot)
+    for position, index_record in enumerate(index_entries):
+        key = str(index_record.get("target_event_id"))
+        if event_id is not None and key != str(event_id):
+            continue
+        previous_seq, previous = latest.get(key, (None, None))
+        if index_record.get("kind") == "delta" and index_record.get("parent") == previous_seq:
+            snapshot = _apply_stored(previous, _read_stored(index_record, store_dir))
+        else:
+            snapshot = read_snapshot(index_record, store_dir, index_entries=index_entries)
+        latest[key] = (_seq(index_record, position), snapshot)
+        yield index_record, glownet_entities.compact_snapshot(dict(snapshot)) if compact else dict(snapshot)
+
+def read_latest_snapshot(event_id, store_dir=STORE_DIR, compact=False):
+    """Returns the most recent snapshot for an event, or None if there is none."""
+    index_entries = read_index(store_dir)
+    _, index_record = _latest_for_event(index_entries, event_id)
+    if index_record is None:
+        return None
+    return read_snapshot(index_record, store_dir, compact, index_entries)
+
+def print_snapshot_stats(snapshot):
+    """Prints customer balance totals and G-Tag status counts for a compact snapshot."""
+    customers = snapshot.get("customers") or []
+    gtags = snapshot.get("gtags") or []
+    with_balance = [customer for customer in customers if customer.has_balance]
+    print(f"Snapshot {snapshot.get('timestamp')} for event '{snapshot.get('target_event_id')}':")
+    print(f"  Customers: {len(customers)}, with balance: {len(with_balance)}")
+    def total(cents):
+        return glownet_entities.format_cents(sum(value or 0 for value in cents))
+    print(f"  Money: {total(c.money for c in customers)}, virtual money: {total(c.virtual_money for c in customers)}")
+    print(f"  G-Tags: {len(gtags)}, assigned: {sum(1 for gtag in gtags if gtag.customer_id is not None)}, "
+          f"final balance: {total(gtag.final_balance for gtag in gtags)}")
+    for status, count in Counter(gtag.status for gtag in gtags).most_common():
+        print(f"    {status}: {count}")
+
+def import_legacy_summary(legacy_path=LEGACY_SUMMARY_FILE_PATH, store_dir=STORE_DIR):
+    """One-time import of the old single-file JSON summary list. Already imported entries are skipped."""
+    print(f"Importing legacy summary file {legacy_path} into {store_dir}...")
+    try:
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            legacy_entries = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        print(f"Error reading legacy summary file '{legacy_path}': {e}")
+        return 0
+    if not isinstance(legacy_entries, list):
+        print(f"Error: Legacy summary file '{legacy_path}' does not contain a JSON list.")
+        return 0
+
+    index_entries = read_index(store_dir)
+    seen = {(e.get("timestamp"), str(e.get("target_event_id"))) for e in index_entries}
+    imported = 0
+    for entry in legacy_entries:
+        key = (entry.get("timestamp"), str(entry.get("target_event_id")))
+        if key in seen:
+            continue
+        append_snapshot(entry, store_dir, index_entries)
+        seen.add(key)
+        imported += 1
+    print(f"  Imported {imported} of {len(legacy_entries)} legacy summary entries.")
+    return imported
+
+# --- Main Script ---
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if command == "import":
+        import_legacy_summary(sys.argv[2] if len(sys.argv) > 2 else LEGACY_SUMMARY_FILE_PATH)
+    elif command == "list":
+        entries = read_index()
+        print(f"{len(entries)} snapshots in {STORE_DIR}:")
+        for index_record in entries:
+            print(f"  {index_record['timestamp']}  event={index_record['target_event_id']}  {index_record.get('kind', 'full'):<5}  "
+                  f"{index_record['segment']}@{index_record['offset']} ({index_record['length']} bytes)")
+    elif command == "latest" and len(sys.argv) > 2:
+        snapshot = read_latest_snapshot(sys.argv[2])
+        if snapshot is None:
+            print(f"No snapshot found for event '{sys.argv[2]}'.")
+            sys.exit(1)
+        print(json.dumps(snapshot, indent=4, ensure_ascii=False))
+    elif command == "stats" and len(sys.argv) > 2:
+        snapshot = read_latest_snapshot(sys.argv[2], compact=True)
+        if snapshot is None:
+            print(f"No snapshot found for event '{sys.argv[2]}'.")
+            sys.exit(1)
+        print_snapshot_stats(snapshot)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,324 @@
+# samachi-app/python/glownet_tag_index.py
+"""
+Persistent tag_uid -> (event_id, gtag_id, customer_id) index for Glownet cards.
+
+Finding the event a physical card belongs to used to mean listing every event
+and paging through each event's G-Tags. The index is filled in bulk from the
+G-Tag listings (or from the local mirror) and kept in SQLite; on open it is
+loaded into a dict, so lookups at the door are a dictionary hit. A UID that
+is not indexed falls back to GET /api/v2/events/lookup?gtag_uid= and the
+answer is stored. UIDs the API does not know are remembered for MISS_TTL
+seconds so a bad card cannot hammer the API.
+
+Cards move: they get unassigned, re-issued in another event or deactivated.
+An entry older than ENTRY_TTL is revalidated against /events/lookup the
+next time it is looked up: the API's answer replaces it, and a UID the API
+no longer knows is dropped from the index. If the revalidation call itself
+fails, the old entry is still served.
+
+UIDs are compared case-insensitively and sent to the API upper-cased. When a
+UID appears in several events, the event indexed last (highest id in a bulk
+build) wins.
+
+Usage:
+    python glownet_tag_index.py build [--event ID_OR_SLUG ...] [--workers N] [--from-mirror]
+    python glownet_tag_index.py lookup <tag_uid> [<tag_uid> ...] [--offline]
+    python glownet_tag_index.py stats
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import glownet_client as glownet
+from glownet_client import handle_response
+
+TAG_INDEX_DB_PATH = os.getenv("GLOWNET_TAG_INDEX_PATH", os.path.join(glownet.script_dir, "glownet_tag_index.sqlite3"))
+MISS_TTL = 300 # Seconds a UID unknown to the API is not asked about again
+ENTRY_TTL = 3600 # Seconds before an indexed entry is revalidated on lookup
+TAG_INDEX_BUILD_WORKERS = 4 # Events listed at once during a bulk build
+TAG_INDEX_LOOKUP_WORKERS = 8 # Concurrent /events/lookup calls in lookup_many()
+GTAG_INDEX_FIELDS = ("id", "tag_uid", "customer_id", "active")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tags (
+    uid_key TEXT PRIMARY KEY,
+    tag_uid TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    gtag_id INTEGER,
+    customer_id INTEGER,
+    active INTEGER,
+    source TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tags_event ON tags(event_id);
+
+CREATE TABLE IF NOT EXISTS misses (
+    uid_key TEXT PRIMARY KEY,
+    checked_at REAL NOT NULL
+);
+"""
+
+TagLocation = namedtuple("TagLocation", ("tag_uid", "event_id", "gtag_id", "customer_id", "active"))
+
+def uid_key(tag_uid):
+    """Normalised form UIDs are indexed under."""
+    return str(tag_uid).strip().upper()
+
+class TagIndex:
+    """The tag_uid index. Lookups are served from memory; writes go through to SQLite."""
+
+    def __init__(self, db_path=TAG_INDEX_DB_PATH):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._updated_at = {}
+        for key, tag_uid, event_id, gtag_id, customer_id, active, updated_at in self._conn.execute(
+                "SELECT uid_key, tag_uid, event_id, gtag_id, customer_id, active, updated_at FROM tags"):
+            self._entries[key] = TagLocation(tag_uid, event_id, gtag_id, customer_id, None if active is None else bool(active))
+            self._updated_at[key] = updated_at
+        self._misses = dict(self._conn.execute("SELECT uid_key, checked_at FROM misses"))
+        self.api_lookups = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        self._conn.close()
+
+    def _store(self, locations, source):
+        """Writes TagLocations to memory and disk in one transaction."""
+        now = time.time()
+        rows = [(uid_key(l.tag_uid), l.tag_uid, l.event_id, l.gtag_id, l.customer_id,
+                 None if l.active is None else int(l.active), source, now) for l in locations]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tags (uid_key, tag_uid, event_id, gtag_id, customer_id, active, source, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("DELETE FROM misses WHERE uid_key = ?", [(row[0],) for row in rows])
+            for row, location in zip(rows, locations):
+                self._entries[row[0]] = location
+                self._updated_at[row[0]] = now
+                self._misses.pop(row[0], None)
+
+    def _store_misses(self, keys):
+        """Records UIDs the API does not know, dropping any entries indexed for them."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO misses (uid_key, checked_at) VALUES (?, ?)", [(key, now) for key in keys])
+            self._conn.executemany("DELETE FROM tags WHERE uid_key = ?", [(key,) for key in keys])
+            for key in keys:
+                self._misses[key] = now
+                self._entries.pop(key, None)
+                self._updated_at.pop(key, None)
+
+    # --- Bulk Fill ---
+
+    def index_gtags(self, event_id, gtags, source="listing"):
+        """Indexes G-Tag dicts from an event listing. Returns the number indexed."""
+        locations = [TagLocation(str(gtag["tag_uid"]), int(event_id), gtag.get("id"), gtag.get("customer_id"), gtag.get("active"))
+                     for gtag in gtags if gtag.get("tag_uid")]
+        self._store(locations, source)
+        return len(locations)
+
+    def build(self, events=None, workers=TAG_INDEX_BUILD_WORKERS):
+        """
+        Indexes the G-Tags of every event (or of `events`, a list of event dicts).
+
+        Events are listed concurrently on the shared client session; results are
+        written from this thread in event id order, so later events win on
+        duplicate UIDs. Returns (tags_indexed, failed_event_ids).
+        """
+        if events is None:
+            cursor = glownet.PageCursor(glownet.api_url("/api/v2/events"), per_page=100)
+            events = list(glownet.iter_events(cursor))
+            if cursor.failed:
+                print(f"  Failed to list events (page {cursor.page}); indexing the {len(events)} events fetched so far.")
+        event_ids = sorted(int(event["id"]) for event in events if event.get("id") is not None)
+        print(f"Indexing G-Tags of {len(event_ids)} events with {workers} workers...")
+
+        def list_gtags(event_id):
+            cursor = glownet.PageCursor(glownet.api_url(f"/api/v2/events/{event_id}/gtags"), glownet.GLOWNET_MAX_PER_PAGE)
+            gtags = list(glownet.iter_event_gtags(event_id, GTAG_INDEX_FIELDS, cursor))
+            return None if cursor.failed else gtags
+
+        indexed = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [(event_id, executor.submit(list_gtags, event_id)) for event_id in event_ids]
+            for event_id, future in futures:
+                gtags = future.result()
+                if gtags is None:
+                    print(f"  Failed to list G-Tags for event {event_id}; its entries were left as they were.")
+                    failed.append(event_id)
+                    continue
+                count = self.index_gtags(event_id, gtags)
+                indexed += count
+                print(f"  Event {event_id}: indexed {count} G-Tags.")
+        return indexed, failed
+
+    def build_from_mirror(self, mirror_db_path=None):
+        """Indexes the G-Tags already in the local SQLite mirror (no API calls). Returns the number indexed."""
+        import glownet_mirror
+        conn = glownet_mirror.connect(mirror_db_path or glownet_mirror.MIRROR_DB_PATH)
+        try:
+            rows = conn.execute("SELECT event_id, id, tag_uid, customer_id, status FROM gtags WHERE tag_uid IS NOT NULL ORDER BY event_id")
+            locations = [TagLocation(row["tag_uid"], row["event_id"], row["id"], row["customer_id"],
+                                     None if row["status"] is None else row["status"] == "active") for row in rows]
+        finally:
+            conn.close()
+        self._store(locations, "mirror")
+        return len(locations)
+
+    # --- Lookups ---
+
+    def get(self, tag_uid):
+        """Index-only lookup: the TagLocation for a UID, or None if it is not indexed."""
+        return self._entries.get(uid_key(tag_uid))
+
+    def _fetch(self, tag_uid):
+        """
+        Asks /events/lookup about one UID.
+
+        Returns a TagLocation, False if the API does not know the UID, or None
+        if the call failed (not cached, so it is retried next time).
+        """
+        self.api_lookups += 1
+        try:
+            response = glownet.get("/api/v2/events/lookup", params={"gtag_uid": uid_key(tag_uid)}, cache=False)
+        except requests.exceptions.RequestException as e:
+            print(f"  Network error looking up G-Tag '{tag_uid}': {e}")
+            return None
+        if response.status_code == 404:
+            return False
+        data = handle_response(response, success_status_codes=(200,))
+        if not isinstance(data, dict) or data.get("event_id") is None:
+            return None
+        return TagLocation(uid_key(tag_uid), data["event_id"], data.get("gtag_id"), data.get("customer_id"), data.get("gtag_active?"))
+
+    def _recently_missed(self, key):
+        checked_at = self._misses.get(key)
+        return checked_at is not None and time.time() - checked_at < MISS_TTL
+
+    def _needs_fetch(self, key, location, now):
+        """True if a UID should be asked about: not indexed (and not a recent miss), or indexed longer than ENTRY_TTL ago."""
+        if location is None:
+            return not self._recently_missed(key)
+        return now - self._updated_at.get(key, 0) >= ENTRY_TTL
+
+    def lookup(self, tag_uid, fetch=True):
+        """Returns the TagLocation for a UID, asking the API on an index miss unless fetch=False. None if unknown."""
+        return self.lookup_many([tag_uid], fetch, workers=1).get(tag_uid)
+
+    def lookup_many(self, tag_uids, fetch=True, workers=TAG_INDEX_LOOKUP_WORKERS):
+        """
+        Looks up many UIDs at once. Returns {tag_uid: TagLocation or None}.
+
+        Indexed UIDs are answered from memory; the rest, and entries older
+        than ENTRY_TTL, are resolved through /events/lookup concurrently (one
+        call per distinct UID) and stored. A revalidated UID the API no longer
+        knows is dropped and comes back as None.
+        """
+        results = {}
+        pending = {}
+        now = time.time()
+        for tag_uid in tag_uids:
+            key = uid_key(tag_uid)
+            location = self._entries.get(key)
+            results[tag_uid] = location
+            if fetch and self._needs_fetch(key, location, now):
+                pending.setdefault(key, tag_uid)
+        if not pending:
+            return results
+
+        found, missing = [], []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+            futures = {executor.submit(self._fetch, tag_uid): key for key, tag_uid in pending.items()}
+            for future in as_completed(futures):
+                location = future.result()
+                if location:
+                    found.append(location)
+                elif location is False:
+                    missing.append(futures[future])
+        if found:
+            self._store(found, "lookup")
+        if missing:
+            self._store_misses(missing)
+        for tag_uid in results:
+            if uid_key(tag_uid) in pending:
+                results[tag_uid] = self._entries.get(uid_key(tag_uid))
+        return results
+
+    def stats(self):
+        """Counts of indexed UIDs by source, events covered, entries due for revalidation and cached misses."""
+        with self._lock:
+            by_source = dict(self._conn.execute("SELECT source, COUNT(*) FROM tags GROUP BY source"))
+            events = self._conn.execute("SELECT COUNT(DISTINCT event_id) FROM tags").fetchone()[0]
+            stale = sum(1 for updated_at in self._updated_at.values() if time.time() - updated_at >= ENTRY_TTL)
+        return {"tags": len(self._entries), "events": events, "by_source": by_source, "stale": stale, "misses": len(self._misses)}
+
+# --- Main Script ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent tag_uid -> event/G-Tag/customer index.")
+    parser.add_argument("--db", default=TAG_INDEX_DB_PATH, help="Path to the index database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index the G-Tags of all (or selected) events")
+    build_parser.add_argument("--event", action="append", help="Only index this event id or slug (repeatable)")
+    build_parser.add_argument("--workers", type=int, default=TAG_INDEX_BUILD_WORKERS, help="Events listed at once")
+    build_parser.add_argument("--from-mirror", action="store_true", help="Index from the local mirror instead of the API")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Look up one or more tag UIDs")
+    lookup_parser.add_argument("tag_uids", nargs="+")
+    lookup_parser.add_argument("--offline", action="store_true", help="Do not fall back to /events/lookup")
+
+    subparsers.add_parser("stats", help="Show what the index holds")
+    args = parser.parse_args()
+
+    index = TagIndex(args.db)
+    if args.command == "build":
+        start_time = time.monotonic()
+        if args.from_mirror:
+            count = index.build_from_mirror()
+            print(f"Indexed {count} G-Tags from the mirror in {time.monotonic() - start_time:.2f}s.")
+        else:
+            glownet.require_api_key()
+            events = None
+            if args.event:
+                wanted = {str(value) for value in args.event}
+                events = [e for e in glownet.iter_events() if str(e.get("id")) in wanted or str(e.get("slug")) in wanted]
+            count, failed = index.build(events, args.workers)
+            print(f"Indexed {count} G-Tags in {time.monotonic() - start_time:.2f}s"
+                  f"{f', {len(failed)} events failed' if failed else ''}.")
+            if failed:
+                sys.exit(1)
+    elif args.command == "lookup":
+        if not args.offline:
+            glownet.require_api_key()
+        start_time = time.perf_counter()
+        results = index.lookup_many(args.tag_uids, fetch=not args.offline)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        for tag_uid, location in results.items():
+            if location is None:
+                print(f"  {tag_uid}: not found")
+            else:
+                print(f"  {tag_uid}: Event: {location.event_id}, G-Tag ID: {location.gtag_id}, "
+                      f"Customer ID: {location.customer_id}, Active: {location.active}")
+        print(f"{len(results)} lookups in {elapsed_ms:.2f} ms ({index.api_lookups} API calls).")
+    elif args.command == "stats":
+        stats = index.stats()
+        print(f"{stats['tags']} tag UIDs across {stats['events']} events ({index.db_path}).")
+        for source, count in sorted(stats["by_source"].items()):
+            print(f"  {source}: {count}")
+        print(f"  Due for revalidation: {stats['stale']}")
+        print(f"  Cached misses: {stats['misses']}")
+    index.close()
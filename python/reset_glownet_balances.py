@@ -4,61 +4,47 @@ import requests
 import json
 import time
 import sys
-from dotenv import load_dotenv
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# --- Configuration ---
-script_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(script_dir)
-dotenv_path = os.path.join(parent_dir, '.env.local')
-
-print(f"Looking for .env.local at: {dotenv_path}")
-if not os.path.exists(dotenv_path):
-    print(f"Warning: .env.local not found at {dotenv_path}. API calls may fail.")
-else:
-    print(f"Found .env.local file.")
-    
-load_dotenv(dotenv_path=dotenv_path)
+import glownet_client as glownet
+import glownet_mirror
+from glownet_entities import BalanceColumns, Customer, format_cents, parse_amount
+from glownet_client import GLOWNET_API_BASE_URL
+from glownet_journal import Journal, journal_path, load_journal, STATE_DONE, STATE_INTENDED
 
-GLOWNET_API_BASE_URL = os.getenv("GLOWNET_API_BASE_URL", "https://opera.glownet.com")
-GLOWNET_API_KEY = os.getenv("GLOWNET_API_KEY")
+# --- Configuration ---
+glownet.require_api_key()
 
-if not GLOWNET_API_KEY:
-    print("Error: GLOWNET_API_KEY environment variable not set in .env.local")
-    sys.exit(1)
+# Parallel customer-detail lookups during balance screening
+GLOWNET_SCREEN_WORKERS = int(os.getenv("GLOWNET_SCREEN_WORKERS", str(glownet.GLOWNET_POOL_SIZE)))
+# Parallel refunds during settlement; they all share the client's adaptive rate limit
+GLOWNET_REFUND_WORKERS = int(os.getenv("GLOWNET_REFUND_WORKERS", str(glownet.GLOWNET_POOL_SIZE)))
+# Sends per customer when a refund's outcome is unknown (network error or 5xx)
+REFUND_MAX_ATTEMPTS = 3
+# Seconds to let an ambiguous refund land before checking for it (times the attempt number)
+REFUND_RECHECK_DELAY = 1.0
 
-HEADERS = {
-    "Authorization": f"Token token={GLOWNET_API_KEY}",
-    "Content-Type": "application/json",
-    "Accept": "application/json"
-}
+# Settlement outcomes, one per customer
+OUTCOME_REFUNDED = "refunded"
+OUTCOME_NO_BALANCE = "no_balance" # Re-checked: nothing left to refund
+OUTCOME_SKIPPED = "already_settled" # Done in a previous run of this journal
+OUTCOME_REJECTED = "rejected"
+OUTCOME_UNKNOWN = "unknown"
+SETTLED_OUTCOMES = (OUTCOME_REFUNDED, OUTCOME_NO_BALANCE, OUTCOME_SKIPPED)
 
 # --- Helper Functions ---
 
 def handle_response(response, success_status_codes=(200, 201, 204)):
-    """Checks response status and returns JSON or raises error/returns None."""
-    if response.status_code in success_status_codes:
-        try:
-            if response.text and len(response.text) > 0:
-                return response.json()
-            else: # Success, but no JSON body (e.g., 204 No Content)
-                return None 
-        except requests.exceptions.JSONDecodeError:
-            print(f"Warning: Successful status ({response.status_code}) but could not decode JSON.")
-            print(f"Response Text: {response.text}")
-            return None # Still success, just no parsable body
-    else:
-        print(f"Error: API returned status {response.status_code}")
-        try:
-            error_details = response.json()
-            print(f"Response: {json.dumps(error_details, indent=2)}")
-            message = error_details.get('error') or error_details.get('message') or str(error_details)
-            print(f"API Error Details: {message}")
-        except requests.exceptions.JSONDecodeError:
-            print(f"Response Text (non-JSON): {response.text}")
-        return "API_ERROR" # Indicate a specific error state
+    """Checks response status and returns JSON, None for an empty body, or "API_ERROR" on failure."""
+    return glownet.handle_response(response, success_status_codes, error_value="API_ERROR")
 
 def get_all_events():
     """Fetches all events from the Glownet API."""
+    mirrored = glownet_mirror.mirrored_events()
+    if mirrored is not None:
+        return mirrored
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events"
     print(f"Fetching all events from {url}...")
     all_events = []
@@ -66,7 +52,7 @@ def get_all_events():
     while True:
         try:
             params = {'page': page, 'per_page': 100} # Max per_page usually 100
-            response = requests.get(url, headers=HEADERS, params=params)
+            response = glownet.get(url, params=params)
             data = handle_response(response)
             if data == "API_ERROR":
                 print(f"  Failed to fetch events page {page}. Stopping event fetch.")
@@ -80,42 +66,39 @@ def get_all_events():
                 print(f"  Fetched {len(all_events)} events in total.")
                 break
             page += 1
-            time.sleep(0.1) # Be nice to the API
         except requests.exceptions.RequestException as e:
             print(f"  Network error fetching events (page {page}): {e}")
             return None
     return all_events
 
-def get_all_customers_for_event(event_api_id):
-    """Fetches all customers for a specific event, handling pagination."""
+def iter_customer_pages(event_api_id, per_page=100, cursor=None):
+    """
+    Yields each page of customers for an event as soon as it arrives. Yields "API_ERROR" and stops on failure.
+
+    Pages are stream-decoded and customers keep only glownet.CUSTOMER_FIELDS (id,
+    names, email and balances), so memory stays flat however large the event is.
+    The next page is prefetched while the caller works on the current one. Pass
+    a glownet.PageCursor to resume a listing or see how far a failed one got.
+    """
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_api_id}/customers"
-    print(f"Fetching all customers for event '{event_api_id}' from {url}...")
+    cursor = cursor or glownet.PageCursor(url, per_page)
+    print(f"Fetching all customers for event '{event_api_id}' from {url} (from page {cursor.page})...")
+    for page in glownet.iter_pages(cursor, fields=glownet.CUSTOMER_FIELDS, label="customers"):
+        print(f"  Fetched page {cursor.page} ({len(page)} customers). Total so far: {cursor.fetched + len(page)} for event '{event_api_id}'.")
+        yield page
+    if cursor.failed:
+        print(f"  Failed to fetch customers page {cursor.page} for event '{event_api_id}'. Stopping.")
+        yield "API_ERROR" # Indicate failure
+        return
+    print(f"  Fetched {cursor.fetched} customers in total for event '{event_api_id}'.")
+
+def get_all_customers_for_event(event_api_id):
+    """Fetches all customers for a specific event as compact Customer records, handling pagination."""
     all_customers = []
-    page = 1
-    while True:
-        try:
-            params = {'page': page, 'per_page': 100}
-            response = requests.get(url, headers=HEADERS, params=params)
-            data = handle_response(response)
-            
-            if data == "API_ERROR":
-                print(f"  Failed to fetch customers page {page} for event '{event_api_id}'. Stopping.")
-                return None # Indicate failure
-            if not isinstance(data, list) or not data: # Empty list means no more pages or no customers
-                print(f"  Fetched {len(all_customers)} customers in total for event '{event_api_id}'.")
-                break
-            
-            all_customers.extend(data)
-            print(f"  Fetched page {page} ({len(data)} customers). Total so far: {len(all_customers)} for event '{event_api_id}'.")
-            
-            if len(data) < 100: # Last page
-                print(f"  Fetched {len(all_customers)} customers in total for event '{event_api_id}'.")
-                break
-            page += 1
-            time.sleep(0.1) 
-        except requests.exceptions.RequestException as e:
-            print(f"  Network error fetching customers for event '{event_api_id}' (page {page}): {e}")
+    for page in iter_customer_pages(event_api_id):
+        if page == "API_ERROR":
             return None # Indicate failure
+        all_customers.extend(Customer.from_api(item) for item in page)
     return all_customers
     
 def get_customer_details(event_api_id, customer_id):
@@ -123,7 +106,7 @@ def get_customer_details(event_api_id, customer_id):
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_api_id}/customers/{customer_id}"
     # print(f"Fetching details for customer {customer_id} in event {event_api_id}...")
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = glownet.get(url)
         # Allow 404 as a possible outcome, return None instead of "API_ERROR" for it
         if response.status_code == 404:
             print(f"  Warning: Customer {customer_id} not found (404).")
@@ -131,10 +114,14 @@ def get_customer_details(event_api_id, customer_id):
         return handle_response(response) # handle_response checks for other errors
     except requests.exceptions.RequestException as e:
         print(f"Network error fetching customer details for {customer_id}: {e}")
-        return None
+        return "API_ERROR"
 
 def attempt_customer_refund(event_api_id, customer_id, gateway="samachi_settlement"):
-    """Attempts to perform a refund operation for a customer, potentially zeroing balance."""
+    """Attempts to perform a refund operation for a customer, potentially zeroing balance.
+
+    Returns True on success, False if the API rejected it, None if the outcome
+    is unknown (network error or server error).
+    """
     url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_api_id}/customers/{customer_id}/refund"
     payload = {
         "gateway": gateway,
@@ -143,7 +130,7 @@ def attempt_customer_refund(event_api_id, customer_id, gateway="samachi_settleme
     print(f"Attempting refund/settlement for customer {customer_id} in event {event_api_id} via {url}...")
     print(f"Payload: {json.dumps(payload)}")
     try:
-        response = requests.post(url, headers=HEADERS, json=payload)
+        response = glownet.post(url, json=payload)
         
         # Check common success codes for creation/action (200, 201, 204)
         result = handle_response(response, success_status_codes=(200, 201, 204)) 
@@ -155,15 +142,286 @@ def attempt_customer_refund(event_api_id, customer_id, gateway="samachi_settleme
             # Specific handling for 422 if it means "no balance to refund" vs other errors
             if response.status_code == 422:
                  print(f"  Refund/Settlement failed for customer {customer_id} (Status: 422). This might indicate no refundable balance or other validation error.")
+            elif response.status_code >= 500:
+                 print(f"  Refund/Settlement for customer {customer_id} got a server error (Status: {response.status_code}). Outcome unknown.")
+                 return None
             else:
                  print(f"  Refund/Settlement failed for customer {customer_id}. Status: {response.status_code}.")
             return False
     except requests.exceptions.RequestException as e:
         print(f"  Network error during refund/settlement for customer {customer_id}: {e}")
-        return False
+        return None # Outcome unknown: the refund may or may not have been applied
+
+def list_customer_refund_ids(event_api_id, customer_id):
+    """Ids of a customer's refunds, or "API_ERROR" if they could not be listed completely."""
+    url = f"{GLOWNET_API_BASE_URL}/api/v2/events/{event_api_id}/customers/{customer_id}/refunds"
+    try:
+        response = glownet.get(url, params={'per_page': glownet.GLOWNET_MAX_PER_PAGE})
+    except requests.exceptions.RequestException as e:
+        print(f"  Network error listing refunds for customer {customer_id}: {e}")
+        return "API_ERROR"
+    refunds = handle_response(response, success_status_codes=(200,))
+    if not isinstance(refunds, list) or len(refunds) >= glownet.GLOWNET_MAX_PER_PAGE: # A full page may not be all of them
+        return "API_ERROR"
+    return [refund.get("id") for refund in refunds if isinstance(refund, dict) and refund.get("status") != "cancelled"]
+
+def confirm_customer_balance(event_api_id, event_obj, customer_id):
+    """
+    Fetches full customer details and returns a customers_with_balance entry,
+    None if the customer has no balance (or no longer exists), or "API_ERROR"
+    if the details could not be fetched and the balance is unknown.
+    """
+    details = get_customer_details(event_api_id, customer_id)
+    if details == "API_ERROR":
+        print(f"  Could not fetch details for customer {customer_id} to confirm balance.")
+        return "API_ERROR"
+    if not details:
+        return None
+
+    detailed_vm_str = str(details.get('virtual_money', '0')).strip()
+    detailed_m_str = str(details.get('money', '0')).strip()
+    detailed_balances = details.get('balances') # This is the most reliable
+
+    display_vm = "0"
+    display_m = "0"
+    actual_balance_found = False
+
+    if parse_amount(detailed_vm_str) > 0: # Check detailed virtual_money
+        display_vm = detailed_vm_str
+        actual_balance_found = True
+    if parse_amount(detailed_m_str) > 0: # Check detailed money
+        display_m = detailed_m_str
+        actual_balance_found = True
+
+    # More robust check using the 'balances' dictionary
+    if isinstance(detailed_balances, dict):
+        for b_id, b_val_str in detailed_balances.items():
+            if parse_amount(b_val_str) > 0:
+                actual_balance_found = True
+                # Update display strings if these are more specific and non-zero
+                if b_id == str((event_obj.get('virtual_credit') or {}).get('id')):
+                    display_vm = str(b_val_str)
+                elif b_id == str((event_obj.get('credit') or {}).get('id')):
+                    display_m = str(b_val_str)
+                break # Found a non-zero balance in the dict
+
+    if not actual_balance_found:
+        return None
+
+    name = f"{details.get('first_name', '')} {details.get('last_name', '')}".strip() or "N/A"
+    email = details.get('email', 'N/A')
+    print(f"    -> Confirmed balance for Customer ID: {customer_id}, Name: {name}, Email: {email}, Virtual: {display_vm}, Standard: {display_m}")
+    return {
+        "id": customer_id,
+        "name": name,
+        "email": email,
+        "virtual_money": display_vm, # Show from details
+        "money": display_m, # Show from details
+        "balances_obj": detailed_balances # Store for reference
+    }
+
+def screen_customer_balances(event_api_id, event_obj, workers=GLOWNET_SCREEN_WORKERS):
+    """
+    Finds customers with a non-zero balance in their detailed view.
+
+    Each page is screened as a batch: its balances are decoded into integer
+    cent columns (BalanceColumns, keyed by the event's credit and
+    virtual_credit ids) and only the positive holders are confirmed. Detail
+    lookups run on a bounded worker pool and start as soon as the first
+    customer page arrives, overlapping with the remaining page fetches. Returns
+    (customers_checked, customers_with_balance, unconfirmed_ids), the last two
+    in customer list order, where unconfirmed_ids are holders whose details
+    could not be fetched; or (None, None, None) if the customer list could not
+    be fetched.
+    """
+    start_time = time.monotonic()
+    customers_checked = 0
+    detail_lookups = 0
+    futures = [] # (list position, future), to restore customer order at the end
+    listed_totals = dict.fromkeys(BalanceColumns.COLUMNS, 0)
+    listing_failed = False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for page in iter_customer_pages(event_api_id):
+            if page == "API_ERROR":
+                listing_failed = True
+                break
+            # The summary 'virtual_money' and 'money' might be 0 even with a balance,
+            # so the 'balances' object (keyed by credit ID) is screened as well.
+            columns = BalanceColumns.for_event(page, event_obj)
+            for position in columns.holders():
+                customer_id = columns.ids[position]
+                if not customer_id:
+                    print(f"  Skipping customer entry with no ID: {page[position]}")
+                    continue
+                # To be sure, fetch full details as summary balances can be tricky
+                detail_lookups += 1
+                futures.append((customers_checked + position, customer_id,
+                                executor.submit(confirm_customer_balance, event_api_id, event_obj, customer_id)))
+            customers_checked += len(columns)
+            for column, total in columns.totals().items():
+                listed_totals[column] += total
+            elapsed = time.monotonic() - start_time
+            done = sum(1 for _, _, future in futures if future.done())
+            rate = customers_checked / elapsed if elapsed > 0 else 0.0
+            print(f"  Screened {customers_checked} customers ({rate:.1f}/s), detail lookups done: {done}/{detail_lookups}...")
+
+        if listing_failed:
+            for _, _, future in futures:
+                future.cancel()
+            return None, None, None
+
+        confirmed = [(customer_id, future.result()) for _, customer_id, future in sorted(futures, key=lambda item: item[0])]
+
+    customers_with_balance = [entry for _, entry in confirmed if entry and entry != "API_ERROR"]
+    unconfirmed_ids = [customer_id for customer_id, entry in confirmed if entry == "API_ERROR"]
+    elapsed = time.monotonic() - start_time
+    print(f"Screened {customers_checked} customers with {detail_lookups} detail lookups in {elapsed:.2f}s "
+          f"({customers_checked / elapsed if elapsed > 0 else 0.0:.1f} customers/s, "
+          f"{detail_lookups / elapsed if elapsed > 0 else 0.0:.1f} lookups/s, {workers} workers).")
+    print("Balances in the customer list: " + ", ".join(f"{column}={format_cents(total)}" for column, total in listed_totals.items()))
+    if unconfirmed_ids:
+        print(f"Warning: could not confirm the balance of {len(unconfirmed_ids)} customer(s): "
+              f"{', '.join(str(customer_id) for customer_id in unconfirmed_ids)}")
+    return customers_checked, customers_with_balance, unconfirmed_ids
+
+def recheck_refund(event_api_id, event_obj, customer_id, known_refund_ids=None):
+    """
+    Checks whether an unconfirmed refund went through.
+
+    The refund endpoint only takes a gateway and send_email, so a refund cannot
+    be tagged; instead the customer's refund ids are listed before each send
+    (known_refund_ids, kept with the journal intent) and a refund that is not
+    among them is this one. Only when that list is missing or the refunds
+    cannot be listed does it fall back to the balance: a refund zeroes it, but
+    a top-up or spend in between makes the balance misleading either way.
+    Returns OUTCOME_REFUNDED if the refund was found, OUTCOME_NO_BALANCE if the
+    customer has no balance left, None if it is safe to send again, or
+    OUTCOME_UNKNOWN if neither check could be made.
+    """
+    if known_refund_ids is not None:
+        refund_ids = list_customer_refund_ids(event_api_id, customer_id)
+        if refund_ids != "API_ERROR":
+            if set(refund_ids) - set(known_refund_ids):
+                print(f"  Found the refund for customer {customer_id}. Marking as refunded.")
+                return OUTCOME_REFUNDED
+            return None
+        print(f"  Could not list refunds for customer {customer_id}. Checking the balance instead.")
+    confirmed = confirm_customer_balance(event_api_id, event_obj, customer_id)
+    if confirmed == "API_ERROR":
+        return OUTCOME_UNKNOWN
+    if confirmed is None:
+        print(f"  Customer {customer_id} has no remaining balance. Marking as settled.")
+        return OUTCOME_NO_BALANCE
+    return None
+
+def refund_with_journal(event_api_id, event_obj, customer_id, journal, resume_entries, max_attempts=1):
+    """
+    Runs one refund under the write-ahead journal. Returns the outcome (see SETTLED_OUTCOMES).
+
+    Completed refunds from a previous run are skipped. A refund that was sent
+    but never confirmed (in flight when a previous run stopped, or a network or
+    server error now) is re-checked before it is sent again: if a new refund
+    shows up for the customer (or, failing that, they no longer hold a
+    balance) it is recorded as done instead of being refunded twice (see
+    recheck_refund). If the re-check itself fails nothing is sent and the
+    refund stays in flight. Up to max_attempts sends are made while the
+    outcome stays unknown. Each send costs one extra request, to list the
+    customer's refunds for the intent.
+    """
+    key = f"refund:{event_api_id}:{customer_id}"
+    entry = resume_entries.get(key)
+    if entry and entry["state"] == STATE_DONE:
+        print(f"  Customer {customer_id} already settled in a previous run, skipping.")
+        return OUTCOME_SKIPPED
+    unconfirmed = bool(entry and entry["state"] == STATE_INTENDED)
+    known_refund_ids = entry["data"].get("refund_ids") if unconfirmed else None
+    if unconfirmed:
+        print(f"  Customer {customer_id} was in flight when the previous run stopped. Re-checking...")
+
+    for attempt in range(max_attempts):
+        if unconfirmed:
+            if attempt:
+                time.sleep(REFUND_RECHECK_DELAY * attempt)
+            outcome = recheck_refund(event_api_id, event_obj, customer_id, known_refund_ids)
+            if outcome == OUTCOME_UNKNOWN:
+                print(f"  Could not re-check customer {customer_id}. Leaving the refund in flight.")
+                break
+            if outcome:
+                journal.done(key, rechecked=True, outcome=outcome)
+                return outcome
+        known_refund_ids = list_customer_refund_ids(event_api_id, customer_id)
+        if known_refund_ids == "API_ERROR":
+            known_refund_ids = None # A re-check will have to go by the balance
+        journal.intend(key, refund_ids=known_refund_ids)
+        result = attempt_customer_refund(event_api_id, customer_id)
+        if result:
+            journal.done(key)
+            return OUTCOME_REFUNDED
+        if result is False:
+            journal.failed(key)
+            return OUTCOME_REJECTED
+        unconfirmed = True
+    # Left as intended so a resume re-checks it
+    return OUTCOME_UNKNOWN
+
+def settle_customers(event_api_id, event_obj, customer_ids, journal, resume_entries, workers=GLOWNET_REFUND_WORKERS):
+    """
+    Refunds customers concurrently under the write-ahead journal. Returns {outcome: [customer ids]}.
+
+    An ambiguous failure is re-checked against the customer's refunds (or
+    balance) before it is retried. Throughput is bounded by the shared rate limiter, not by
+    the worker count.
+    """
+    start_time = time.monotonic()
+    by_outcome = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(refund_with_journal, event_api_id, event_obj, customer_id, journal, resume_entries,
+                                   REFUND_MAX_ATTEMPTS): customer_id
+                   for customer_id in customer_ids}
+        for completed, future in enumerate(as_completed(futures), 1):
+            by_outcome[future.result()].append(futures[future])
+            if completed % 50 == 0 or completed == len(futures):
+                elapsed = time.monotonic() - start_time
+                print(f"  Settled {completed}/{len(futures)} customers ({completed / elapsed if elapsed > 0 else 0.0:.1f}/s)...")
+    print_settlement_summary(by_outcome, time.monotonic() - start_time, workers)
+    return by_outcome
+
+def print_settlement_summary(by_outcome, elapsed, workers):
+    total = sum(len(customer_ids) for customer_ids in by_outcome.values())
+    print("-" * 50)
+    print(f"Settlement of {total} customers in {elapsed:.2f}s ({total / elapsed if elapsed > 0 else 0.0:.1f}/s, {workers} workers):")
+    for outcome in SETTLED_OUTCOMES + (OUTCOME_REJECTED, OUTCOME_UNKNOWN):
+        customer_ids = by_outcome.get(outcome)
+        if not customer_ids:
+            continue
+        line = f"  {outcome:<16} {len(customer_ids)}"
+        if outcome not in SETTLED_OUTCOMES:
+            line += f" (customer IDs: {', '.join(str(customer_id) for customer_id in sorted(customer_ids, key=str))})"
+        print(line)
+    if by_outcome.get(OUTCOME_UNKNOWN):
+        print("  Unknown outcomes stay in flight in the journal; re-run with --resume to re-check them.")
+
+def open_reset_journal(event_api_id, resume):
+    """Opens the journal for this event. Returns (journal, replayed entries); a fresh run archives the old file."""
+    path = journal_path(f"reset-{event_api_id}")
+    resume_entries = {}
+    if resume:
+        resume_entries = load_journal(path)
+        print(f"Resuming from journal {path} ({len(resume_entries)} recorded items).")
+    elif os.path.exists(path):
+        archived = f"{path}.{int(time.time())}"
+        os.replace(path, archived)
+        print(f"Archived previous journal to {archived}.")
+    return Journal(path), resume_entries
 
 # --- Main Script ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refund/settle Glownet customers with a remaining balance.")
+    parser.add_argument("--resume", action="store_true", help="Continue the last run for the selected event from its journal")
+    parser.add_argument("--workers", type=int, default=GLOWNET_REFUND_WORKERS, help=f"Concurrent refunds (default: {GLOWNET_REFUND_WORKERS})")
+    args = parser.parse_args()
+
     print("\nGlownet Customer Balance Reset Script")
     print(f"API Base URL: {GLOWNET_API_BASE_URL}")
     print("WARNING: This script will attempt to reset (zero out) balances on Glownet tags.")
@@ -201,117 +459,30 @@ if __name__ == "__main__":
     print("-" * 50)
     print(f"Fetching customers for event '{selected_event_obj.get('name', 'N/A')}' to check balances...")
     
-    customers = get_all_customers_for_event(selected_event_api_id)
-    if customers is None: # Indicates an error during fetch
-        print(f"Could not retrieve customers for event '{selected_event_api_id}'. Exiting.")
-        sys.exit(1)
-    if not customers:
-        print(f"No customers found for event '{selected_event_api_id}'. Nothing to do.")
-        sys.exit(0)
-
-    customers_with_balance = []
-    print("Checking customer balances (this might take a moment for many customers)...")
-    for i, cust_summary in enumerate(customers):
-        customer_id = cust_summary.get('id')
-        if not customer_id:
-            print(f"  Skipping customer entry with no ID: {cust_summary}")
-            continue
-
-        # Fetch full details to get accurate balances, as summary might not have them or they might be stale.
-        # The summary 'virtual_money' and 'money' are often strings and might be 0.0 even with balance.
-        # Need to check 'balances' object from detailed customer view typically.
-        
-        # For this script, let's primarily check 'virtual_money' from the summary
-        # and then confirm with detailed view if it looks non-zero, or if 'balances' object indicates value.
-        
-        vm_summary_str = str(cust_summary.get('virtual_money', '0')).strip()
-        m_summary_str = str(cust_summary.get('money', '0')).strip()
-        
-        try:
-            vm_summary_val = float(vm_summary_str)
-            m_summary_val = float(m_summary_str)
-        except ValueError:
-            # print(f"  Could not parse summary balance for customer {customer_id}. Fetching details.")
-            vm_summary_val = 0.0
-            m_summary_val = 0.0
-            
-        has_any_balance = False
-        if vm_summary_val > 0 or m_summary_val > 0:
-            has_any_balance = True
-        
-        # Also check the 'balances' object if present in summary, as it might be more accurate
-        # Glownet 'balances' object keys are usually credit type IDs (as strings)
-        balances_summary = cust_summary.get('balances')
-        if isinstance(balances_summary, dict):
-            for credit_type_id, balance_val_str in balances_summary.items():
-                try:
-                    if float(str(balance_val_str)) > 0:
-                        has_any_balance = True
-                        break
-                except ValueError:
-                    continue # ignore unparsable balance values
-
-        if has_any_balance:
-            # To be sure, fetch full details as summary balances can be tricky
-            print(f"  Customer {customer_id} (Summary VM: {vm_summary_str}, M: {m_summary_str}) might have a balance. Fetching details...")
-            details = get_customer_details(selected_event_api_id, customer_id)
-            if details:
-                detailed_vm_str = str(details.get('virtual_money', '0')).strip()
-                detailed_m_str = str(details.get('money', '0')).strip()
-                detailed_balances = details.get('balances') # This is the most reliable
-                
-                display_vm = "0"
-                display_m = "0"
-                actual_balance_found = False
-
-                try: # Check detailed virtual_money
-                    if float(detailed_vm_str) > 0:
-                        display_vm = detailed_vm_str
-                        actual_balance_found = True
-                except ValueError: pass
-                
-                try: # Check detailed money
-                    if float(detailed_m_str) > 0:
-                        display_m = detailed_m_str
-                        actual_balance_found = True
-                except ValueError: pass
-
-                # More robust check using the 'balances' dictionary
-                if isinstance(detailed_balances, dict):
-                    for b_id, b_val_str in detailed_balances.items():
-                        try:
-                            if float(str(b_val_str)) > 0:
-                                actual_balance_found = True
-                                # Update display strings if these are more specific and non-zero
-                                # This part might need refinement based on which balance you prioritize showing
-                                if b_id == str(selected_event_obj.get('virtual_credit', {}).get('id')):
-                                    display_vm = str(b_val_str)
-                                elif b_id == str(selected_event_obj.get('credit', {}).get('id')):
-                                    display_m = str(b_val_str)
-                                break # Found a non-zero balance in the dict
-                        except ValueError:
-                            continue
-                
-                if actual_balance_found:
-                    name = f"{details.get('first_name', '')} {details.get('last_name', '')}".strip() or "N/A"
-                    email = details.get('email', 'N/A')
-                    customers_with_balance.append({
-                        "id": customer_id,
-                        "name": name,
-                        "email": email,
-                        "virtual_money": display_vm, # Show from details
-                        "money": display_m, # Show from details
-                        "balances_obj": detailed_balances # Store for reference
-                    })
-                    print(f"    -> Confirmed balance for Customer ID: {customer_id}, Name: {name}, Email: {email}, Virtual: {display_vm}, Standard: {display_m}")
-            else:
-                print(f"  Could not fetch details for customer {customer_id} to confirm balance.")
-        
-        if (i + 1) % 10 == 0: # Progress update
-            print(f"  Checked {i+1}/{len(customers)} customers...")
+    journal, resume_entries = open_reset_journal(selected_event_api_id, args.resume)
+    plan = resume_entries.get("plan")
+    if plan and plan["state"] == STATE_DONE:
+        # The screening result is journaled, so a resume does not re-fetch every customer
+        customers_with_balance = plan["data"]["customers"]
+        print(f"Using the {len(customers_with_balance)} customers with balance screened by the previous run.")
+    else:
+        print("Checking customer balances (this might take a moment for many customers)...")
+        customers_checked, customers_with_balance, unconfirmed_ids = screen_customer_balances(selected_event_api_id, selected_event_obj)
+        if customers_checked is None: # Indicates an error during fetch
+            print(f"Could not retrieve customers for event '{selected_event_api_id}'. Exiting.")
+            sys.exit(1)
+        if not customers_checked:
+            print(f"No customers found for event '{selected_event_api_id}'. Nothing to do.")
+            sys.exit(0)
+        if unconfirmed_ids:
+            # Not journaled, so a --resume screens again instead of leaving these customers out
+            print("The screening is incomplete and will run again on the next run.")
+        else:
+            journal.done("plan", customers=customers_with_balance)
 
     if not customers_with_balance:
         print("\nNo customers found with a non-zero virtual or standard money balance in their detailed view for this event.")
+        journal.close()
         sys.exit(0)
 
     print("\nCustomers with detected non-zero balances:")
@@ -328,30 +499,27 @@ if __name__ == "__main__":
 
     reset_count = 0
     if confirm_all == 'yes':
-        print("\n--- Processing ALL listed customers ---")
-        for cust_info in customers_with_balance:
-            print(f"Attempting refund/settlement for Customer ID: {cust_info['id']}...")
-            # *** Use the new refund function ***
-            if attempt_customer_refund(selected_event_api_id, cust_info['id']):
-                reset_count += 1
-            else:
-                 print(f"  Failed or skipped for Customer ID: {cust_info['id']}.")
-            time.sleep(0.3) # API niceness - slightly increased delay
+        print(f"\n--- Processing ALL listed customers ({args.workers} at a time) ---")
+        by_outcome = settle_customers(selected_event_api_id, selected_event_obj, [cust_info['id'] for cust_info in customers_with_balance],
+                                      journal, resume_entries, workers=args.workers)
+        reset_count = sum(len(by_outcome.get(outcome, ())) for outcome in SETTLED_OUTCOMES)
     else:
         print("You chose not to reset all. Please confirm for each customer.")
         for cust_info in customers_with_balance:
             confirm_individual = input(f"Attempt refund/settlement for Customer ID: {cust_info['id']} ({cust_info['name']})? (yes/no): ").strip().lower()
             if confirm_individual == 'yes':
                 print(f"Attempting refund/settlement for Customer ID: {cust_info['id']}...")
-                 # *** Use the new refund function ***
-                if attempt_customer_refund(selected_event_api_id, cust_info['id']):
+                outcome = refund_with_journal(selected_event_api_id, selected_event_obj, cust_info['id'], journal, resume_entries,
+                                              REFUND_MAX_ATTEMPTS)
+                if outcome in SETTLED_OUTCOMES:
                     reset_count +=1
                 else:
                     print(f"  Failed or skipped for Customer ID: {cust_info['id']}.")
-                time.sleep(0.3) # API niceness
             else:
                 print(f"  Skipping refund/settlement for customer {cust_info['id']}.")
 
+    journal.close()
     print("-" * 50)
-    print(f"Script finished. Attempted refund/settlement for {reset_count} customer(s).")
+    print(f"Script finished. Settled {reset_count} of {len(customers_with_balance)} customer(s).")
+    print(f"Journal: {journal.path} (re-run with --resume to continue an interrupted run).")
     print("IMPORTANT: Please manually verify the balances and check for any refund records in Glownet for the processed customers.") 
\ No newline at end of file
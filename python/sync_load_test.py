@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from glownet_metrics import percentile
+
+# Load tester for the Next.js sync routes: drives /api/cards/sync-glownet and
+# /api/venues/sync-glownet with a mix of manual (POST) syncs and cron (GET)
+# hits, either at a fixed concurrency (closed loop) or a target request rate
+# (open loop), for a fixed duration. Reports latency percentiles, status and
+# error breakdowns per endpoint, and throughput over time. Errors (transport
+# failures, 5xx) and rejections (4xx such as 401 or 429) are reported
+# separately; either makes the run exit 1. Meant for a locally started app
+# (npm run dev / next start): every request really syncs.
+#
+#   python sync_load_test.py --concurrency 4 --duration 60
+#   python sync_load_test.py --rps 2 --duration 120 --mix cards-cron=3,venues-cron=1 --output load.json
+
+# --- Configuration ---
+# Construct the path to .env.local relative to this script file
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)  # Go up one level
+dotenv_path = os.path.join(parent_dir, '.env.local')
+load_dotenv(dotenv_path=dotenv_path)
+
+APP_BASE_URL = os.getenv("NEXT_PUBLIC_APP_URL", "http://localhost:3000")
+
+# name -> (method, path, JSON body for POST). The venue POST sends an empty image
+# delta, so load runs never clear venue images.
+TARGETS = {
+    "cards-sync": ("POST", "/api/cards/sync-glownet", {"type": "incremental", "batchSize": 100}),
+    "venues-sync": ("POST", "/api/venues/sync-glownet", {"type": "incremental", "venue_images": {}, "venue_images_mode": "delta"}),
+    "cards-cron": ("GET", "/api/cards/sync-glownet", None),
+    "venues-cron": ("GET", "/api/venues/sync-glownet", None),
+}
+DEFAULT_MIX = "cards-sync=1,venues-sync=1,cards-cron=1,venues-cron=1"
+REQUEST_TIMEOUT = 300 # Seconds; a full sync can take minutes
+
+def parse_mix(mix):
+    """Parses 'name=weight,...' into [(name, weight)]."""
+    weights = []
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in TARGETS:
+            raise ValueError(f"Unknown target '{name}' (choose from {', '.join(TARGETS)})")
+        weights.append((name, float(weight or 1)))
+    return weights
+
+class LoadRun:
+    """Sends requests and collects (offset, target, status, latency) samples. Thread-safe."""
+
+    def __init__(self, base_url, mix, concurrency, cron_header=True, spoof_ips=0, seed=None):
+        self.base_url = base_url.rstrip('/')
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.cron_header = cron_header
+        self.spoof_ips = spoof_ips
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.samples = []
+        self.lags = [] # Open loop only: seconds a request started after its scheduled time
+        self._lock = threading.Lock()
+        self._sent = 0
+        self.started_at = None
+
+    def pick(self):
+        with self._lock:
+            self._sent += 1
+            return self.random.choices(self.names, self.weights)[0], self._sent
+
+    def send(self, target, sequence):
+        method, path, body = TARGETS[target]
+        headers = {"Content-Type": "application/json"}
+        if method == "GET" and self.cron_header:
+            headers["x-vercel-cron"] = "true"
+        if self.spoof_ips:
+            # The routes rate-limit per x-forwarded-for; spreading over fake clients tests the sync itself
+            headers["x-forwarded-for"] = f"10.77.{(sequence % self.spoof_ips) // 256}.{sequence % self.spoof_ips % 256}"
+        started_at = time.monotonic()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", json=body, headers=headers, timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = "error"
+        finished_at = time.monotonic()
+        with self._lock:
+            self.samples.append((started_at - self.started_at, target, status, finished_at - started_at))
+
+    def run_closed(self, concurrency, duration):
+        """`concurrency` workers each send back-to-back requests until the duration is up."""
+        self.started_at = time.monotonic()
+        deadline = self.started_at + duration
+        def worker():
+            while time.monotonic() < deadline:
+                self.send(*self.pick())
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_open(self, rps, duration, max_in_flight):
+        """Starts requests on a fixed schedule of `rps` per second, whatever the latency, with at most max_in_flight at once."""
+        self.started_at = time.monotonic()
+        total = int(rps * duration)
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+            for i in range(total):
+                scheduled = self.started_at + i / rps
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                target, sequence = self.pick()
+                def timed_send(target=target, sequence=sequence, scheduled=scheduled):
+                    with self._lock:
+                        self.lags.append(max(0.0, time.monotonic() - scheduled))
+                    self.send(target, sequence)
+                executor.submit(timed_send)
+
+# --- Reporting ---
+
+def is_error(status):
+    """Transport failure or server error."""
+    return status == "error" or status >= 500
+
+def is_rejected(status):
+    """Request refused by the app (4xx: 401 auth, 429 rate limit, ...); these are not successes either."""
+    return status != "error" and 400 <= status < 500
+
+def summarize(samples, duration, interval, lags=None, expected=frozenset()):
+    """
+    Builds the report dict: per-target stats and a throughput timeline.
+
+    `expected` holds (target, status) pairs the run provokes on purpose (e.g.
+    401 from the cron routes with --no-cron-header); they are not counted as
+    rejected.
+    """
+    rejected = lambda sample: is_rejected(sample[2]) and (sample[1], sample[2]) not in expected
+    by_target = defaultdict(list)
+    for sample in samples:
+        by_target[sample[1]].append(sample)
+    targets = {}
+    for target, target_samples in sorted(by_target.items()):
+        latencies = sorted(sample[3] for sample in target_samples)
+        statuses = Counter(str(sample[2]) for sample in target_samples)
+        errors = sum(1 for sample in target_samples if is_error(sample[2]))
+        rejections = sum(1 for sample in target_samples if rejected(sample))
+        targets[target] = {
+            "count": len(target_samples),
+            "statuses": dict(statuses),
+            "error_rate": errors / len(target_samples),
+            "rejected_rate": rejections / len(target_samples),
+            "rps": len(target_samples) / duration if duration > 0 else 0.0,
+            "latency_seconds": {"p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+                                "p99": percentile(latencies, 0.99), "max": latencies[-1]},
+        }
+    timeline = []
+    buckets = defaultdict(list)
+    for sample in samples:
+        buckets[int(sample[0] // interval)].append(sample)
+    for bucket in range(max(buckets) + 1 if buckets else 0):
+        bucket_samples = buckets.get(bucket, [])
+        latencies = sorted(sample[3] for sample in bucket_samples)
+        timeline.append({
+            "start": bucket * interval,
+            "requests": len(bucket_samples),
+            "rps": len(bucket_samples) / interval,
+            "errors": sum(1 for sample in bucket_samples if is_error(sample[2])),
+            "rejected": sum(1 for sample in bucket_samples if rejected(sample)),
+            "p95": percentile(latencies, 0.95),
+        })
+    report = {"requests": len(samples), "duration": duration, "targets": targets, "timeline": timeline}
+    if lags:
+        report["schedule_lag_p95"] = percentile(sorted(lags), 0.95)
+    return report
+
+def print_report(report):
+    ms = lambda seconds: f"{seconds * 1000:.0f}" if seconds is not None else "-"
+    print("\n" + "=" * 50)
+    print(f"Requests: {report['requests']} in {report['duration']:.1f}s ({report['requests'] / report['duration'] if report['duration'] else 0:.2f} req/s)")
+    print(f"{'Target':<13} {'Count':>6} {'req/s':>6} {'Err %':>6} {'Rej %':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  Statuses")
+    for target, stats in report["targets"].items():
+        latency = stats["latency_seconds"]
+        statuses = " ".join(f"{status}:{count}" for status, count in sorted(stats["statuses"].items()))
+        print(f"{target:<13} {stats['count']:>6} {stats['rps']:>6.2f} {stats['error_rate'] * 100:>6.1f} {stats['rejected_rate'] * 100:>6.1f} {ms(latency['p50']):>8} "
+              f"{ms(latency['p95']):>8} {ms(latency['p99']):>8} {ms(latency['max']):>8}  {statuses}")
+    print("-" * 50)
+    print(f"{'From (s)':>8} {'Requests':>9} {'req/s':>6} {'Errors':>7} {'Rejected':>8} {'p95 ms':>8}")
+    for bucket in report["timeline"]:
+        print(f"{bucket['start']:>8.0f} {bucket['requests']:>9} {bucket['rps']:>6.2f} {bucket['errors']:>7} {bucket['rejected']:>8} {ms(bucket['p95']):>8}")
+    if "schedule_lag_p95" in report:
+        print(f"Open-loop schedule lag p95: {ms(report['schedule_lag_p95'])} ms (high values mean max in-flight was the limit)")
+    print("=" * 50)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Drive the card/venue sync and cron routes concurrently and report latency and errors.")
+    parser.add_argument("--base-url", default=APP_BASE_URL, help=f"App to test (default: {APP_BASE_URL})")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: requests in flight (open loop: max in flight)")
+    parser.add_argument("--rps", type=float, help="Open loop: start this many requests per second instead of a fixed concurrency")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted targets (default: {DEFAULT_MIX})")
+    parser.add_argument("--interval", type=float, default=5.0, help="Timeline bucket size in seconds")
+    parser.add_argument("--no-cron-header", action="store_true", help="Send cron GETs without x-vercel-cron (exercises the 401 path)")
+    parser.add_argument("--spoof-ips", type=int, default=0, help="Spread requests over this many fake x-forwarded-for clients")
+    parser.add_argument("--seed", type=int, help="Random seed for the target mix")
+    parser.add_argument("--output", help="Also write the report as JSON")
+    return parser.parse_args()
+
+# --- Main Script ---
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    mode = f"{args.rps} req/s (max {args.concurrency} in flight)" if args.rps else f"concurrency {args.concurrency}"
+    print(f"Load testing {args.base_url} for {args.duration:.0f}s at {mode}, mix {args.mix}")
+    run = LoadRun(args.base_url, mix, args.concurrency, cron_header=not args.no_cron_header, spoof_ips=args.spoof_ips, seed=args.seed)
+    if args.rps:
+        run.run_open(args.rps, args.duration, args.concurrency)
+    else:
+        run.run_closed(args.concurrency, args.duration)
+    elapsed = time.monotonic() - run.started_at
+
+    # Without x-vercel-cron the cron routes are meant to answer 401
+    expected = {(target, 401) for target, (method, _, _) in TARGETS.items() if method == "GET"} if args.no_cron_header else frozenset()
+    report = summarize(run.samples, elapsed, args.interval, run.lags, expected)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(1 if any(stats["error_rate"] > 0 or stats["rejected_rate"] > 0 for stats in report["targets"].values()) else 0)
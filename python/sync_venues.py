@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import hashlib
 import requests
 from dotenv import load_dotenv
 import time
@@ -26,6 +27,9 @@ if not GLOWNET_API_KEY:
     print("Required: GLOWNET_API_KEY")
     sys.exit(1)
 
+# Hashes of the venue image entries the app last acknowledged, so only changes are sent
+VENUE_IMAGE_MANIFEST_PATH = os.path.join(script_dir, '.venue_images_manifest.json')
+
 def load_venue_images():
     """Load venue image mappings from JSON file"""
     image_file_path = os.path.join(script_dir, 'venue_images.json')
@@ -40,18 +44,69 @@ def load_venue_images():
         print(f"Warning: venue_images.json at {image_file_path} is not valid JSON")
         return {}
 
-def test_api_sync(sync_type="full", venue_images=None):
-    """Tests the venues API sync endpoint."""
+def image_entry_hash(entry):
+    """Content hash of one venue's image entry."""
+    return hashlib.sha256(json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+
+def load_image_manifest():
+    """Returns {venue_id: hash} last acknowledged by this app, or None if there is no usable manifest."""
+    try:
+        with open(VENUE_IMAGE_MANIFEST_PATH, 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('app_url') != APP_BASE_URL or not isinstance(manifest.get('hashes'), dict):
+        return None # Written for another deployment: send everything
+    return manifest['hashes']
+
+def save_image_manifest(venue_images):
+    """Records the full map as acknowledged (written atomically)."""
+    manifest = {
+        "app_url": APP_BASE_URL,
+        "hashes": {venue_id: image_entry_hash(entry) for venue_id, entry in venue_images.items()},
+    }
+    temp_path = VENUE_IMAGE_MANIFEST_PATH + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, VENUE_IMAGE_MANIFEST_PATH)
+
+def build_image_delta(venue_images, acknowledged):
+    """Added or changed entries of the map, plus null for venues whose mapping was removed."""
+    delta = {venue_id: entry for venue_id, entry in venue_images.items()
+             if acknowledged.get(venue_id) != image_entry_hash(entry)}
+    delta.update({venue_id: None for venue_id in acknowledged if venue_id not in venue_images})
+    return delta
+
+def test_api_sync(sync_type="full", venue_images=None, full_images=False):
+    """
+    Tests the venues API sync endpoint.
+
+    Only venue image mappings that changed since the last acknowledged sync are
+    sent (venue_images_mode 'delta'). The whole map is sent instead when there
+    is no manifest, with full_images=True, or when the app does not confirm it
+    applied a delta.
+    """
     url = f"{APP_BASE_URL}/api/venues/sync-glownet"
     
     headers = {
         "Content-Type": "application/json"
     }
     
-    payload = {
-        "type": sync_type,
-        "venue_images": venue_images or {}
-    }
+    venue_images = venue_images or {}
+    acknowledged = None if full_images else load_image_manifest()
+    if acknowledged is None:
+        payload = {
+            "type": sync_type,
+            "venue_images": venue_images,
+            "venue_images_mode": "full"
+        }
+    else:
+        payload = {
+            "type": sync_type,
+            "venue_images": build_image_delta(venue_images, acknowledged),
+            "venue_images_mode": "delta"
+        }
+        print(f"Sending {len(payload['venue_images'])} of {len(venue_images)} venue image mappings (changed since last sync).")
     
     print(f"Testing Venue Sync API at: {url}")
     print(f"Parameters: {json.dumps(payload, indent=2)}")
@@ -67,6 +122,10 @@ def test_api_sync(sync_type="full", venue_images=None):
         
         if response.status_code == 200:
             result = response.json()
+            if payload["venue_images_mode"] == "delta" and result.get('venue_images_mode') != "delta":
+                print("App did not confirm the venue image delta; resending the full map.")
+                return test_api_sync(sync_type, venue_images, full_images=True)
+            save_image_manifest(venue_images)
             print("\nSync Results:")
             print(f"Message: {result.get('message', 'No message')}")
             
@@ -137,11 +196,12 @@ if __name__ == "__main__":
     else:
         # Test sync endpoint with parameters
         sync_type = "full"
+        args = [arg for arg in sys.argv[1:] if arg != "--full-images"]
         
         # Parse command line arguments for sync_type
-        if len(sys.argv) > 1:
-            sync_type = sys.argv[1]
+        if args:
+            sync_type = args[0]
                 
-        test_api_sync(sync_type, venue_images)
+        test_api_sync(sync_type, venue_images, full_images="--full-images" in sys.argv)
         
     print("\nAPI test completed.") 
\ No newline at end of file
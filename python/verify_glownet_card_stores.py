@@ -0,0 +1,208 @@
+# samachi-app/python/verify_glownet_card_stores.py
+"""
+Checks that glownet_card_sync's Postgres and SQLite card stores behave alike.
+
+Both stores get the same syncs from an in-process mock API, step by step:
+
+    full         full sync of every event (one tag_uid listed in two events)
+    incremental  incremental sync after some G-Tags changed (fingerprint skip)
+    failed       incremental sync whose first upsert fails (rollback + mark_failed)
+    retry        incremental sync that picks the failed cards up again
+
+After each step the result dicts and the membership_cards rows of the two
+stores are compared. The Postgres store runs in a throwaway schema that is
+dropped afterwards; point --dsn at a scratch database, not production.
+
+Usage:
+    python verify_glownet_card_stores.py --dsn postgresql://postgres@localhost/scratch
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from decimal import Decimal
+
+import glownet_client as glownet
+import glownet_card_sync as card_sync
+import glownet_mock_server
+
+# Supabase's membership_cards (see lib/database.types.ts)
+POSTGRES_SCHEMA_SQL = """
+    CREATE TABLE membership_cards (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        card_identifier TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        glownet_event_id INTEGER,
+        glownet_status TEXT,
+        last_sync_attempt TIMESTAMPTZ,
+        last_synced TIMESTAMPTZ,
+        status TEXT NOT NULL DEFAULT 'unregistered',
+        sync_error TEXT,
+        sync_status TEXT,
+        user_id UUID
+    )
+"""
+# Compared per card; timestamps only by whether they are set
+ROW_SQL = ("SELECT card_identifier, glownet_event_id, glownet_status, status, sync_status, sync_error, "
+           "last_synced IS NOT NULL, last_sync_attempt IS NOT NULL FROM membership_cards ORDER BY card_identifier")
+SIMULATED_ERROR = "simulated upsert failure"
+BATCH_SIZE = 50 # Small batches, so a sync spans several upserts
+report_stream = sys.stdout # The comparison; the sync's own output is silenced in __main__
+
+# --- Stores ---
+
+def open_postgres_store(dsn):
+    """A PostgresCardStore whose session works in a fresh schema holding only membership_cards."""
+    store = card_sync.PostgresCardStore(dsn)
+    schema = f"card_store_check_{os.getpid()}_{int(time.time())}"
+    with store.conn, store.conn.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"SET search_path TO {schema}")
+        cursor.execute(POSTGRES_SCHEMA_SQL)
+    return store, schema
+
+def drop_postgres_schema(store, schema):
+    with store.conn, store.conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+
+def read_rows(store):
+    if isinstance(store, card_sync.PostgresCardStore):
+        with store.conn, store.conn.cursor() as cursor:
+            cursor.execute(ROW_SQL)
+            rows = cursor.fetchall()
+    else:
+        rows = store.conn.execute(ROW_SQL).fetchall()
+    return [tuple(bool(value) if index >= 6 else value for index, value in enumerate(row)) for row in rows]
+
+class FailFirstUpsert:
+    """Makes the store's next upsert_cards call raise, like a failed batch."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        upsert = self.store.upsert_cards
+        def failing(rows):
+            self.store.upsert_cards = upsert
+            raise RuntimeError(SIMULATED_ERROR)
+        self.store.upsert_cards = failing
+        return self
+
+    def __exit__(self, *exc):
+        self.store.__dict__.pop("upsert_cards", None)
+
+# --- Fixtures ---
+
+def seed_mock(events, gtags):
+    """Seeds the mock and lists one tag_uid in two events, like a card moved between events."""
+    mock = glownet_mock_server.MockGlownet(glownet_mock_server.load_spec(), seed=7)
+    mock.seed(events, gtags // 2, gtags, balance_ratio=0.5)
+    first_event, second_event = list(mock.events)[:2]
+    moved = dict(next(iter(mock.collection(first_event, "gtags").values())))
+    moved["id"] = mock._new_id()
+    mock.collection(second_event, "gtags")[moved["id"]] = moved
+    return mock
+
+def change_gtags(mock, count, step):
+    """Changes the balance or status of `count` G-Tags per event."""
+    with mock.lock:
+        for event_id in mock.events:
+            for index, gtag in enumerate(list(mock.collection(event_id, "gtags").values())[step::7][:count]):
+                if index % 2:
+                    gtag["status"] = "inactive" if gtag.get("status") != "inactive" else "active"
+                else:
+                    gtag["final_balance"] += Decimal(step + 1)
+
+# --- Comparison ---
+
+def compare(step, results, rows):
+    """Prints the step's outcome. Returns True if both stores agree."""
+    (sqlite_result, postgres_result), (sqlite_rows, postgres_rows) = results, rows
+    ok = True
+    if sqlite_result != postgres_result:
+        ok = False
+        print(f"  {step}: results differ\n    sqlite:   {sqlite_result}\n    postgres: {postgres_result}", file=report_stream)
+    if sqlite_rows != postgres_rows:
+        ok = False
+        differing = [(a, b) for a, b in zip(sqlite_rows, postgres_rows) if a != b]
+        print(f"  {step}: membership_cards differ ({len(sqlite_rows)} vs {len(postgres_rows)} rows, "
+              f"{len(differing)} differing)", file=report_stream)
+        for a, b in differing[:5]:
+            print(f"    sqlite:   {a}\n    postgres: {b}", file=report_stream)
+    stats = sqlite_result["stats"]
+    failed_rows = sum(1 for row in sqlite_rows if row[4] == "failed")
+    print(f"  {step:<12} {'OK' if ok else 'MISMATCH'}: total {stats['total']}, synced {stats['synced']}, "
+          f"failed {stats['failed']}, unchanged {stats.get('unchanged', '-')}, {len(sqlite_rows)} cards ({failed_rows} marked failed)", file=report_stream)
+    return ok
+
+def run_checks(dsn, events, gtags):
+    mock = seed_mock(events, gtags)
+    server, base_url = glownet_mock_server.start_in_thread(mock)
+    glownet.GLOWNET_API_BASE_URL = base_url
+    work_dir = tempfile.mkdtemp(prefix="card_store_check_")
+    sqlite_store = card_sync.SqliteCardStore(os.path.join(work_dir, "cards.sqlite3"))
+    postgres_store, schema = open_postgres_store(dsn)
+    stores = (sqlite_store, postgres_store)
+    fingerprints = [card_sync.FingerprintStore(store.target, os.path.join(work_dir, "fingerprints.sqlite3")) for store in stores]
+    events_list = [{"id": event_id, "name": event["name"]} for event_id, event in mock.events.items()]
+
+    def sync_all(sync_type, fail_first=False):
+        results = []
+        for store, store_fingerprints in zip(stores, fingerprints):
+            if fail_first:
+                with FailFirstUpsert(store):
+                    result = card_sync.sync_cards(store, events_list, BATCH_SIZE, 1, store_fingerprints, sync_type)
+            else:
+                result = card_sync.sync_cards(store, events_list, BATCH_SIZE, 1, store_fingerprints, sync_type)
+            results.append(result)
+        return results, [read_rows(store) for store in stores]
+
+    outcomes = []
+    try:
+        outcomes.append(compare("full", *sync_all("full")))
+        change_gtags(mock, 10, 0)
+        outcomes.append(compare("incremental", *sync_all("incremental")))
+        change_gtags(mock, 10, 1)
+        results, rows = sync_all("incremental", fail_first=True)
+        outcomes.append(compare("failed", results, rows))
+        if not any(row[4] == "failed" and row[5] == SIMULATED_ERROR for row in rows[1]):
+            print("  failed: no card was marked failed in Postgres", file=report_stream)
+            outcomes.append(False)
+        results, rows = sync_all("incremental")
+        outcomes.append(compare("retry", results, rows))
+        if any(row[4] != "success" for store_rows in rows for row in store_rows):
+            print("  retry: cards are still marked failed", file=report_stream)
+            outcomes.append(False)
+    finally:
+        drop_postgres_schema(postgres_store, schema)
+        for store in stores:
+            store.close()
+        for store_fingerprints in fingerprints:
+            store_fingerprints.close()
+        server.shutdown()
+    return all(outcomes)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that the Postgres and SQLite card stores of glownet_card_sync agree.")
+    parser.add_argument("--dsn", required=True, help="Scratch Postgres database (a throwaway schema is created and dropped in it)")
+    parser.add_argument("--events", type=int, default=3, help="Mock events, at least 2 (default: 3)")
+    parser.add_argument("--gtags", type=int, default=300, help="G-Tags per mock event (default: 300)")
+    return parser.parse_args()
+
+# --- Main Script ---
+if __name__ == "__main__":
+    args = parse_args()
+    if card_sync.psycopg2 is None:
+        print("Error: psycopg2 is required (pip install psycopg2-binary).")
+        sys.exit(1)
+    print("Comparing the card stores on the same mock G-Tags...")
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull # The sync prints per event and batch; only the comparison is of interest
+        try:
+            ok = run_checks(args.dsn, args.events, args.gtags)
+        finally:
+            sys.stdout = stdout
+    print("Both stores agree." if ok else "The stores disagree (see above).")
+    sys.exit(0 if ok else 1)